@@ -0,0 +1,49 @@
+"""
+Alembic environment: migrations run on the primary (settings.DATABASE_URL, or the -x url=... /
+sqlalchemy.url override), in one transaction under an advisory lock, so API replicas starting
+together apply them once.
+
+0001 is the schema of the first release; every later schema change has its own revision. Databases
+built by create_all before migrations existed are adopted at any version: 0001 leaves their tables
+alone, and later revisions only create the tables, columns, indexes and triggers that are missing.
+"""
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import func, pool, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.db import ADVISORY_LOCK_NAMESPACE, Base
+# Import models so autogenerate sees every table
+from app.services.models import (
+    ETLCheckpoint, RawData, CanonicalData, PriceHistory, PriceRollup, RecordHash, ETLRun, ETLCounter, RawBatch,
+    ETLTask,
+)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+def _url() -> str:
+    return context.get_x_argument(as_dictionary=True).get("url") or config.get_main_option("sqlalchemy.url") or settings.DATABASE_URL
+
+def do_run_migrations(connection: Connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        # Released at commit; a second migrator waits, then finds the schema at head
+        connection.execute(select(func.pg_advisory_xact_lock(ADVISORY_LOCK_NAMESPACE, func.hashtext("alembic"))))
+        context.run_migrations()
+
+async def run_async_migrations():
+    connectable = create_async_engine(_url(), poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+if context.is_offline_mode():
+    # Revisions look at the schema they migrate (to adopt create_all databases): no SQL script to print
+    raise SystemExit("offline mode (--sql) is not supported: migrations need a database connection")
+asyncio.run(run_async_migrations())
@@ -0,0 +1,64 @@
+"""baseline: the three tables the first release created with Base.metadata.create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 01:40:42.630311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("etl_checkpoints"):
+        # Built by create_all before migrations existed: adopted, the next revisions bring it up to date
+        return
+
+    op.create_table('etl_checkpoints',
+    sa.Column('source_id', sa.String(), nullable=False),
+    sa.Column('last_processed_offset', sa.BigInteger(), nullable=True),
+    sa.Column('last_run_timestamp', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('metadata_blob', sa.JSON(), nullable=True),
+    sa.PrimaryKeyConstraint('source_id')
+    )
+    op.create_table('raw_data',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source_id', sa.String(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('ingested_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_raw_data_id'), 'raw_data', ['id'], unique=False)
+    op.create_index(op.f('ix_raw_data_source_id'), 'raw_data', ['source_id'], unique=False)
+    op.create_table('canonical_data',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('price_usd', sa.Float(), nullable=False),
+    sa.Column('market_cap', sa.BigInteger(), nullable=True),
+    sa.Column('provider_data', sa.JSON(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('processed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_canonical_data_id'), 'canonical_data', ['id'], unique=False)
+    op.create_index(op.f('ix_canonical_data_symbol'), 'canonical_data', ['symbol'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_canonical_data_symbol'), table_name='canonical_data')
+    op.drop_index(op.f('ix_canonical_data_id'), table_name='canonical_data')
+    op.drop_table('canonical_data')
+    op.drop_index(op.f('ix_raw_data_source_id'), table_name='raw_data')
+    op.drop_index(op.f('ix_raw_data_id'), table_name='raw_data')
+    op.drop_table('raw_data')
+    op.drop_table('etl_checkpoints')
@@ -0,0 +1,40 @@
+"""canonical_data: JSONB provider_data with a GIN index, keyset pagination indexes for /data
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 01:41:10.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c['name']: c for c in sa.inspect(op.get_bind()).get_columns('canonical_data')}
+    if not isinstance(columns['provider_data']['type'], postgresql.JSONB):
+        # Rewrites the table under an exclusive lock: one pass, before the GIN index is built
+        op.alter_column('canonical_data', 'provider_data',
+                        type_=postgresql.JSONB(astext_type=sa.Text()), existing_nullable=True,
+                        postgresql_using='provider_data::jsonb')
+    op.create_index('ix_canonical_data_market_cap_id', 'canonical_data', [sa.text('coalesce(market_cap, 0)'), 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_canonical_data_price_usd_id', 'canonical_data', ['price_usd', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_canonical_data_last_updated_id', 'canonical_data', ['last_updated', 'id'], unique=False, if_not_exists=True)
+    op.create_index('ix_canonical_data_provider_data', 'canonical_data', ['provider_data'], unique=False, postgresql_using='gin', if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_canonical_data_provider_data', table_name='canonical_data', postgresql_using='gin')
+    op.drop_index('ix_canonical_data_last_updated_id', table_name='canonical_data')
+    op.drop_index('ix_canonical_data_price_usd_id', table_name='canonical_data')
+    op.drop_index('ix_canonical_data_market_cap_id', table_name='canonical_data')
+    op.alter_column('canonical_data', 'provider_data',
+                    type_=sa.JSON(), existing_nullable=True, postgresql_using='provider_data::json')
@@ -0,0 +1,55 @@
+"""price_history (partitioned by month on ts) and price_rollups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 01:41:32.540871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # Partitions are created on demand by app.services.history, not here
+    if not inspector.has_table('price_history'):
+        op.create_table('price_history',
+        sa.Column('symbol_id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(), nullable=False),
+        sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('market_cap', sa.BigInteger(), nullable=True),
+        sa.PrimaryKeyConstraint('symbol_id', 'ts', 'source'),
+        postgresql_partition_by='RANGE (ts)'
+        )
+        op.create_index('ix_price_history_ts', 'price_history', ['ts'], unique=False)
+    if not inspector.has_table('price_rollups'):
+        op.create_table('price_rollups',
+        sa.Column('resolution', sa.String(), nullable=False),
+        sa.Column('symbol_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('open', sa.Float(), nullable=False),
+        sa.Column('high', sa.Float(), nullable=False),
+        sa.Column('low', sa.Float(), nullable=False),
+        sa.Column('close', sa.Float(), nullable=False),
+        sa.Column('market_cap', sa.BigInteger(), nullable=True),
+        sa.Column('samples', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('resolution', 'symbol_id', 'bucket')
+        )
+        op.create_index('ix_price_rollups_resolution_bucket', 'price_rollups', ['resolution', 'bucket'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_price_rollups_resolution_bucket', table_name='price_rollups')
+    op.drop_table('price_rollups')
+    # Drops the partitions with it
+    op.drop_index('ix_price_history_ts', table_name='price_history')
+    op.drop_table('price_history')
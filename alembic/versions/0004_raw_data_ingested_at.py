@@ -0,0 +1,24 @@
+"""raw_data: index on ingested_at for time-window exports
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 01:41:51.907413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_raw_data_ingested_at'), 'raw_data', ['ingested_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_raw_data_ingested_at'), table_name='raw_data')
@@ -0,0 +1,35 @@
+"""record_hashes: content hash per (symbol, source) for change detection
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 01:42:07.265330
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('record_hashes'):
+        return
+    op.create_table('record_hashes',
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('hash', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('symbol', 'source')
+    )
+    op.create_index('ix_record_hashes_source', 'record_hashes', ['source'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_record_hashes_source', table_name='record_hashes')
+    op.drop_table('record_hashes')
@@ -0,0 +1,37 @@
+"""canonical_data: consensus_price, price_spread and source_count
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 01:42:25.731992
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CONSENSUS_COLUMNS = (('consensus_price', sa.Float), ('price_spread', sa.Float), ('source_count', sa.Integer))
+
+
+def upgrade() -> None:
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('canonical_data')}
+    # Nullable, no default: a catalog-only change. Existing rows get consensus on their next update;
+    # until then /data sorts them by price_usd
+    for name, type_ in CONSENSUS_COLUMNS:
+        if name not in existing:
+            op.add_column('canonical_data', sa.Column(name, type_(), nullable=True))
+    op.create_index('ix_canonical_data_consensus_price_id', 'canonical_data', [sa.text('coalesce(consensus_price, price_usd)'), 'id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_canonical_data_source_count'), 'canonical_data', ['source_count'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_canonical_data_source_count'), table_name='canonical_data')
+    op.drop_index('ix_canonical_data_consensus_price_id', table_name='canonical_data')
+    for name, _ in reversed(CONSENSUS_COLUMNS):
+        op.drop_column('canonical_data', name)
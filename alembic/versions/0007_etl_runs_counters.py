@@ -0,0 +1,105 @@
+"""etl_runs and the trigger-maintained etl_counters behind /stats
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 01:42:48.004517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of the counters as of this revision (app.services.models.COUNTER_DDL moves on)
+COUNTED_TABLES = ('canonical_data', 'raw_data')
+COUNTER_SHARDS = 8
+
+COUNT_ROWS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION etl_count_rows() RETURNS trigger LANGUAGE plpgsql AS $fn$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO etl_counters (name, shard, value)
+        SELECT TG_TABLE_NAME, mod(pg_backend_pid(), {COUNTER_SHARDS}), count(*) FROM new_rows HAVING count(*) > 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO etl_counters (name, shard, value)
+        SELECT TG_TABLE_NAME, mod(pg_backend_pid(), {COUNTER_SHARDS}), -count(*) FROM old_rows HAVING count(*) > 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    ELSE
+        UPDATE etl_counters SET value = 0 WHERE name = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END
+$fn$
+"""
+
+
+def counter_triggers(table: str, expression: str) -> str:
+    # Triggers first, then one full count as the seed, in the migration's transaction: CREATE TRIGGER
+    # blocks writers until commit, so no row is missed or counted twice
+    return f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_count_insert') THEN
+            CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+            CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+            CREATE TRIGGER {table}_count_truncate AFTER TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+            INSERT INTO etl_counters (name, shard, value) SELECT '{table}', 0, coalesce({expression}, 0) FROM {table}
+            ON CONFLICT (name, shard) DO NOTHING;
+        END IF;
+    END
+    $$
+    """
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('etl_runs'):
+        op.create_table('etl_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_id', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('duration_seconds', sa.Float(), nullable=True),
+        sa.Column('records', sa.Integer(), nullable=False),
+        sa.Column('inserted', sa.Integer(), nullable=False),
+        sa.Column('updated', sa.Integer(), nullable=False),
+        sa.Column('unchanged', sa.Integer(), nullable=False),
+        sa.Column('rejected', sa.Integer(), nullable=False),
+        sa.Column('bytes', sa.BigInteger(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_etl_runs_source_started', 'etl_runs', ['source_id', 'started_at'], unique=False)
+        op.create_index('ix_etl_runs_started_at', 'etl_runs', ['started_at'], unique=False)
+    if not inspector.has_table('etl_counters'):
+        op.create_table('etl_counters',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'shard')
+        )
+    op.execute(COUNT_ROWS_FUNCTION)
+    for table in COUNTED_TABLES:
+        op.execute(counter_triggers(table, 'count(*)'))
+
+
+def downgrade() -> None:
+    for table in COUNTED_TABLES:
+        for action in ('insert', 'delete', 'truncate'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_count_{action} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS etl_count_rows()")
+    op.drop_table('etl_counters')
+    op.drop_index('ix_etl_runs_started_at', table_name='etl_runs')
+    op.drop_index('ix_etl_runs_source_started', table_name='etl_runs')
+    op.drop_table('etl_runs')
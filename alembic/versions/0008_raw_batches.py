@@ -0,0 +1,122 @@
+"""raw_batches (partitioned by day on ingested_at), counted by record
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 01:43:15.392660
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of the counters as of this revision: raw_batches counts records, not rows
+COUNTED_TABLES = {"canonical_data": "count(*)", "raw_data": "count(*)", "raw_batches": "sum(record_count)"}
+COUNTER_SHARDS = 8
+
+
+def _count_branch(rows: str) -> str:
+    branches = " ELS".join(
+        f"IF TG_TABLE_NAME = '{table}' THEN SELECT coalesce({expression}, 0) INTO delta FROM {rows};\n"
+        for table, expression in COUNTED_TABLES.items()
+    )
+    return branches + "END IF;"
+
+
+COUNT_ROWS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION etl_count_rows() RETURNS trigger LANGUAGE plpgsql AS $fn$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE etl_counters SET value = 0 WHERE name = TG_TABLE_NAME;
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        {_count_branch("new_rows")}
+    ELSE
+        {_count_branch("old_rows")}
+        delta = -delta;
+    END IF;
+    IF delta <> 0 THEN
+        INSERT INTO etl_counters (name, shard, value)
+        VALUES (TG_TABLE_NAME, mod(pg_backend_pid(), {COUNTER_SHARDS}), delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END
+$fn$
+"""
+
+
+RAW_BATCHES_TRIGGERS = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'raw_batches_count_insert') THEN
+        CREATE TRIGGER raw_batches_count_insert AFTER INSERT ON raw_batches
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        CREATE TRIGGER raw_batches_count_delete AFTER DELETE ON raw_batches
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        CREATE TRIGGER raw_batches_count_truncate AFTER TRUNCATE ON raw_batches
+            FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        INSERT INTO etl_counters (name, shard, value) SELECT 'raw_batches', 0, coalesce(sum(record_count), 0) FROM raw_batches
+        ON CONFLICT (name, shard) DO NOTHING;
+    END IF;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('raw_batches'):
+        # Partitions are created on demand by app.services.raw_store, not here
+        op.create_table('raw_batches',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('source_id', sa.String(), nullable=False),
+        sa.Column('ingested_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('codec', sa.String(), nullable=False),
+        sa.Column('record_count', sa.Integer(), nullable=False),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('checksum', sa.String(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'ingested_at'),
+        postgresql_partition_by='RANGE (ingested_at)'
+        )
+        op.create_index('ix_raw_batches_source_ingested', 'raw_batches', ['source_id', 'ingested_at'], unique=False)
+    # Redundant with the primary key
+    op.drop_index(op.f('ix_raw_data_id'), table_name='raw_data', if_exists=True)
+    op.execute(COUNT_ROWS_FUNCTION)
+    op.execute(RAW_BATCHES_TRIGGERS)
+
+
+def downgrade() -> None:
+    # Counts archived batches too: the counter row outlives the table
+    op.execute("DELETE FROM etl_counters WHERE name = 'raw_batches'")
+    op.drop_index('ix_raw_batches_source_ingested', table_name='raw_batches')
+    op.drop_table('raw_batches')
+    op.create_index(op.f('ix_raw_data_id'), 'raw_data', ['id'], unique=False)
+    # Revision 0007's etl_count_rows()
+    op.execute("""
+CREATE OR REPLACE FUNCTION etl_count_rows() RETURNS trigger LANGUAGE plpgsql AS $fn$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO etl_counters (name, shard, value)
+        SELECT TG_TABLE_NAME, mod(pg_backend_pid(), 8), count(*) FROM new_rows HAVING count(*) > 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO etl_counters (name, shard, value)
+        SELECT TG_TABLE_NAME, mod(pg_backend_pid(), 8), -count(*) FROM old_rows HAVING count(*) > 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    ELSE
+        UPDATE etl_counters SET value = 0 WHERE name = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END
+$fn$
+""")
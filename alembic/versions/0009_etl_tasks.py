@@ -0,0 +1,48 @@
+"""etl_tasks: queue mode task shards with leases
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 01:43:40.826153
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table('etl_tasks'):
+        return
+    op.create_table('etl_tasks',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('source_id', sa.String(), nullable=False),
+    sa.Column('job_id', sa.String(), nullable=False),
+    sa.Column('start_offset', sa.BigInteger(), nullable=False),
+    sa.Column('end_offset', sa.BigInteger(), nullable=True),
+    sa.Column('progress_offset', sa.BigInteger(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('worker', sa.String(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('end_of_stream', sa.Boolean(), nullable=False),
+    sa.Column('records', sa.Integer(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_etl_tasks_open', 'etl_tasks', ['id'], unique=False, postgresql_where=sa.text("status IN ('PENDING', 'RUNNING')"))
+    op.create_index('ix_etl_tasks_source_job', 'etl_tasks', ['source_id', 'job_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_etl_tasks_source_job', table_name='etl_tasks')
+    op.drop_index('ix_etl_tasks_open', table_name='etl_tasks', postgresql_where=sa.text("status IN ('PENDING', 'RUNNING')"))
+    op.drop_table('etl_tasks')
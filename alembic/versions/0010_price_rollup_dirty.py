@@ -0,0 +1,59 @@
+"""price_rollup_dirty: minute buckets of price_history to roll up, filled by a trigger
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 14:05:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copy of app.services.models.ROLLUP_DIRTY_DDL as of this revision
+MARK_DIRTY_FUNCTION = """
+CREATE OR REPLACE FUNCTION price_rollup_mark_dirty() RETURNS trigger LANGUAGE plpgsql AS $fn$
+BEGIN
+    INSERT INTO price_rollup_dirty (bucket) SELECT DISTINCT date_trunc('minute', ts, 'UTC') FROM new_rows;
+    RETURN NULL;
+END
+$fn$
+"""
+
+MARK_DIRTY_TRIGGER = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'price_history_mark_dirty') THEN
+        CREATE TRIGGER price_history_mark_dirty AFTER INSERT ON price_history
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_rollup_mark_dirty();
+        -- Until now run_rollups resumed from the latest 1m bucket: hand it everything from there on
+        INSERT INTO price_rollup_dirty (bucket)
+        SELECT DISTINCT date_trunc('minute', ts, 'UTC') FROM price_history
+        WHERE ts >= coalesce((SELECT max(bucket) FROM price_rollups WHERE resolution = '1m'), '-infinity');
+    END IF;
+END
+$$;
+"""
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table('price_rollup_dirty'):
+        op.create_table('price_rollup_dirty',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('bucket', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    op.execute(MARK_DIRTY_FUNCTION)
+    op.execute(MARK_DIRTY_TRIGGER)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS price_history_mark_dirty ON price_history")
+    op.execute("DROP FUNCTION IF EXISTS price_rollup_mark_dirty()")
+    op.drop_table('price_rollup_dirty')
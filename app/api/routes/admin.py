@@ -0,0 +1,49 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from app.core.instrumentation import profiler
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not settings.ADMIN_TOKEN:
+        # Disabled: don't reveal the endpoints exist
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    The slowest profiled requests of this process, slowest first. Requests are profiled at
+    PROFILE_SAMPLE_RATE, or when they send `X-Profile: <ADMIN_TOKEN>`.
+    """
+    return {
+        "sample_rate": settings.PROFILE_SAMPLE_RATE,
+        "profiles": [
+            {**sample.summary(), "top_statements": sample.statements[:3]} for sample in profiler.samples
+        ],
+    }
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: int):
+    """cProfile output (by cumulative time) and the statements the request executed most."""
+    sample = profiler.get(profile_id)
+    if sample is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}")
+    lines = [
+        f"{sample.method} {sample.path} -> {sample.status} in {sample.duration_ms} ms "
+        f"({sample.queries} queries, {sample.db_ms} ms in the database)",
+        "",
+        "SQL statements by executions:",
+    ]
+    lines += [f"{count:>6}  {' '.join(statement.split())}" for statement, count in sample.statements]
+    lines += ["", sample.stats]
+    return "\n".join(lines)
+
+@router.delete("/profiles")
+async def clear_profiles():
+    profiler.clear()
+    return {"message": "Profiles cleared"}
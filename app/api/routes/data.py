@@ -1,80 +1,181 @@
-import time
-from fastapi import APIRouter, Depends, Query, BackgroundTasks
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, Depends, Query, BackgroundTasks, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from app.core.db import get_db, AsyncSessionLocal
-from app.services.models import CanonicalData, ETLCheckpoint
-from app.ingestion.orchestrator import IngestionOrchestrator
-from app.ingestion.sources.coinpaprika import CoinPaprikaSource
-from app.ingestion.sources.coingecko import CoinGeckoSource
+from sqlalchemy import select, tuple_, literal
+from app.core.cache import cached_json
+from app.core.db import get_db
+from app.services.models import CanonicalData, ETLCheckpoint, CANONICAL_SORT_KEYS, REPLAY_CHECKPOINT_PREFIX
+from app.services import etl_service, stats
+from app.ingestion.registry import SOURCES, resolve_source_id
+from app.schemas.responses import DATA_FIELDS, DataPage
 
 router = APIRouter()
 
-@router.get("/data")
-async def get_data(
-    page: int = 1,
-    limit: int = 20,
-    source: str = None,
-    db: AsyncSession = Depends(get_db)
-):
-    start_time = time.time()
-    
-    query = select(CanonicalData)
+def _encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, sort: str, order: str) -> tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_order, value, row_id = json.loads(raw)
+        # Coerce here so a well-formed cursor with bad values is a 400, not a DataError from asyncpg
+        if sort == "last_updated":
+            value = datetime.fromisoformat(value)
+        else:
+            value = CANONICAL_SORT_KEYS[sort].type.python_type(value)
+        row_id = int(row_id)
+    except (ValueError, TypeError, OverflowError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise HTTPException(status_code=400, detail="Cursor was issued for a different sort/order")
+    return value, row_id
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(DATA_FIELDS)
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in DATA_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {unknown}; choose from {list(DATA_FIELDS)}")
+    return requested
+
+async def fetch_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort: str = "market_cap",
+    order: str = "desc",
+    source: Optional[str] = None,
+    min_sources: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+) -> Dict:
+    """One keyset page of canonical_data as plain dicts, selecting only `fields` (default: all)."""
+    fields = fields or list(DATA_FIELDS)
+
+    # 1. Only the requested columns, plus what the cursor needs (id and the sort key's value)
+    sort_key = CANONICAL_SORT_KEYS[sort]
+    query = select(
+        *(getattr(CanonicalData, f) for f in fields),
+        CanonicalData.id.label("_cursor_id"),
+        sort_key.label("_cursor_value"),
+    )
     if source:
-        query = query.where(CanonicalData.source == source)
-    
-    query = query.offset((page-1)*limit).limit(limit)
-    result = await db.execute(query)
-    data = result.scalars().all()
-    
-    latency = (time.time() - start_time) * 1000
-    
+        query = query.where(CanonicalData.provider_data.has_key(resolve_source_id(source)))
+    if min_sources:
+        query = query.where(CanonicalData.source_count >= min_sources)
+
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort, order)
+        position = tuple_(sort_key, CanonicalData.id)
+        boundary = tuple_(literal(value, sort_key.type), literal(last_id))
+        query = query.where(position < boundary if order == "desc" else position > boundary)
+
+    if order == "desc":
+        query = query.order_by(sort_key.desc(), CanonicalData.id.desc())
+    else:
+        query = query.order_by(sort_key.asc(), CanonicalData.id.asc())
+
+    # 2. Fetch one extra row to know whether there is a next page. Tuples, not ORM entities
+    rows = (await db.execute(query.limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = _encode_cursor(sort, order, last._cursor_value, last._cursor_id)
+
+    width = len(fields)
+    data = [dict(zip(fields, row[:width])) for row in rows]
+
     return {
         "metadata": {
-            "page": page,
             "limit": limit,
-            "latency_ms": round(latency, 2)
+            "sort": sort,
+            "order": order,
+            "fields": fields,
+            "next_cursor": next_cursor,
         },
         "data": data
     }
 
+@router.get("/data", response_model=DataPage)
+async def get_data(
+    request: Request,
+    limit: int = Query(20, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Literal["market_cap", "price_usd", "consensus_price", "last_updated"] = "market_cap",
+    order: Literal["asc", "desc"] = "desc",
+    source: str = None,
+    min_sources: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. symbol,price_usd (default: all)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Keyset-paginated canonical data. Pass `next_cursor` from the previous response as `cursor`
+    to get the next page; every page costs the same as the first one.
+    Each row carries its precomputed cross-source consensus (consensus_price, price_spread,
+    source_count); `min_sources` keeps coins quoted by at least that many providers.
+    `fields` selects only those columns (leave out provider_data to skip the per-provider blob).
+    Responses are cached until the next ETL commit and carry an ETag.
+    """
+    selected = _parse_fields(fields)
+
+    async def build():
+        return await fetch_page(db, limit, cursor, sort, order, source, min_sources, selected)
+
+    return await cached_json(request, build)
+
 @router.get("/stats")
-async def get_stats(db: AsyncSession = Depends(get_db)):
-    # Aggregation
-    count_q = select(func.count(CanonicalData.id))
-    total_recs = (await db.execute(count_q)).scalar()
-    
-    # Checkpoint status
-    cp_q = select(ETLCheckpoint)
-    checkpoints = (await db.execute(cp_q)).scalars().all()
-    
-    return {
-        "total_records_processed": total_recs,
-        "pipelines": [
-            {
-                "source": cp.source_id,
-                "last_run": cp.last_run_timestamp,
-                "status": cp.status,
-                "offset": cp.last_processed_offset
-            } for cp in checkpoints
-        ]
-    }
+async def get_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    async def build():
+        # Aggregation: trigger-maintained counters, no COUNT(*) over the tables
+        counts = await stats.row_counts(db)
+
+        # Checkpoint status (one row per source)
+        cp_q = select(ETLCheckpoint).where(ETLCheckpoint.source_id.not_like(REPLAY_CHECKPOINT_PREFIX + "%"))
+        checkpoints = (await db.execute(cp_q)).scalars().all()
+
+        return {
+            "total_records_processed": counts["canonical_data"],
+            "raw_records": counts["raw_data"] + counts["raw_batches"],
+            "pipelines": [
+                {
+                    "source": cp.source_id,
+                    "last_run": cp.last_run_timestamp,
+                    "status": cp.status,
+                    "offset": cp.last_processed_offset
+                } for cp in checkpoints
+            ]
+        }
+
+    return await cached_json(request, build)
+
+@router.get("/stats/runs")
+async def get_run_stats(
+    request: Request,
+    hours: int = Query(24, ge=1, le=24 * 30),
+    db: AsyncSession = Depends(get_db),
+):
+    """Rolling run history per source over the last `hours`: p50/p95 run duration and records/sec."""
+    async def build():
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        return {"window_hours": hours, "since": since, "sources": await stats.run_stats(db, since)}
+
+    return await cached_json(request, build)
 
 # --- NEW TRIGGER LOGIC BELOW ---
 
 async def _run_etl_job(source_name: str):
     """Background task to run ETL without blocking the API"""
-    # We use AsyncSessionLocal here because BackgroundTasks run outside the request context
-    async with AsyncSessionLocal() as db:
-        if source_name == 'coinpaprika':
-            source = CoinPaprikaSource('coinpaprika_free')
-        elif source_name == 'coingecko':
-            source = CoinGeckoSource('coingecko_market')
-        else:
-            return
-        
-        orchestrator = IngestionOrchestrator(db, source)
-        await orchestrator.run()
+    # run_source opens its own session (BackgroundTasks run outside the request context)
+    # and takes the source's advisory lock, so it never overlaps the worker daemon.
+    if await etl_service.run_source(source_name):
         print(f"✅ Manual Trigger: {source_name} finished successfully.")
 
 @router.get("/trigger-etl")
@@ -83,8 +184,11 @@ async def trigger_etl(background_tasks: BackgroundTasks, source: str = "coinpapr
     Manually trigger an ETL run.
     Usage: GET /api/v1/trigger-etl?source=coinpaprika
     """
-    if source not in ["coinpaprika", "coingecko"]:
+    if source not in SOURCES:
         return {"error": "Invalid source. Use 'coinpaprika' or 'coingecko'"}
-    
+
+    if etl_service.is_running(source):
+        return {"message": f"ETL for {source} is already running."}
+
     background_tasks.add_task(_run_etl_job, source)
-    return {"message": f"🚀 ETL started for {source}. Check logs or /stats in a few seconds."}
\ No newline at end of file
+    return {"message": f"🚀 ETL started for {source}. Check logs or /stats in a few seconds."}
@@ -0,0 +1,227 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Literal, Optional
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from app.core.cache import encode_json
+from app.core.db import ReadSessionLocal, read_engine
+from app.ingestion.registry import resolve_source_id
+from app.services import raw_store
+from app.services.models import CanonicalData
+
+router = APIRouter()
+
+# Rows per server-side cursor fetch; also rows per NDJSON/CSV chunk and per Parquet row group
+EXPORT_BATCH_SIZE = 5000
+
+CANONICAL_COLUMNS = [
+    "id", "symbol", "name", "price_usd", "market_cap", "consensus_price", "price_spread", "source_count",
+    "last_updated", "provider_data",
+]
+# One row per raw record: legacy raw_data rows have an id, records stored in raw_batches a batch_id
+RAW_COLUMNS = ["id", "batch_id", "source_id", "ingested_at", "payload"]
+# Columns holding JSON documents: exported as JSON strings in CSV/Parquet
+JSON_COLUMNS = {"provider_data", "payload"}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+async def _stream_rows(query) -> AsyncIterator[list]:
+    """Yields lists of row tuples from a server-side cursor, EXPORT_BATCH_SIZE at a time."""
+    # Own session: the request's dependency session is closed before a streaming body is sent
+    async with ReadSessionLocal() as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for partition in result.partitions():
+            yield partition
+
+async def _raw_rows(source: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> AsyncIterator[list]:
+    """Raw records from raw_data, archived days and raw_batches (decompressed), EXPORT_BATCH_SIZE at a time."""
+    rows = []
+    async for batch in raw_store.read_batches(read_engine, source, start, end):
+        ids = batch.record_ids or [None] * len(batch.records)
+        rows.extend(
+            (record_id, batch.batch_id, batch.source_id, batch.ingested_at, record)
+            for record_id, record in zip(ids, batch.records)
+        )
+        if len(rows) >= EXPORT_BATCH_SIZE:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """True if Accept-Encoding allows gzip: listed (or covered by *) with a non-zero q-value."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights.get("gzip", weights.get("x-gzip", weights.get("*", 0.0))) > 0
+
+async def _ndjson(columns: list[str], batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        # Same encoder as the JSON API, so datetimes come out as ISO 8601
+        yield b"".join(encode_json(dict(zip(columns, row))) + b"\n" for row in rows)
+
+async def _csv(columns: list[str], batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    json_idx = [i for i, c in enumerate(columns) if c in JSON_COLUMNS]
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    async for rows in batches:
+        for row in rows:
+            row = list(row)
+            for i in json_idx:
+                row[i] = json.dumps(row[i])
+            writer.writerow(row)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+
+class _ChunkSink:
+    """Write-only file object for ParquetWriter; bytes are drained after every row group."""
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _parquet_schema(table: str):
+    import pyarrow as pa
+
+    if table == "canonical":
+        return pa.schema([
+            ("id", pa.int64()), ("symbol", pa.string()), ("name", pa.string()),
+            ("price_usd", pa.float64()), ("market_cap", pa.int64()),
+            ("consensus_price", pa.float64()), ("price_spread", pa.float64()), ("source_count", pa.int32()),
+            ("last_updated", pa.timestamp("us", tz="UTC")), ("provider_data", pa.string()),
+        ])
+    return pa.schema([
+        ("id", pa.int64()), ("batch_id", pa.int64()), ("source_id", pa.string()),
+        ("ingested_at", pa.timestamp("us", tz="UTC")), ("payload", pa.string()),
+    ])
+
+async def _parquet(table: str, columns: list[str], batches: AsyncIterator[list]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(table)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for rows in batches:
+            arrays = []
+            for i, column in enumerate(columns):
+                values = [row[i] for row in rows]
+                if column in JSON_COLUMNS:
+                    values = [json.dumps(v) for v in values]
+                arrays.append(pa.array(values, type=schema.field(column).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    # Footer
+    yield sink.drain()
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+@router.get("/export")
+async def export_data(
+    request: Request,
+    format: Literal["ndjson", "csv", "parquet"] = "ndjson",
+    table: Literal["canonical", "raw"] = "canonical",
+    source: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Streams a full table export with constant memory, straight off a server-side cursor.
+    `table=raw` exports the raw records (raw_data, raw_batches and archived days). Both tables can be limited to
+    a source (registry name or source_id; canonical: coins that source quotes) and an [start, end) window (canonical: on last_updated).
+    NDJSON/CSV are gzipped on the wire when the client accepts it; Parquet is zstd-compressed internally.
+    """
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    if source:
+        source = resolve_source_id(source)
+
+    if table == "canonical":
+        columns = CANONICAL_COLUMNS
+        query = select(*(getattr(CanonicalData, c) for c in CANONICAL_COLUMNS)).order_by(CanonicalData.id)
+        if source:
+            query = query.where(CanonicalData.provider_data.has_key(source))
+        if start:
+            query = query.where(CanonicalData.last_updated >= start)
+        if end:
+            query = query.where(CanonicalData.last_updated < end)
+        batches = _stream_rows(query)
+    else:
+        columns = RAW_COLUMNS
+        batches = _raw_rows(source, start, end)
+
+    if format == "ndjson":
+        body = _ndjson(columns, batches)
+    elif format == "csv":
+        body = _csv(columns, batches)
+    else:
+        body = _parquet(table, columns, batches)
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{table}.{format}"',
+        "Vary": "Accept-Encoding",
+    }
+    if format != "parquet" and _accepts_gzip(request.headers.get("accept-encoding", "")):
+        body = _gzip(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.cache import cached_json
+from app.core.config import settings
+from app.core.db import get_db
+from app.services.history import choose_resolution
+from app.services.models import CanonicalData, PriceHistory, PriceRollup
+
+router = APIRouter()
+
+@router.get("/history/{symbol}")
+async def get_history(
+    request: Request,
+    symbol: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Optional[Literal["raw", "1m", "1h", "1d"]] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Price history for one coin. Defaults to the last 24h.
+    Without `resolution`, picks the finest rollup that keeps the response under
+    HISTORY_MAX_POINTS buckets, so long-range charts read a handful of 1h/1d rows.
+    Cached until the next ETL commit or rollup pass, unless `end` is left to default to now.
+    """
+    # A window ending "now" moves with the clock: caching it would freeze it
+    cache = end is not None
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    async def build():
+        symbol_id = (await db.execute(
+            select(CanonicalData.id).where(CanonicalData.symbol == symbol.upper())
+        )).scalar_one_or_none()
+        if symbol_id is None:
+            raise HTTPException(status_code=404, detail=f"Unknown symbol '{symbol}'")
+
+        chosen = resolution or choose_resolution(start, end, settings.HISTORY_MAX_POINTS)
+
+        if chosen == "raw":
+            rows = (await db.execute(
+                select(PriceHistory.ts, PriceHistory.source, PriceHistory.price, PriceHistory.market_cap)
+                .where(PriceHistory.symbol_id == symbol_id, PriceHistory.ts >= start, PriceHistory.ts <= end)
+                .order_by(PriceHistory.ts)
+            )).all()
+            points = [
+                {"t": ts, "source": source, "price": price, "market_cap": market_cap}
+                for ts, source, price, market_cap in rows
+            ]
+        else:
+            rows = (await db.execute(
+                select(
+                    PriceRollup.bucket, PriceRollup.open, PriceRollup.high, PriceRollup.low,
+                    PriceRollup.close, PriceRollup.market_cap, PriceRollup.samples,
+                )
+                .where(
+                    PriceRollup.resolution == chosen,
+                    PriceRollup.symbol_id == symbol_id,
+                    PriceRollup.bucket >= start,
+                    PriceRollup.bucket <= end,
+                )
+                .order_by(PriceRollup.bucket)
+            )).all()
+            points = [
+                {"t": bucket, "open": o, "high": h, "low": l, "close": c, "market_cap": mc, "samples": n}
+                for bucket, o, h, l, c, mc, n in rows
+            ]
+
+        return {
+            "symbol": symbol.upper(),
+            "resolution": chosen,
+            "start": start,
+            "end": end,
+            "points": points
+        }
+
+    return await cached_json(request, build, cache=cache)
@@ -0,0 +1,42 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Response
+from app.core.config import settings
+from app.services.quotes import quote_store
+
+router = APIRouter()
+
+def _parse_symbols(symbols: str) -> List[str]:
+    # Request order, duplicates dropped
+    parsed = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols.split(",") if symbol.strip()))
+    if len(parsed) > settings.QUOTES_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.QUOTES_MAX_SYMBOLS} symbols per request")
+    return parsed
+
+@router.get("/quotes")
+async def get_quotes(
+    symbols: Optional[str] = Query(None, description="Comma-separated symbols, e.g. BTC,ETH"),
+    limit: int = Query(100, ge=1, description="Without symbols: the largest coins by market cap"),
+    min_market_cap: int = Query(0, ge=0),
+):
+    """
+    Current quotes from the in-memory snapshot (app.services.quotes); never queries the database.
+    With `symbols`: their quotes in request order, unknown symbols listed in `missing`.
+    Without: the `limit` largest coins by market cap. `generation` identifies the snapshot.
+    """
+    snapshot = await quote_store.current()
+    if symbols:
+        found, missing = snapshot.lookup(_parse_symbols(symbols))
+        body = snapshot.body("quotes", b"[" + b",".join(found) + b"]", missing=missing)
+    else:
+        found = snapshot.top(min(limit, settings.QUOTES_MAX_SYMBOLS), min_market_cap)
+        body = snapshot.body("quotes", b"[" + b",".join(found) + b"]")
+    return Response(body, media_type="application/json")
+
+@router.get("/quotes/{symbol}")
+async def get_quote(symbol: str):
+    """One symbol's current quote, from the in-memory snapshot."""
+    snapshot = await quote_store.current()
+    quote = snapshot.quotes.get(symbol.strip().upper())
+    if quote is None:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol {symbol!r}")
+    return Response(snapshot.body("quote", quote), media_type="application/json")
@@ -0,0 +1,101 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.events import data_generation
+from app.services.stream import Subscription, stream_hub
+
+router = APIRouter()
+
+def _parse_symbols(symbols: Optional[str]) -> List[str]:
+    parsed = sorted({symbol.strip().upper() for symbol in (symbols or "").split(",") if symbol.strip()})
+    if len(parsed) > settings.STREAM_MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.STREAM_MAX_SYMBOLS} symbols per subscription")
+    return parsed
+
+def _check_capacity():
+    if len(stream_hub.subscriptions) >= settings.STREAM_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many open streams, retry later")
+
+def _message(kind: str, quotes: list) -> dict:
+    return {"type": kind, "generation": data_generation.value, "quotes": quotes}
+
+async def _sse_events(symbols: List[str]) -> AsyncIterator[str]:
+    # Subscribed on the first iteration, not in the handler: a client that leaves before the body
+    # is iterated never runs this generator, and nothing would unsubscribe
+    subscription = await stream_hub.subscribe(symbols)
+    try:
+        while True:
+            message = await subscription.next(timeout=settings.STREAM_HEARTBEAT_SECONDS)
+            if message is None:
+                if subscription.closed:
+                    return
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            kind, quotes = message
+            yield f"event: {kind}\ndata: {json.dumps(_message(kind, quotes), separators=(',', ':'))}\n\n"
+    finally:
+        stream_hub.unsubscribe(subscription)
+
+@router.get("/stream")
+async def stream_quotes(symbols: str = Query(..., description="Comma-separated symbols, e.g. BTC,ETH")):
+    """
+    Server-Sent Events: a `snapshot` event with the current quotes of `symbols`, then a `delta`
+    event with only the changed quotes after each ETL commit. A slow reader skips intermediate values.
+    """
+    parsed = _parse_symbols(symbols)
+    if not parsed:
+        raise HTTPException(status_code=400, detail="symbols is required")
+    _check_capacity()
+    return StreamingResponse(
+        _sse_events(parsed),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _receive_commands(websocket: WebSocket, subscription: Subscription):
+    """{"action": "subscribe" | "unsubscribe", "symbols": [...]} messages from the client."""
+    try:
+        while True:
+            command = await websocket.receive_json()
+            symbols = {str(symbol).strip().upper() for symbol in command.get("symbols") or []}
+            if command.get("action") == "subscribe":
+                allowed = settings.STREAM_MAX_SYMBOLS - len(subscription.symbols)
+                await stream_hub.watch(subscription, sorted(symbols - subscription.symbols)[:max(allowed, 0)])
+            elif command.get("action") == "unsubscribe":
+                stream_hub.unwatch(subscription, symbols)
+    except (WebSocketDisconnect, ValueError, AttributeError):
+        pass
+    finally:
+        subscription.close()
+
+@router.websocket("/ws")
+async def quotes_socket(websocket: WebSocket, symbols: Optional[str] = None):
+    """
+    WebSocket variant of /stream. Initial symbols come from `?symbols=`; the client can change them
+    with {"action": "subscribe" | "unsubscribe", "symbols": [...]}. Messages are the same JSON as /stream.
+    """
+    try:
+        parsed = _parse_symbols(symbols)
+        _check_capacity()
+    except HTTPException as e:
+        await websocket.close(code=1008 if e.status_code == 400 else 1013, reason=e.detail)
+        return
+
+    await websocket.accept()
+    subscription = await stream_hub.subscribe(parsed)
+    receiver = asyncio.create_task(_receive_commands(websocket, subscription))
+    try:
+        while True:
+            message = await subscription.next()
+            if message is None:
+                break
+            await websocket.send_json(_message(*message))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        stream_hub.unsubscribe(subscription)
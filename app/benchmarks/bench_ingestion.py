@@ -0,0 +1,103 @@
+"""
+Benchmark: IngestionOrchestrator.run throughput, bulk upsert vs legacy row-by-row.
+
+Usage (needs a reachable Postgres, same .env as the API):
+    python -m app.benchmarks.bench_ingestion --records 250 --runs 3
+
+Each mode gets its own symbol namespace, so runs 2..N exercise the UPDATE path.
+Only rows created by the benchmark are removed afterwards.
+"""
+import argparse
+import asyncio
+import time
+from sqlalchemy import delete
+from app.core.db import AsyncSessionLocal, engine, Base
+from app.ingestion.orchestrator import BaseSource, IngestionOrchestrator
+from app.ingestion.normalize import build_batch, column
+from app.schemas.normalized import NormalizedBatch
+from app.ingestion.fingerprints import record_hashes
+from app.services.models import CanonicalData, RawData, RawBatch, ETLCheckpoint, RecordHash, ETLRun
+
+class SyntheticSource(BaseSource):
+    """Generates a CoinGecko-shaped batch in memory (no network)."""
+
+    def __init__(self, source_id: str, records: int, prefix: str):
+        super().__init__(source_id)
+        self.records = records
+        self.prefix = prefix
+
+    async def fetch_data(self, last_offset: int):
+        batch = [
+            {
+                "id": f"{self.prefix}-{i}",
+                "symbol": f"{self.prefix}{i}",
+                "name": f"Bench Coin {i}",
+                "current_price": 1.0 + i + last_offset / 100,
+                "market_cap": 1_000_000 * (i + 1),
+            }
+            for i in range(self.records)
+        ]
+        return batch, last_offset + 1
+
+    def normalize(self, raw_data: list[dict]) -> NormalizedBatch:
+        return build_batch(
+            self.source_id,
+            external_id=column(raw_data, "id"),
+            symbol=column(raw_data, "symbol"),
+            name=column(raw_data, "name"),
+            price=column(raw_data, "current_price"),
+            market_cap=column(raw_data, "market_cap"),
+            last_updated=[None] * len(raw_data),
+        )
+
+async def _cleanup(source_id: str, prefix: str):
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(CanonicalData).where(CanonicalData.symbol.like(f"{prefix}%")))
+        await session.execute(delete(RawData).where(RawData.source_id == source_id))
+        await session.execute(delete(RawBatch).where(RawBatch.source_id == source_id))
+        await session.execute(delete(ETLCheckpoint).where(ETLCheckpoint.source_id == source_id))
+        await session.execute(delete(RecordHash).where(RecordHash.source == source_id))
+        await session.execute(delete(ETLRun).where(ETLRun.source_id == source_id))
+        await session.commit()
+    record_hashes.forget([source_id])
+
+async def bench_mode(bulk: bool, records: int, runs: int) -> list[float]:
+    mode = "bulk" if bulk else "row"
+    source_id = f"bench_{mode}"
+    prefix = f"BENCH{mode.upper()}"
+    source = SyntheticSource(source_id, records, prefix)
+    await _cleanup(source_id, prefix)
+
+    rates = []
+    try:
+        for _ in range(runs):
+            async with AsyncSessionLocal() as session:
+                start = time.perf_counter()
+                await IngestionOrchestrator(session, source, bulk=bulk).run()
+                elapsed = time.perf_counter() - start
+            rates.append(records / elapsed)
+    finally:
+        await _cleanup(source_id, prefix)
+    return rates
+
+async def main(records: int, runs: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    print(f"records/batch={records} runs={runs}")
+    print(f"{'mode':<6} {'first (insert)':>16} {'best (update)':>16} {'mean':>12}")
+    for bulk in (False, True):
+        rates = await bench_mode(bulk, records, runs)
+        update_rates = rates[1:] or rates
+        print(
+            f"{'bulk' if bulk else 'row':<6} {rates[0]:>14.0f}/s "
+            f"{max(update_rates):>14.0f}/s {sum(rates) / len(rates):>10.0f}/s"
+        )
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=250)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.records, args.runs))
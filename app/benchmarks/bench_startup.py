@@ -0,0 +1,124 @@
+"""
+Startup budget: wall time of fresh processes for the entry points deploys and cron jobs pay for.
+
+Usage (needs the same .env as the API, and a migrated database):
+    python -m app.benchmarks.bench_startup --repeats 5 --output startup_results.json
+
+Every scenario runs `repeats` times in a new interpreter; the best time is compared with its
+budget (STARTUP_BUDGETS, seconds), and the process exits 1 when one is over. One extra run under
+`python -X importtime` lists the heavy modules a scenario loads but shouldn't (LEAN_IMPORTS).
+schema_create_all is the per-start cost the migrations removed, for reference (no budget).
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Set
+
+_API_STARTUP = """
+import asyncio
+from app.main import app
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        pass
+
+asyncio.run(boot())
+"""
+
+_CREATE_ALL = """
+import asyncio
+import app.services.models
+from app.core.db import Base, engine
+
+async def create():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+asyncio.run(create())
+"""
+
+SCENARIOS: Dict[str, List[str]] = {
+    "cli_help": ["-m", "app.etl", "--help"],
+    "cli_status": ["-m", "app.etl", "status"],
+    # What `python -m app.etl run <source>` loads before its first request
+    "cli_run_imports": ["-c", "import app.etl, app.services.etl_service"],
+    "api_startup": ["-c", _API_STARTUP],
+    "schema_create_all": ["-c", _CREATE_ALL],
+}
+
+# Best-of-N seconds, with headroom over a typical run; None = reported only
+STARTUP_BUDGETS: Dict[str, Optional[float]] = {
+    "cli_help": 0.15,
+    "cli_status": 1.0,
+    "cli_run_imports": 1.5,
+    "api_startup": 3.0,
+    "schema_create_all": None,
+}
+
+# Top-level packages each scenario must not import
+LEAN_IMPORTS: Dict[str, Set[str]] = {
+    "cli_help": {"sqlalchemy", "pydantic_settings", "httpx", "numpy", "fastapi", "prometheus_client"},
+    "cli_status": {"httpx", "numpy", "pyarrow", "fastapi", "structlog"},
+    "cli_run_imports": {"fastapi", "starlette", "pyarrow"},
+}
+
+def _run(args: List[str], *flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, *args], capture_output=True, text=True)
+
+def imported_packages(args: List[str]) -> Set[str]:
+    """Top-level packages the scenario imports, from its -X importtime report."""
+    packages = set()
+    for line in _run(args, "-X", "importtime").stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            packages.add(line.rsplit("|", 1)[1].strip().split(".")[0])
+    return packages
+
+def bench_startup(repeats: int, scenarios: Optional[List[str]] = None) -> List[Dict]:
+    results = []
+    for name in scenarios or list(SCENARIOS):
+        args = SCENARIOS[name]
+        samples, error = [], None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            process = _run(args)
+            samples.append(time.perf_counter() - started)
+            if process.returncode != 0:
+                error = process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f"exit {process.returncode}"
+                break
+        budget = STARTUP_BUDGETS.get(name)
+        best = min(samples)
+        results.append({
+            "scenario": name,
+            "best_s": round(best, 3),
+            "median_s": round(sorted(samples)[len(samples) // 2], 3),
+            "budget_s": budget,
+            "within_budget": error is None and (budget is None or best <= budget),
+            "unexpected_imports": sorted(imported_packages(args) & LEAN_IMPORTS.get(name, set())),
+            "error": error,
+        })
+    return results
+
+def main(args):
+    results = bench_startup(args.repeats, args.scenarios)
+    for r in results:
+        budget = f"{r['budget_s']:.2f}s" if r["budget_s"] is not None else "-"
+        verdict = "ok" if r["within_budget"] and not r["unexpected_imports"] else "OVER"
+        print(f"{r['scenario']:<18} best={r['best_s']:>6.3f}s median={r['median_s']:>6.3f}s budget={budget:<6} {verdict}")
+        if r["unexpected_imports"]:
+            print(f"{'':<18} imports {', '.join(r['unexpected_imports'])}")
+        if r["error"]:
+            print(f"{'':<18} failed: {r['error']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["within_budget"] and not r["unexpected_imports"] for r in results) else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS))
+    parser.add_argument("--output", help="Write the results as JSON")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,392 @@
+"""
+Benchmark suite: end-to-end ingestion against local stand-in providers, then API latency.
+
+Usage (needs a reachable Postgres, same .env as the API; no network access required):
+    python -m app.benchmarks.bench_suite --coins 100 1000 10000 50000 --output bench_results.json
+    python -m app.benchmarks.bench_suite --coins 1000 --latency-ms 50 --rate-limit-every 10
+    python -m app.benchmarks.bench_suite --compare bench_results.json   # diff against an earlier run
+
+Per (source, coins) scenario it records IngestionOrchestrator.run throughput, SQL statement
+count and peak Python heap (tracemalloc, measured on one extra run because tracing slows
+allocation-heavy code). /data and /stats are then hammered concurrently, with and without
+the response cache, and p50/p99 latencies are recorded. Finally the CPU cost of building one
+large /data page is compared: ORM entities + jsonable_encoder (the old path) against tuples +
+orjson, with and without a column projection. Results are written as JSON.
+
+Only rows created by the benchmark (symbols starting with BENCH, bench_* sources) are removed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import httpx
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import REGISTRY
+from sqlalchemy import delete, event, select
+from app.core.cache import encode_json, response_cache
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine, Base
+from app.benchmarks.providers import MockProvider
+from app.ingestion.orchestrator import BaseSource, IngestionOrchestrator
+from app.ingestion.sources.coingecko import CoinGeckoSource
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+from app.ingestion.fingerprints import record_hashes
+from app.services.models import CanonicalData, RawData, RawBatch, ETLCheckpoint, RecordHash, PriceHistory, ETLRun
+
+SOURCE_IDS = {"coingecko": "bench_coingecko", "coinpaprika": "bench_coinpaprika"}
+SYMBOL_PREFIX = "bench"
+
+API_QUERIES = {
+    "/api/v1/data": [
+        "?limit=100",
+        "?limit=100&sort=price_usd&order=desc",
+        "?limit=500&sort=last_updated",
+        "?limit=50&source=coingecko",
+        "?limit=1000&fields=symbol,price_usd,market_cap",
+    ],
+    "/api/v1/stats": [""],
+    # In-memory snapshot: no queries once it is built
+    "/api/v1/quotes": [
+        "?symbols=" + ",".join(f"{SYMBOL_PREFIX.upper()}{i}" for i in range(30)),
+        "?limit=100",
+    ],
+    f"/api/v1/quotes/{SYMBOL_PREFIX.upper()}1": [""],
+}
+
+class QueryCounter:
+    """Counts SQL statements sent through the shared engine while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+def _build_source(name: str, provider: MockProvider) -> BaseSource:
+    client = provider.client()
+    if name == "coingecko":
+        source = CoinGeckoSource(SOURCE_IDS[name], client=client, tier="pro", concurrency=8)
+        # Largest page CoinGecko serves; +1 page so every run reaches the end of the list
+        source.per_page = 250
+        source.pages_per_run = math.ceil(provider.coins / source.per_page) + 1
+        return source
+    return CoinPaprikaSource(SOURCE_IDS[name], client=client)
+
+async def _cleanup():
+    async with AsyncSessionLocal() as session:
+        source_ids = list(SOURCE_IDS.values())
+        await session.execute(delete(PriceHistory).where(PriceHistory.source.in_(source_ids)))
+        await session.execute(delete(CanonicalData).where(CanonicalData.symbol.like(f"{SYMBOL_PREFIX.upper()}%")))
+        await session.execute(delete(RawData).where(RawData.source_id.in_(source_ids)))
+        await session.execute(delete(RawBatch).where(RawBatch.source_id.in_(source_ids)))
+        await session.execute(delete(ETLCheckpoint).where(ETLCheckpoint.source_id.in_(source_ids)))
+        await session.execute(delete(RecordHash).where(RecordHash.source.in_(source_ids)))
+        await session.execute(delete(ETLRun).where(ETLRun.source_id.in_(source_ids)))
+        await session.commit()
+    record_hashes.forget(source_ids)
+
+def _rows_written(source_id: str) -> float:
+    return sum(
+        REGISTRY.get_sample_value("etl_rows_total", {"source_id": source_id, "action": action}) or 0
+        for action in ("inserted", "updated")
+    )
+
+async def _run_once(source: BaseSource) -> Dict:
+    rows_before = _rows_written(source.source_id)
+    summary = {}
+    with QueryCounter() as queries:
+        started = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as session:
+                orchestrator = IngestionOrchestrator(session, source)
+                summary = orchestrator.summary
+                await orchestrator.run()
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - started
+    # Records actually processed: pages lost to 429s don't count, unchanged (skipped) records do
+    written = int(_rows_written(source.source_id) - rows_before)
+    records = written + summary.get("unchanged", 0)
+    return {
+        "seconds": round(elapsed, 4),
+        "records": records,
+        "written": written,
+        "unchanged": summary.get("unchanged", 0),
+        "records_per_sec": round(records / elapsed, 1),
+        "queries": queries.count,
+        "error": error,
+    }
+
+async def bench_ingestion(
+    name: str, coins: int, runs: int, latency: float = 0.0, rate_limit_every: int = 0, churn: float = 1.0
+) -> Dict:
+    """
+    Runs one source `runs` times over a `coins`-sized universe. The first run inserts; later runs
+    update the `churn` fraction of coins whose price moved and skip the rest as unchanged.
+    """
+    provider = MockProvider(
+        coins, latency=latency, rate_limit_every=rate_limit_every, prefix=SYMBOL_PREFIX, churn=churn
+    )
+    source = _build_source(name, provider)
+
+    results = []
+    for _ in range(runs):
+        provider.tick()
+        results.append(await _run_once(source))
+
+    # Peak memory on an extra, traced run
+    provider.tick()
+    tracemalloc.start()
+    try:
+        await _run_once(source)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    await source.client.aclose()
+
+    update_runs = results[1:] or results
+    return {
+        "source": name,
+        "coins": coins,
+        "latency_ms": latency * 1000,
+        "rate_limit_every": rate_limit_every,
+        "churn": churn,
+        "runs": results,
+        "insert_records_per_sec": results[0]["records_per_sec"],
+        "update_records_per_sec": round(statistics.median(r["records_per_sec"] for r in update_runs), 1),
+        "queries_per_run": round(statistics.median(r["queries"] for r in results)),
+        "peak_memory_mb": round(peak / 2**20, 2),
+        "http_requests": provider.requests,
+        "http_429": provider.rate_limited,
+        "http_304": provider.not_modified,
+        "http_bytes": provider.bytes_sent,
+        "failed_runs": sum(1 for r in results if r["error"]),
+    }
+
+async def bench_api(requests: int, concurrency: int, cached: bool) -> List[Dict]:
+    """Fires `requests` GETs per endpoint from `concurrency` workers through the ASGI app."""
+    from app.main import app
+
+    maxsize = response_cache.maxsize
+    response_cache.clear()
+    if not cached:
+        response_cache.maxsize = 0
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path, queries in API_QUERIES.items():
+                latencies: List[float] = []
+                counter = iter(range(requests))
+
+                async def worker():
+                    for i in counter:
+                        url = path + queries[i % len(queries)]
+                        started = time.perf_counter()
+                        response = await client.get(url)
+                        latencies.append(time.perf_counter() - started)
+                        response.raise_for_status()
+
+                started = time.perf_counter()
+                with QueryCounter() as queries_run:
+                    await asyncio.gather(*(worker() for _ in range(concurrency)))
+                elapsed = time.perf_counter() - started
+                results.append({
+                    "endpoint": path,
+                    "cache": "warm" if cached else "off",
+                    "requests": requests,
+                    "concurrency": concurrency,
+                    "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+                    "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+                    "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+                    "requests_per_sec": round(requests / elapsed, 1),
+                    "queries": queries_run.count,
+                })
+    finally:
+        response_cache.maxsize = maxsize
+        response_cache.clear()
+    return results
+
+# GET /data?limit=1000 page builds compared by bench_encoding
+ENCODING_VARIANTS = ("orm_jsonable", "tuples_orjson", "projected_orjson")
+PROJECTED_FIELDS = ["symbol", "price_usd", "market_cap"]
+
+async def _legacy_page(session, limit: int) -> bytes:
+    """The pre-projection /data path: ORM entities walked by jsonable_encoder, then json.dumps."""
+    rows = (await session.execute(select(CanonicalData).order_by(CanonicalData.id).limit(limit))).scalars().all()
+    return json.dumps(jsonable_encoder({"data": rows}), separators=(",", ":")).encode()
+
+async def bench_encoding(limit: int, repeats: int) -> List[Dict]:
+    """Process CPU time per /data page build + encode (response cache bypassed), per variant."""
+    from app.api.routes.data import fetch_page
+
+    async def build(session, variant: str) -> bytes:
+        if variant == "orm_jsonable":
+            return await _legacy_page(session, limit)
+        fields = PROJECTED_FIELDS if variant == "projected_orjson" else None
+        return encode_json(await fetch_page(session, limit, sort="market_cap", fields=fields))
+
+    results = []
+    async with AsyncSessionLocal() as session:
+        for variant in ENCODING_VARIANTS:
+            await build(session, variant)  # Warm-up: statement cache, first-call imports
+            samples, size = [], 0
+            for _ in range(repeats):
+                started = time.process_time()
+                size = len(await build(session, variant))
+                samples.append(time.process_time() - started)
+            results.append({
+                "variant": variant,
+                "limit": limit,
+                "repeats": repeats,
+                "cpu_ms_p50": round(_percentile(samples, 50) * 1000, 2),
+                "cpu_ms_mean": round(statistics.fmean(samples) * 1000, 2),
+                "bytes": size,
+            })
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict, previous: Dict):
+    """Prints current vs previous for every metric both result files share."""
+    def index(report):
+        rows = {}
+        for r in report["ingestion"]:
+            key = (
+                f"ingest {r['source']} coins={r['coins']} latency={r['latency_ms']:g}ms "
+                f"429/{r['rate_limit_every']} churn={r.get('churn', 1.0):g}"
+            )
+            for metric in ("insert_records_per_sec", "update_records_per_sec", "queries_per_run", "peak_memory_mb"):
+                rows[(key, metric)] = r[metric]
+        for r in report["api"]:
+            key = f"api {r['endpoint']} cache={r['cache']} c={r['concurrency']}"
+            for metric in ("p50_ms", "p99_ms", "requests_per_sec"):
+                rows[(key, metric)] = r[metric]
+        for r in report.get("encoding", []):
+            key = f"encode /data limit={r['limit']} {r['variant']}"
+            for metric in ("cpu_ms_p50", "bytes"):
+                rows[(key, metric)] = r[metric]
+        return rows
+
+    now, before = index(current), index(previous)
+    print(f"\ncompare {previous['meta'].get('git_commit')} -> {current['meta'].get('git_commit')}")
+    for key in sorted(now.keys() & before.keys()):
+        old, new = before[key], now[key]
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"  {key[0]:<60} {key[1]:<24} {old:>12} -> {new:>12} {change:>8}")
+
+async def main(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # One log line per provider request would dominate the output
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    # The mock provider has no rate limit of its own: don't let the token bucket throttle it
+    settings.COINGECKO_RATE_PER_MIN = 1_000_000
+    # Private provider cache, always revalidated: every run asks the provider (and may get a 304)
+    settings.HTTP_CACHE_DIR = tempfile.mkdtemp(prefix="bench_http_cache_")
+    settings.HTTP_CACHE_TTL = 0
+
+    report = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "ingestion": [],
+        "api": [],
+        "encoding": [],
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    await _cleanup()
+    try:
+        for coins in args.coins:
+            for name in args.sources:
+                result = await bench_ingestion(
+                    name, coins, args.runs, latency=args.latency_ms / 1000,
+                    rate_limit_every=args.rate_limit_every, churn=args.churn,
+                )
+                report["ingestion"].append(result)
+                print(
+                    f"{name:<12} coins={coins:<6} insert={result['insert_records_per_sec']:>9.0f}/s "
+                    f"update={result['update_records_per_sec']:>9.0f}/s queries={result['queries_per_run']:<5} "
+                    f"peak={result['peak_memory_mb']:.1f}MB failed={result['failed_runs']}"
+                )
+
+        # API latency against the largest universe ingested above
+        for cached in (False, True):
+            for result in await bench_api(args.api_requests, args.concurrency, cached):
+                report["api"].append(result)
+                print(
+                    f"{result['endpoint']:<14} cache={result['cache']:<4} p50={result['p50_ms']:>7.2f}ms "
+                    f"p99={result['p99_ms']:>7.2f}ms {result['requests_per_sec']:>8.0f} req/s"
+                )
+
+        # Per-request CPU of a large /data page
+        for result in await bench_encoding(args.encode_limit, args.encode_repeats):
+            report["encoding"].append(result)
+            print(
+                f"/data limit={result['limit']:<5} {result['variant']:<17} cpu p50={result['cpu_ms_p50']:>7.2f}ms "
+                f"{result['bytes']:>9} bytes"
+            )
+    finally:
+        await _cleanup()
+        await engine.dispose()
+        shutil.rmtree(settings.HTTP_CACHE_DIR, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if previous:
+        compare(report, previous)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--coins", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCE_IDS), default=list(SOURCE_IDS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every provider response")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Every Nth provider request gets a 429")
+    parser.add_argument("--churn", type=float, default=1.0, help="Fraction of prices that move between runs")
+    parser.add_argument("--api-requests", type=int, default=500, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--encode-limit", type=int, default=1000, help="/data page size for the encoding benchmark")
+    parser.add_argument("--encode-repeats", type=int, default=50)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    asyncio.run(main(parser.parse_args()))
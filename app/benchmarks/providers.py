@@ -0,0 +1,154 @@
+"""
+Local stand-ins for the CoinGecko and CoinPaprika APIs, served through httpx.MockTransport.
+
+Both providers share one deterministic coin universe (same symbols), so benchmark runs
+exercise the cross-provider merge just like production. Every `tick()` moves the price of
+a `churn` fraction of the coins, so repeated runs take the UPDATE path for those and the
+change detection path for the rest.
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+import httpx
+
+class MockProvider:
+    """
+    Serves `coins` coins as CoinGecko /coins/markets pages and one CoinPaprika /tickers snapshot.
+    `latency` (seconds) is added to every response; every `rate_limit_every`-th request gets a 429.
+    Responses carry an ETag and honour If-None-Match, so unchanged pages come back as 304.
+    """
+
+    def __init__(
+        self,
+        coins: int,
+        latency: float = 0.0,
+        rate_limit_every: int = 0,
+        prefix: str = "bench",
+        churn: float = 1.0,
+    ):
+        self.coins = coins
+        self.churn = churn
+        # Number of ticks each coin's price has moved in
+        self.moves = [0] * coins
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.prefix = prefix
+        self.generation = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._tickers: Dict[int, bytes] = {}
+
+    def tick(self):
+        """Publishes a new market snapshot: a `churn` fraction of the coins gets a new price."""
+        self.generation += 1
+        self._tickers.clear()
+        if self.churn <= 0:
+            return
+        step = max(1, round(1 / self.churn))
+        for i in range(self.generation % step, self.coins, step):
+            self.moves[i] += 1
+
+    def _price(self, i: int) -> float:
+        return round(1000.0 / (i + 1) * (1 + 0.001 * self.moves[i]), 8)
+
+    def _market_cap(self, i: int) -> int:
+        return 10_000_000_000 // (i + 1)
+
+    def _timestamp(self, i: int) -> str:
+        # Moves with the coin's price, not the clock: an unchanged universe serves identical bytes
+        ts = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=self.moves[i])
+        return ts.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def coingecko_coin(self, i: int) -> Dict:
+        price = self._price(i)
+        return {
+            "id": f"{self.prefix}-coin-{i}",
+            "symbol": f"{self.prefix}{i}",
+            "name": f"Bench Coin {i}",
+            "image": f"https://assets.example.com/coins/{i}.png",
+            "current_price": price,
+            "market_cap": self._market_cap(i),
+            "market_cap_rank": i + 1,
+            "fully_diluted_valuation": self._market_cap(i) * 2,
+            "total_volume": self._market_cap(i) // 20,
+            "high_24h": price * 1.05,
+            "low_24h": price * 0.95,
+            "price_change_24h": price * 0.01,
+            "price_change_percentage_24h": 1.0,
+            "circulating_supply": 21_000_000.0,
+            "total_supply": 21_000_000.0,
+            "max_supply": 21_000_000.0,
+            "ath": price * 3,
+            "atl": price / 3,
+            "roi": None,
+            "last_updated": self._timestamp(i),
+        }
+
+    def coinpaprika_ticker(self, i: int) -> Dict:
+        price = self._price(i)
+        return {
+            "id": f"{self.prefix}{i}-bench-coin-{i}",
+            "name": f"Bench Coin {i}",
+            "symbol": f"{self.prefix.upper()}{i}",
+            "rank": i + 1,
+            "circulating_supply": 21_000_000,
+            "total_supply": 21_000_000,
+            "max_supply": 21_000_000,
+            "beta_value": 0.9,
+            "first_data_at": "2013-04-28T00:00:00Z",
+            "last_updated": self._timestamp(i),
+            "quotes": {
+                "USD": {
+                    "price": price,
+                    "volume_24h": self._market_cap(i) / 20,
+                    "market_cap": self._market_cap(i),
+                    "percent_change_1h": 0.1,
+                    "percent_change_24h": 1.0,
+                    "percent_change_7d": 5.0,
+                    "ath_price": price * 3,
+                },
+            },
+        }
+
+    def markets_page(self, page: int, per_page: int) -> List[Dict]:
+        first = (page - 1) * per_page
+        return [self.coingecko_coin(i) for i in range(first, min(first + per_page, self.coins))]
+
+    def tickers(self) -> bytes:
+        # Encoded once per generation: a 50k-coin snapshot is ~25MB of JSON
+        body = self._tickers.get(self.generation)
+        if body is None:
+            body = json.dumps([self.coinpaprika_ticker(i) for i in range(self.coins)]).encode()
+            self._tickers[self.generation] = body
+        return body
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        number = self.requests
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.rate_limit_every and number % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return httpx.Response(429, headers={"Retry-After": "1"})
+
+        if request.url.path.endswith("/coins/markets"):
+            params = request.url.params
+            body = json.dumps(self.markets_page(int(params["page"]), int(params["per_page"]))).encode()
+        elif request.url.path.endswith("/tickers"):
+            body = self.tickers()
+        else:
+            return httpx.Response(404)
+
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"ETag": etag})
+        self.bytes_sent += len(body)
+        return httpx.Response(200, content=body, headers={"Content-Type": "application/json", "ETag": etag})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
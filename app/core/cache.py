@@ -0,0 +1,101 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+import orjson
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.core.config import settings
+from app.core.db import reads_see_commit
+from app.core.events import data_generation
+from app.core.instrumentation import add_serialize_time
+
+class CacheEntry:
+    __slots__ = ("generation", "body", "etag")
+
+    def __init__(self, generation: int, etag: str, body: bytes):
+        self.generation = generation
+        self.etag = etag
+        self.body = body
+
+def generation_etag(token: str, key: Hashable) -> str:
+    """Generation token + query key: every replica that has seen the same commit hands out the same ETag."""
+    return '"' + hashlib.blake2b(f"{token}|{key!r}".encode(), digest_size=16).hexdigest() + '"'
+
+class ResponseCache:
+    """
+    LRU cache of encoded response bodies. An entry is only valid for the data generation
+    it was built in, so an ETL commit (local or NOTIFY'd) invalidates everything at once.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        data_generation.subscribe(lambda source_id: self.clear())
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.generation != data_generation.value:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, entry: CacheEntry) -> CacheEntry:
+        if self.maxsize <= 0:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE)
+
+def encode_json(payload: Any) -> bytes:
+    """
+    Compact JSON via orjson, which encodes dicts, lists, datetimes and UUIDs natively; anything
+    else (ORM objects, Decimal, pydantic models) falls back to jsonable_encoder.
+    """
+    return orjson.dumps(payload, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+async def cached_json(request: Request, build: Callable[[], Awaitable[dict]], cache: bool = True) -> Response:
+    """
+    Serves `build()`'s JSON from the response cache (keyed by route + query params),
+    and answers If-None-Match with 304 when the client already has these bytes.
+    Reads from a replica that hasn't replayed the generation's commit yet, and `cache=False`
+    (responses that depend on the current time), are served uncached and without an ETag.
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entry = response_cache.get(key) if cache else None
+    if entry is None:
+        # Read the generation first: a commit landing while we build makes this entry stale, not wrong
+        generation, token, commit = data_generation.value, data_generation.token, data_generation.commit
+        # Checked before the build, so the build reads at least this commit
+        cacheable = cache and await reads_see_commit(commit)
+        payload = await build()
+        started = time.perf_counter()
+        body = encode_json(payload)
+        add_serialize_time(time.perf_counter() - started)
+        if not cacheable:
+            return Response(content=body, media_type="application/json", headers={"Cache-Control": "no-cache"})
+        entry = response_cache.put(key, CacheEntry(generation, generation_etag(token, key), body))
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
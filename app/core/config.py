@@ -1,3 +1,6 @@
+import os
+import tempfile
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
 
@@ -8,12 +11,139 @@ class Settings(BaseSettings):
     POSTGRES_SERVER: str
     POSTGRES_DB: str
     COINGECKO_API_KEY: Optional[str] = None  # Secret
-    
+
+    # Connection pools. Writes (ETL) and reads (API) get separate engines, so a heavy ingestion
+    # can't take every connection an API request needs.
+    DATABASE_REPLICA_URL: Optional[str] = None  # Read replica (postgresql+asyncpg://...). Default: the primary
+    DB_POOL_SIZE: int = 5  # Write engine
+    DB_MAX_OVERFLOW: int = 10
+    DB_READ_POOL_SIZE: int = 10
+    DB_READ_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # Seconds to wait for a free connection before erroring
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced (-1 = never)
+    DB_POOL_PRE_PING: bool = True  # Check connections on checkout (survives DB restarts / idle timeouts)
+    # asyncpg prepared statements cached per connection. Set 0 behind pgbouncer in transaction mode.
+    DB_STATEMENT_CACHE_SIZE: int = 500
+
+    # ETL: set-based INSERT ... ON CONFLICT load. False = legacy row-by-row path.
+    ETL_BULK_UPSERT: bool = True
+    # Skip records whose content hash matches the last load for that (symbol, source)
+    ETL_SKIP_UNCHANGED: bool = True
+
+    # Raw payloads: batch = one compressed row per fetched batch (raw_batches), record = legacy raw_data rows
+    RAW_STORAGE_MODE: str = "batch"
+    RAW_COMPRESSION: str = "zstd"  # zstd | gzip (zstd falls back to gzip without pyarrow)
+    RAW_RETENTION_DAYS: int = 30  # Days of raw_batches kept in Postgres before archival. 0 keeps everything
+    RAW_ARCHIVE_DIR: str = "archive/raw"  # One Parquet file per archived day
+
+    # Offline replay (python -m app.ingestion.replay): re-normalizes stored raw payloads
+    REPLAY_WORKERS: int = 0  # Normalize processes. 0 = one per CPU, 1 = in-process
+    REPLAY_CHUNK_SIZE: int = 5000  # Raw records per normalize task and per commit
+
+    # CoinGecko fetching. Tier picks the rate limit (and pro endpoint): public | demo | pro
+    COINGECKO_API_TIER: str = "demo"
+    COINGECKO_RATE_PER_MIN: Optional[float] = None  # Overrides the tier default
+    COINGECKO_PER_PAGE: int = 20  # Max 250
+    COINGECKO_PAGES_PER_RUN: int = 1
+    COINGECKO_CONCURRENCY: int = 4
+    COINGECKO_PAGES_PER_TASK: int = 2  # Queue mode: pages per etl_tasks row
+
+    # Provider calls, per source: adaptive rate / concurrency (AIMD), retries and a circuit breaker
+    PROVIDER_MAX_ATTEMPTS: int = 3  # Per request, for 429 / 5xx / network errors
+    PROVIDER_RETRY_BASE: float = 1.0  # Seconds. Retry n waits a random 0 .. base * 2**n (full jitter)
+    PROVIDER_RETRY_MAX_WAIT: float = 30
+    PROVIDER_MAX_RETRY_AFTER: float = 120  # A longer Retry-After skips the request instead of waiting
+    PROVIDER_AIMD_STEP: float = 0.1  # Additive increase per success, as a fraction of the ceiling
+    PROVIDER_AIMD_FACTOR: float = 0.5  # Multiplicative decrease on 429 / 5xx
+    PROVIDER_BREAKER_FAILURES: int = 5  # Consecutive failures that open the circuit
+    PROVIDER_BREAKER_COOLDOWN: float = 60  # Seconds open before one probe request; doubles after a failed probe
+
+    # CoinPaprika: tickers per orchestrator batch (bounds memory while streaming the full list)
+    COINPAPRIKA_CHUNK_SIZE: int = 500
+    # Queue mode: tickers per etl_tasks row (rounded to whole chunks). Every task reads the full
+    # response (within HTTP_CACHE_TTL, from the cache) and loads its slice
+    COINPAPRIKA_TICKERS_PER_TASK: int = 5000
+
+    # Provider HTTP cache: gzip'd bodies + ETag/Last-Modified on disk. Empty dir disables it.
+    # Absolute, so the API and every worker on the host share it whatever their working directory
+    HTTP_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "kasparro", "http_cache")
+    HTTP_CACHE_MAX_MB: int = 256
+    HTTP_CACHE_TTL: float = 30  # Seconds a body is served without revalidating (keep below ETL intervals)
+
+    # Cross-source consensus price per symbol: median | weighted_mean (staleness-weighted)
+    CONSENSUS_METHOD: str = "median"
+    CONSENSUS_HALF_LIFE: float = 300  # Seconds for a quote's weight to halve (weighted_mean)
+    CONSENSUS_MAX_AGE: float = 3600  # Quotes older than this are ignored, unless none is fresher
+    CONSENSUS_MAX_DEVIATION: float = 0.05  # With 3+ quotes, drop those this far (fraction) from the median
+
+    # Worker daemon: seconds between the start of two runs of the same source
+    ETL_INTERVAL_COINGECKO: int = 60
+    ETL_INTERVAL_COINPAPRIKA: int = 300
+    ETL_INTERVAL_ROLLUPS: int = 60  # price_history -> 1m/1h/1d OHLC
+    ETL_INTERVAL_RAW_ARCHIVE: int = 3600  # raw_batches partitions past retention -> Parquet
+    # serial: one orchestrator run per source at a time (advisory lock).
+    # queue: each run is split into etl_tasks rows that every worker process claims (SKIP LOCKED)
+    ETL_MODE: str = "serial"
+    ETL_QUEUE_CONCURRENCY: int = 2  # Task loops per worker process
+    ETL_QUEUE_POLL_SECONDS: float = 2  # Idle loops look for work this often
+    ETL_TASK_LEASE_SECONDS: int = 120  # Renewed by heartbeats and commits; expired tasks are claimable again
+    ETL_TASK_HEARTBEAT_SECONDS: int = 30
+    ETL_TASK_MAX_ATTEMPTS: int = 3  # Then the task is FAILED and the next run re-plans its range
+    # Prometheus exporter port for the worker daemon (0 disables it)
+    WORKER_METRICS_PORT: int = 8001
+
+    # GET /history: max buckets returned when the resolution is picked automatically
+    HISTORY_MAX_POINTS: int = 1500
+
+    # API: max cached /data and /stats responses per process (LRU). 0 disables caching.
+    RESPONSE_CACHE_SIZE: int = 512
+
+    # Live quotes (GET /stream, /ws)
+    STREAM_MAX_SYMBOLS: int = 200  # Per subscription
+    STREAM_MAX_SUBSCRIBERS: int = 1000  # Per API process
+    STREAM_HEARTBEAT_SECONDS: float = 15  # SSE keep-alive comment when nothing changed
+    STREAM_COALESCE_SECONDS: float = 0.5  # Min gap between refreshes; commits in between are batched
+
+    # GET /quotes: in-memory snapshot of canonical_data, rebuilt after ETL commits (app.services.quotes)
+    QUOTES_MAX_SYMBOLS: int = 500  # Per request
+    QUOTES_REBUILD_MIN_SECONDS: float = 1  # Min gap between rebuilds; commits in between share one
+
+    # Request instrumentation (app.core.instrumentation): metrics and Server-Timing on every request
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of requests run under cProfile (0: only on X-Profile)
+    PROFILE_KEEP: int = 20  # Slowest profiled requests kept per process
+    PROFILE_MAX_SECONDS: float = 30.0  # A profile stops here even if its request (an SSE stream) goes on
+    PROFILE_MAX_AGE_SECONDS: int = 3600  # Older samples make room for new ones
+    # Required by /admin endpoints (X-Admin-Token) and by the X-Profile request header; empty disables both
+    ADMIN_TOKEN: str = ""
+
     # Constructed Database URL
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
 
+    @property
+    def DATABASE_READ_URL(self) -> str:
+        return self.DATABASE_REPLICA_URL or self.DATABASE_URL
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    return Settings()
+
+class _LazySettings:
+    """
+    `settings`, built (.env read, environment validated) on first attribute access rather than at
+    import: `python -m app.etl --help` and other code paths that never read a setting don't pay for it.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(get_settings(), name, value)
+
+    def __delattr__(self, name: str):
+        delattr(get_settings(), name)
+
+settings = _LazySettings()
@@ -1,13 +1,105 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from contextlib import asynccontextmanager
+from typing import Optional
+from sqlalchemy import select, func, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import settings
+from app.core.metrics import db_pools
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+def _create_engine(url: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # SQLAlchemy's per-connection cache of asyncpg prepared statements (hot /data queries
+            # are parsed and planned once per connection), and asyncpg's own for raw calls
+            "prepared_statement_cache_size": cache_size,
+            "statement_cache_size": cache_size,
+        },
+    )
+
+# Writes: ETL runs, checkpoints, DDL, advisory locks. Always the primary.
+engine = _create_engine(settings.DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Reads: API queries and exports. A replica when DATABASE_REPLICA_URL is set, else its own pool on the primary.
+read_engine = _create_engine(settings.DATABASE_READ_URL, settings.DB_READ_POOL_SIZE, settings.DB_READ_MAX_OVERFLOW)
+ReadSessionLocal = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+db_pools.track("write", engine)
+db_pools.track("read", read_engine)
+
 class Base(DeclarativeBase):
     pass
 
 async def get_db():
-    async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+    """Read session for API requests."""
+    async with ReadSessionLocal() as session:
+        yield session
+
+async def reads_see_commit(commit: Optional[int]) -> bool:
+    """
+    Whether read_engine already sees the transaction `commit` (a txid). Always on the primary;
+    a replica only once it has replayed it, and never for an unknown commit.
+    """
+    if not settings.DATABASE_REPLICA_URL:
+        return True
+    if commit is None:
+        return False
+    async with read_engine.connect() as conn:
+        return await conn.scalar(
+            text("SELECT txid_visible_in_snapshot(:commit, txid_current_snapshot())"), {"commit": commit}
+        )
+
+async def dispose_engines():
+    await engine.dispose()
+    await read_engine.dispose()
+
+# Alembic head this code expects (alembic/versions). Bump with every new revision.
+SCHEMA_REVISION = "0010"
+
+class SchemaOutOfDate(RuntimeError):
+    """The database isn't at SCHEMA_REVISION: run the migrations (alembic upgrade head, make migrate)."""
+
+async def check_schema(bind: Optional[AsyncEngine] = None):
+    """
+    Startup check in place of create_all: one query for the migrated revision, instead of a
+    catalog lookup per table and index on every start. Raises SchemaOutOfDate.
+    """
+    async with (bind or engine).connect() as conn:
+        try:
+            revision = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        except ProgrammingError:
+            revision = None
+    if revision != SCHEMA_REVISION:
+        raise SchemaOutOfDate(
+            f"database schema is at {revision or 'no revision'}, this code needs {SCHEMA_REVISION}: "
+            "run `alembic upgrade head` (make migrate)"
+        )
+
+# Namespace for pg advisory locks taken by this app (first key of the two-int lock)
+ADVISORY_LOCK_NAMESPACE = 7_230_001
+
+@asynccontextmanager
+async def advisory_lock(name: str):
+    """
+    Non-blocking Postgres session-level advisory lock, held on a dedicated connection
+    for the duration of the block. Yields True if we got the lock, False if another
+    process (or task) already holds it.
+    """
+    key = func.hashtext(name)
+    async with engine.connect() as conn:
+        acquired = await conn.scalar(select(func.pg_try_advisory_lock(ADVISORY_LOCK_NAMESPACE, key)))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.scalar(select(func.pg_advisory_unlock(ADVISORY_LOCK_NAMESPACE, key)))
@@ -0,0 +1,161 @@
+import asyncio
+import uuid
+from typing import Awaitable, Callable, List, Optional, Union
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.core.config import settings
+from app.core.logging import logger
+
+# Postgres channel the orchestrator notifies on every commit (payload = "<source_id>:<txid>")
+ETL_COMMIT_CHANNEL = "etl_commit"
+
+class DataGeneration:
+    """
+    Process-wide counter of "the data changed" events. Bumped locally after each
+    orchestrator commit and by CommitListener for commits made by other processes.
+    `commit` is the txid of the commit that started the generation, when known, and `token`
+    names the generation across processes: the txid, or a value unique to this process.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.commit: Optional[int] = None
+        self.token = uuid.uuid4().hex
+        self._subscribers: List[Callable[[str], None]] = []
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._subscribers.append(callback)
+
+    def bump(self, source_id: str = "", commit: Optional[int] = None):
+        self.value += 1
+        self.commit = commit
+        # Unknown commit (startup, listener reconnect, direct writes): nothing to agree on with other processes
+        self.token = str(commit) if commit is not None else uuid.uuid4().hex
+        for callback in self._subscribers:
+            try:
+                callback(source_id)
+            except Exception as e:
+                logger.error("generation_subscriber_failed", error=str(e))
+
+data_generation = DataGeneration()
+
+async def notify_commit(session: Union[AsyncSession, AsyncConnection], source_id: str) -> int:
+    """
+    Queue a NOTIFY in the current transaction. Postgres delivers it only if the transaction commits.
+    Returns the transaction's txid, for the local data_generation.bump.
+    """
+    commit = (await session.execute(select(func.txid_current()))).scalar_one()
+    await session.execute(select(func.pg_notify(ETL_COMMIT_CHANNEL, f"{source_id}:{commit}")))
+    return commit
+
+class CoalescingRefresher:
+    """
+    Runs `refresh` in a background task after data_generation bumps. Commits arriving while it
+    runs, or within `min_interval()` seconds after, share the next run (e.g. one per streamed
+    CoinPaprika chunk). `wanted` can veto a wake-up, e.g. while nobody is listening.
+    """
+
+    def __init__(
+        self,
+        refresh: Callable[[], Awaitable[None]],
+        min_interval: Callable[[], float],
+        log,
+        wanted: Callable[[], bool] = lambda: True,
+    ):
+        self._refresh = refresh
+        self._min_interval = min_interval
+        self._wanted = wanted
+        self.log = log
+        self._dirty: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        data_generation.subscribe(self._on_commit)
+
+    def _on_commit(self, source_id: str):
+        if self._dirty is not None and self._wanted():
+            self._dirty.set()
+
+    def start(self, dirty: bool = False):
+        """Starts the task unless it's running; `dirty` refreshes right away."""
+        if self._task is None or self._task.done():
+            self._dirty = asyncio.Event()
+            if dirty:
+                self._dirty.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._dirty = None
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                await self._refresh()
+            except Exception as e:
+                # Keep what we have; the next commit retries
+                self.log.warning("refresh_failed", error=str(e))
+            await asyncio.sleep(self._min_interval())
+
+class CommitListener:
+    """
+    LISTENs on ETL_COMMIT_CHANNEL over a dedicated asyncpg connection and bumps
+    data_generation, so every API replica sees commits made by the worker or other replicas.
+    Reconnects with backoff; bumps on (re)connect because notifications may have been missed.
+    """
+
+    def __init__(self, reconnect_delay: float = 5.0):
+        self.reconnect_delay = reconnect_delay
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        source_id, _, commit = payload.rpartition(":")
+        if commit.isdigit():
+            data_generation.bump(source_id, int(commit))
+        else:
+            data_generation.bump(payload)
+
+    async def _run(self):
+        import asyncpg
+
+        dsn = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda conn: closed.set())
+                await connection.add_listener(ETL_COMMIT_CHANNEL, self._on_notify)
+                data_generation.bump()
+                logger.info("commit_listener_connected", channel=ETL_COMMIT_CHANNEL)
+                await closed.wait()
+                logger.warning("commit_listener_disconnected")
+            except asyncio.CancelledError:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+                raise
+            except Exception as e:
+                logger.warning("commit_listener_error", error=str(e))
+            await asyncio.sleep(self.reconnect_delay)
+
+commit_listener = CommitListener()
@@ -0,0 +1,254 @@
+"""
+Request instrumentation: RequestMetricsMiddleware, a pure ASGI middleware around the whole API.
+
+  - per-route latency (time to response headers), SQL statement count and DB time, as
+    Prometheus histograms on /metrics
+  - a Server-Timing header on every response: db, serialize (response encoding in
+    app.core.cache) and total, so browser dev tools and curl -v show where the time went
+  - sampling profiler: PROFILE_SAMPLE_RATE of requests, or any request sending
+    X-Profile: <ADMIN_TOKEN>, runs under cProfile for at most PROFILE_MAX_SECONDS; the slowest
+    PROFILE_KEEP samples are kept in memory with their repeated SQL statements (N+1 queries)
+    for GET /api/v1/admin/profiles
+
+SQL is attributed to the request through a ContextVar read by engine events (registered on
+Engine, so the read replica counts too). Accounting stops with the last body chunk: background
+tasks that run after the response (e.g. /trigger-etl) are not billed to the request.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import itertools
+import pstats
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import HTTP_REQUEST_DB_SECONDS, HTTP_REQUEST_QUERIES, HTTP_REQUEST_SECONDS
+
+# Functions printed per profile, by cumulative time
+PROFILE_TOP_FUNCTIONS = 40
+# Distinct statements kept per profile, most executed first
+PROFILE_TOP_STATEMENTS = 20
+
+class RequestTiming:
+    """What one request spent, filled in by the engine events and cached_json while it is active."""
+
+    __slots__ = ("started", "db_seconds", "queries", "serialize_seconds", "active", "statements")
+
+    def __init__(self, record_statements: bool = False):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.serialize_seconds = 0.0
+        self.active = True
+        # Only for profiled requests: statement text -> executions
+        self.statements: Optional[Counter] = Counter() if record_statements else None
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.started
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}, total;dur={total * 1000:.2f}"
+        )
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def current_timing() -> Optional[RequestTiming]:
+    timing = _current.get()
+    return timing if timing is not None and timing.active else None
+
+def add_serialize_time(seconds: float):
+    timing = current_timing()
+    if timing is not None:
+        timing.serialize_seconds += seconds
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and current_timing() is not None:
+        context._request_query_started = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_request_query_started", None)
+    timing = current_timing()
+    if started is None or timing is None:
+        return
+    timing.db_seconds += time.perf_counter() - started
+    timing.queries += 1
+    if timing.statements is not None:
+        timing.statements[statement] += 1
+
+def _route(scope: Scope) -> str:
+    # The template (/api/v1/history/{symbol}), never the raw path: bounded label values
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+# --- Profiler ---
+
+@dataclass
+class ProfileSample:
+    id: int
+    method: str
+    path: str
+    route: str
+    status: Optional[int]  # None: no response yet when PROFILE_MAX_SECONDS cut the profile
+    duration_ms: float
+    db_ms: float
+    queries: int
+    started_at: datetime
+    stats: str = field(repr=False)
+    statements: List[Tuple[str, int]] = field(repr=False)
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "db_ms": self.db_ms,
+            "queries": self.queries,
+            "started_at": self.started_at,
+        }
+
+class Profiler:
+    """
+    Samples requests under cProfile and keeps the slowest ones. cProfile traces the whole thread,
+    so one request is profiled at a time and its stats include whatever other requests ran
+    between its awaits. A profile ends with its request or after PROFILE_MAX_SECONDS, so a
+    long-lived stream (SSE) doesn't hold the profiler for as long as its client stays.
+    """
+
+    def __init__(self):
+        self.samples: List[ProfileSample] = []
+        self._ids = itertools.count(1)
+        self._active = False
+
+    def wanted(self, scope: Scope) -> bool:
+        requested = Headers(scope=scope).get("x-profile")
+        if requested and settings.ADMIN_TOKEN and hmac.compare_digest(requested, settings.ADMIN_TOKEN):
+            return True
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    def start(self, scope: Scope) -> Optional[cProfile.Profile]:
+        if self._active or not self.wanted(scope):
+            return None
+        self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, scope: Scope, timing: RequestTiming, status: Optional[int]):
+        profile.disable()
+        self._active = False
+        duration = time.perf_counter() - timing.started
+        stream = io.StringIO()
+        pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        sample = ProfileSample(
+            id=next(self._ids),
+            method=scope["method"],
+            path=scope["path"],
+            route=_route(scope),
+            status=status,
+            duration_ms=round(duration * 1000, 2),
+            db_ms=round(timing.db_seconds * 1000, 2),
+            queries=timing.queries,
+            started_at=datetime.now(timezone.utc) - timedelta(seconds=duration),
+            stats=stream.getvalue(),
+            statements=timing.statements.most_common(PROFILE_TOP_STATEMENTS),
+        )
+        self.add(sample)
+        logger.info("request_profiled", **{k: v for k, v in sample.summary().items() if k != "started_at"})
+
+    def add(self, sample: ProfileSample):
+        now = datetime.now(timezone.utc)
+        kept = [
+            s for s in self.samples
+            if (now - s.started_at).total_seconds() <= settings.PROFILE_MAX_AGE_SECONDS
+        ]
+        kept.append(sample)
+        kept.sort(key=lambda s: s.duration_ms, reverse=True)
+        self.samples = kept[:settings.PROFILE_KEEP]
+
+    def get(self, sample_id: int) -> Optional[ProfileSample]:
+        return next((s for s in self.samples if s.id == sample_id), None)
+
+    def clear(self):
+        self.samples = []
+
+profiler = Profiler()
+
+# --- Middleware ---
+
+class RequestMetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope)
+        timing = RequestTiming(record_statements=profile is not None)
+        token = _current.set(timing)
+        status = None
+        cutoff = None
+
+        def stop_profile(final_status: Optional[int]):
+            nonlocal profile
+            if profile is None:
+                return
+            if cutoff is not None:
+                cutoff.cancel()
+            profiler.finish(profile, scope, timing, final_status)
+            profile = None
+
+        if profile is not None:
+            # Wall-clock bound: the response may still be streaming when the profile is recorded
+            cutoff = asyncio.get_running_loop().call_later(
+                settings.PROFILE_MAX_SECONDS, lambda: stop_profile(status)
+            )
+
+        def finish():
+            # 1. Stop accounting: anything after the last body chunk isn't this request's
+            timing.active = False
+            route = _route(scope)
+            if status is None:
+                # Raised before responding: ServerErrorMiddleware (outside us) answers 500
+                HTTP_REQUEST_SECONDS.labels(scope["method"], route, "500").observe(time.perf_counter() - timing.started)
+            HTTP_REQUEST_QUERIES.labels(route).observe(timing.queries)
+            HTTP_REQUEST_DB_SECONDS.labels(route).observe(timing.db_seconds)
+            # 2. Profile of a sampled request, unless PROFILE_MAX_SECONDS already ended it
+            stop_profile(status or 500)
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                HTTP_REQUEST_SECONDS.labels(scope["method"], _route(scope), str(status)).observe(
+                    time.perf_counter() - timing.started
+                )
+                message["headers"] = list(message.get("headers", []))
+                MutableHeaders(scope=message).append("Server-Timing", timing.server_timing())
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and timing.active:
+                finish()
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # No complete response (exception, client gone): still accounted for
+            if timing.active:
+                finish()
+            _current.reset(token)
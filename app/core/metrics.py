@@ -0,0 +1,143 @@
+import time
+from typing import Any, Dict
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily, REGISTRY
+
+# Per-stage ETL metrics, all labelled by source_id. Exposed by the API at /metrics
+# and by the worker daemon on WORKER_METRICS_PORT.
+
+_BATCH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+ETL_FETCH_SECONDS = Histogram(
+    "etl_fetch_seconds", "Time spent waiting for the source to produce a batch",
+    ["source_id"], buckets=_BATCH_BUCKETS,
+)
+ETL_FETCH_BYTES = Counter(
+    "etl_fetch_bytes", "Response bytes downloaded from the provider", ["source_id"],
+)
+ETL_NORMALIZE_SECONDS = Histogram(
+    "etl_normalize_seconds", "Time to normalize one batch", ["source_id"], buckets=_BATCH_BUCKETS,
+)
+ETL_REJECTED_RECORDS = Counter(
+    "etl_rejected_records", "Raw records that failed normalization", ["source_id"],
+)
+ETL_UPSERT_SECONDS = Histogram(
+    "etl_upsert_seconds", "Time to write one batch (raw, canonical, history) before commit",
+    ["source_id"], buckets=_BATCH_BUCKETS,
+)
+ETL_COMMIT_SECONDS = Histogram(
+    "etl_commit_seconds", "Time to commit one batch", ["source_id"], buckets=_BATCH_BUCKETS,
+)
+ETL_ROWS = Counter(
+    "etl_rows", "Canonical rows written, by action (inserted / updated)", ["source_id", "action"],
+)
+ETL_RECORD_CHANGES = Counter(
+    "etl_record_changes", "Normalized records by change detection result (new / changed / unchanged)",
+    ["source_id", "change"],
+)
+ETL_RUNS = Counter(
+    "etl_runs", "Orchestrator runs by outcome (success / no_data / failed)", ["source_id", "status"],
+)
+
+# Adaptive provider control (app.ingestion.adaptive)
+PROVIDER_RATE_LIMIT = Gauge("provider_rate_limit", "Current adaptive request rate (requests/s)", ["source_id"])
+PROVIDER_CONCURRENCY_LIMIT = Gauge(
+    "provider_concurrency_limit", "Current adaptive limit on concurrent requests", ["source_id"],
+)
+PROVIDER_CIRCUIT_STATE = Gauge("provider_circuit_state", "Circuit breaker: 0 closed, 1 half-open, 2 open", ["source_id"])
+PROVIDER_RETRIES = Counter(
+    "provider_retries", "Provider requests retried, by reason (429 / 5xx / network)", ["source_id", "reason"],
+)
+
+# API requests (app.core.instrumentation), by route template
+_REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Time from request to response headers", ["method", "route", "status"],
+    buckets=_REQUEST_BUCKETS,
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "http_request_queries", "SQL statements executed per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in SQL statements per request", ["route"], buckets=_REQUEST_BUCKETS,
+)
+
+# Quote snapshot (GET /quotes, API processes)
+QUOTE_SNAPSHOT_SECONDS = Histogram(
+    "quote_snapshot_build_seconds", "Time to read canonical_data into a new quote snapshot",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+QUOTE_SNAPSHOT_SYMBOLS = Gauge("quote_snapshot_symbols", "Symbols in the current quote snapshot")
+
+# Live quote streams (API processes)
+STREAM_SUBSCRIBERS = Gauge("stream_subscribers", "Open /stream and /ws subscriptions")
+STREAM_COALESCED = Counter(
+    "stream_coalesced_quotes", "Quotes replaced by a newer value before a slow client received them",
+)
+
+class _FreshnessCollector:
+    """
+    Gauges computed at scrape time from the last observed events, so they keep growing
+    while a pipeline is stalled (a plain Gauge would freeze at its last set value).
+    """
+
+    def __init__(self):
+        self.last_checkpoint: Dict[str, float] = {}
+        self.last_success: Dict[str, float] = {}
+
+    def checkpoint_advanced(self, source_id: str):
+        self.last_checkpoint[source_id] = time.time()
+
+    def run_succeeded(self, source_id: str):
+        self.last_success[source_id] = time.time()
+
+    def collect(self):
+        now = time.time()
+        lag = GaugeMetricFamily(
+            "etl_checkpoint_lag_seconds", "Seconds since the checkpoint last advanced", labels=["source_id"],
+        )
+        for source_id, ts in self.last_checkpoint.items():
+            lag.add_metric([source_id], now - ts)
+        yield lag
+
+        since = GaugeMetricFamily(
+            "etl_seconds_since_last_success", "Seconds since the last successful run", labels=["source_id"],
+        )
+        for source_id, ts in self.last_success.items():
+            since.add_metric([source_id], now - ts)
+        yield since
+
+etl_freshness = _FreshnessCollector()
+REGISTRY.register(etl_freshness)
+
+class _PoolCollector:
+    """Connection pool usage per engine role (read / write), read from the pools at scrape time."""
+
+    def __init__(self):
+        self.engines: Dict[str, Any] = {}
+
+    def track(self, role: str, engine):
+        self.engines[role] = engine
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Connections the pool keeps open", labels=["role"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections in use", labels=["role"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size", labels=["role"])
+        saturation = GaugeMetricFamily(
+            "db_pool_saturation", "Connections in use / (pool size + max overflow); 1 means requests queue",
+            labels=["role"],
+        )
+        for role, engine in self.engines.items():
+            pool = engine.sync_engine.pool
+            in_use = pool.checkedout()
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            size.add_metric([role], pool.size())
+            checked_out.add_metric([role], in_use)
+            overflow.add_metric([role], max(pool.overflow(), 0))
+            saturation.add_metric([role], in_use / capacity if capacity else 0.0)
+        yield from (size, checked_out, overflow, saturation)
+
+db_pools = _PoolCollector()
+REGISTRY.register(db_pools)
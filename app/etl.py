@@ -0,0 +1,141 @@
+"""
+ETL command line, for cron jobs and operators:
+
+    python -m app.etl run coinpaprika coingecko   # one run per source, under its advisory lock
+    python -m app.etl run --all
+    python -m app.etl replay coinpaprika --start 2024-03-01   # options: python -m app.etl replay --help
+    python -m app.etl status [--json]             # checkpoints, open queue tasks, latest runs
+
+Nothing is imported up front: arguments are parsed first, then each command imports only what it
+needs (status never loads the ingestion stack, --help not even the settings). The schema isn't
+created here: the database must be migrated (alembic upgrade head); run checks its revision.
+
+Exit status: 0 when every requested run finished or was skipped (already running elsewhere),
+1 when one failed, 2 on usage errors.
+"""
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+# status: one row per source that has a checkpoint (replay progress excluded), with its queue and its latest run
+_STATUS = """
+SELECT c.source_id, c.status, c.last_processed_offset, c.last_run_timestamp,
+       coalesce(t.open_tasks, 0) AS open_tasks,
+       r.status AS last_run_status, r.started_at AS last_run_started, r.duration_seconds AS last_run_seconds,
+       r.records AS last_run_records, r.error AS last_run_error
+FROM etl_checkpoints c
+LEFT JOIN (
+    SELECT source_id, count(*) AS open_tasks FROM etl_tasks
+    WHERE status IN ('PENDING', 'RUNNING') GROUP BY source_id
+) t ON t.source_id = c.source_id
+LEFT JOIN LATERAL (
+    SELECT status, started_at, duration_seconds, records, error FROM etl_runs
+    WHERE source_id = c.source_id ORDER BY started_at DESC LIMIT 1
+) r ON true
+WHERE c.source_id NOT LIKE :replay_prefix || '%'
+ORDER BY c.source_id
+"""
+
+async def _run(names: List[str], run_all: bool) -> int:
+    from app.core.db import check_schema, dispose_engines
+    from app.core.logging import logger
+    from app.ingestion.http import close_http_client
+    from app.ingestion.registry import SOURCES
+    from app.services.etl_service import run_source
+
+    unknown = [name for name in names if name not in SOURCES]
+    if unknown or not (names or run_all):
+        print(f"run: name sources ({', '.join(SOURCES)}) or pass --all", file=sys.stderr)
+        return 2
+    failed = False
+    try:
+        await check_schema()
+        for name in (list(SOURCES) if run_all else names):
+            try:
+                ran = await run_source(name)
+            except Exception as e:
+                # The orchestrator logged the trace and marked the checkpoint FAILED; go on with the others
+                logger.error("etl_cli_run_failed", source=name, error=str(e))
+                failed = True
+                continue
+            print(f"{name}: {'done' if ran else 'skipped (already running, or its queued run is not over)'}")
+    finally:
+        await close_http_client()
+        await dispose_engines()
+    return 1 if failed else 0
+
+async def _status(as_json: bool) -> int:
+    from sqlalchemy import text
+    from app.core.db import dispose_engines, read_engine
+    from app.services.models import REPLAY_CHECKPOINT_PREFIX
+
+    try:
+        async with read_engine.connect() as conn:
+            result = await conn.execute(text(_STATUS), {"replay_prefix": REPLAY_CHECKPOINT_PREFIX})
+            rows = [dict(row._mapping) for row in result]
+    finally:
+        await dispose_engines()
+    if as_json:
+        print(json.dumps(rows, default=str, indent=2))
+        return 0
+    if not rows:
+        print("no pipeline has run yet")
+    for row in rows:
+        last_run = "never"
+        if row["last_run_status"]:
+            last_run = (
+                f"{row['last_run_status']} at {row['last_run_started']:%Y-%m-%d %H:%M:%S%z}, "
+                f"{row['last_run_records']} records in {row['last_run_seconds'] or 0:.1f}s"
+            )
+        print(
+            f"{row['source_id']:<20} {row['status'] or '-':<8} offset={row['last_processed_offset'] or 0:<8} "
+            f"open_tasks={row['open_tasks']:<4} last run: {last_run}"
+        )
+        if row["last_run_error"]:
+            print(f"{'':<20} error: {row['last_run_error'].splitlines()[0][:160]}")
+    return 0
+
+def _replay(argv: List[str]) -> int:
+    from app.ingestion import replay
+
+    replay.main(argv, prog="python -m app.etl replay")
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.etl", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run sources once (cron)")
+    run.add_argument("sources", nargs="*", help="Registered source names, e.g. coinpaprika coingecko")
+    run.add_argument("--all", action="store_true", help="Every registered source, one after the other")
+
+    # Arguments and --help belong to app.ingestion.replay's own parser
+    commands.add_parser("replay", help="Re-normalize stored raw payloads (no network)", add_help=False)
+
+    status = commands.add_parser("status", help="Checkpoints, open queue tasks and latest runs per source")
+    status.add_argument("--json", action="store_true", help="Machine-readable output")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.command == "replay":
+        return _replay(rest or ["--help"])
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+
+    # Past argument parsing: now the command's imports
+    import asyncio
+
+    if args.command == "status":
+        return asyncio.run(_status(args.json))
+    from app.core.logging import setup_logging
+
+    setup_logging()
+    return asyncio.run(_run(args.sources, args.all))
+
+if __name__ == "__main__":
+    sys.exit(main())
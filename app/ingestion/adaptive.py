@@ -0,0 +1,309 @@
+"""
+Adaptive provider control: one ProviderController per source, between the source and cached_get.
+
+  - AIMD: every successful request raises the request rate and the concurrency limit by
+    PROVIDER_AIMD_STEP of their ceiling; a 429 or 5xx multiplies both by PROVIDER_AIMD_FACTOR,
+    at most once per DECREASE_INTERVAL (requests already in flight fail together: one signal)
+  - Retry-After is honoured: no request leaves before the provider said it may
+  - 429 / 5xx / network errors are retried (tenacity) with jittered exponential backoff
+  - circuit breaker: PROVIDER_BREAKER_FAILURES consecutive failures open it for a cooldown; then one
+    probe request goes out (half-open): success closes it, failure reopens it for twice as long
+
+The learned state is saved in the source's ETLCheckpoint.metadata_blob["provider"] by the
+orchestrator and restored when a run starts, so restarts and other workers pick it up.
+"""
+import asyncio
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional
+import httpx
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+from app.core.config import settings
+from app.core.logging import logger
+from app.core.metrics import PROVIDER_CIRCUIT_STATE, PROVIDER_CONCURRENCY_LIMIT, PROVIDER_RATE_LIMIT, PROVIDER_RETRIES
+from app.ingestion.http import CachedResponse, cached_get
+from app.ingestion.ratelimit import TokenBucket
+
+# Seconds between two multiplicative decreases
+DECREASE_INTERVAL = 1.0
+# Rate floor, as a fraction of the ceiling
+MIN_RATE_FRACTION = 1 / 64
+MAX_COOLDOWN = 900.0
+BREAKER_STATES = ("closed", "half_open", "open")
+
+class ProviderBusy(Exception):
+    """The provider answered 429 or 5xx: retried, and a congestion signal."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"provider answered {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class ProviderUnavailable(Exception):
+    """Circuit open, or Retry-After further away than PROVIDER_MAX_RETRY_AFTER: the provider isn't called."""
+
+    def __init__(self, reason: str, until: float):
+        super().__init__(f"{reason} for another {max(until - time.time(), 0.0):.1f}s")
+        self.reason = reason
+        self.until = until
+
+def retry_after_seconds(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Retry-After header value (delta-seconds or HTTP date) as seconds from now."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(when.timestamp() - (now or time.time()), 0.0)
+
+def _retry_reason(exc: BaseException) -> str:
+    if isinstance(exc, ProviderBusy):
+        return "429" if exc.status_code == 429 else "5xx"
+    return "network"
+
+class ProviderController:
+    """
+    Request gate for one source. `max_rate` (requests/s) and `max_concurrency` are the ceilings
+    AIMD climbs back to; max_rate None means only concurrency is limited.
+    """
+
+    def __init__(self, name: str, max_rate: Optional[float], max_concurrency: int, burst: float = 1.0):
+        self.name = name
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.rate = max_rate
+        self.concurrency = float(max_concurrency)
+        self.bucket = TokenBucket(max_rate, burst) if max_rate else None
+        self.breaker = "closed"
+        self.failures = 0  # Consecutive
+        self.cooldown = settings.PROVIDER_BREAKER_COOLDOWN
+        # Wall clock, so they mean the same in another process
+        self.open_until = 0.0
+        self.blocked_until = 0.0  # Retry-After
+        self.updated_at = 0.0
+        self.in_flight = 0
+        self._probing = False
+        self._slots = asyncio.Condition()
+        self._last_decrease = float("-inf")
+        self.log = logger.bind(source=name, component="provider_controller")
+        self._publish()
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self.concurrency))
+
+    def _publish(self):
+        if self.rate is not None:
+            PROVIDER_RATE_LIMIT.labels(self.name).set(self.rate)
+        PROVIDER_CONCURRENCY_LIMIT.labels(self.name).set(self.limit)
+        PROVIDER_CIRCUIT_STATE.labels(self.name).set(BREAKER_STATES.index(self.breaker))
+
+    def _changed(self):
+        self.updated_at = time.time()
+        self._publish()
+
+    def _set_rate(self, rate: float):
+        self.rate = rate
+        self.bucket.rate = rate
+
+    def _set_breaker(self, state: str):
+        if state != self.breaker:
+            self.log.warning("circuit_" + state, failures=self.failures, cooldown=self.cooldown)
+            self.breaker = state
+
+    # --- Gate ---
+
+    async def acquire(self):
+        """Waits for Retry-After, a concurrency slot and a rate token. Raises ProviderUnavailable."""
+        now = time.time()
+        if self.breaker == "open":
+            if now < self.open_until:
+                raise ProviderUnavailable("circuit open", self.open_until)
+            self._set_breaker("half_open")
+            self._changed()
+        if self.breaker == "half_open":
+            if self._probing:
+                raise ProviderUnavailable("circuit half-open, probe in flight", now)
+            self._probing = True
+
+        try:
+            wait = self.blocked_until - now
+            if wait > settings.PROVIDER_MAX_RETRY_AFTER:
+                raise ProviderUnavailable("Retry-After", self.blocked_until)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.in_flight < self.limit)
+                self.in_flight += 1
+        except BaseException:
+            self._probing = False
+            raise
+        if self.bucket is not None:
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                await self.release()
+                raise
+
+    async def release(self):
+        self._probing = False
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    # --- Signals ---
+
+    def on_success(self):
+        """Additive increase; closes a half-open circuit."""
+        self.failures = 0
+        if self.breaker != "closed":
+            self._set_breaker("closed")
+            self.cooldown = settings.PROVIDER_BREAKER_COOLDOWN
+        # Rounded: repeated float steps must land exactly on the ceiling
+        step = settings.PROVIDER_AIMD_STEP
+        self.concurrency = min(float(self.max_concurrency), round(self.concurrency + step * self.max_concurrency, 6))
+        if self.max_rate:
+            self._set_rate(min(self.max_rate, round(self.rate + step * self.max_rate, 6)))
+        self._changed()
+
+    def on_failure(self, retry_after: Optional[float] = None):
+        """Multiplicative decrease, Retry-After, and the breaker's failure count."""
+        now = time.time()
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        if time.monotonic() - self._last_decrease >= DECREASE_INTERVAL:
+            self._last_decrease = time.monotonic()
+            factor = settings.PROVIDER_AIMD_FACTOR
+            self.concurrency = max(1.0, self.concurrency * factor)
+            if self.max_rate:
+                self._set_rate(max(self.max_rate * MIN_RATE_FRACTION, self.rate * factor))
+        self.failures += 1
+        if self.breaker == "half_open":
+            # Failed probe: back off for longer
+            self.cooldown = min(self.cooldown * 2, MAX_COOLDOWN)
+            self.open_until = now + self.cooldown
+            self._set_breaker("open")
+        elif self.breaker == "closed" and self.failures >= settings.PROVIDER_BREAKER_FAILURES:
+            self.open_until = now + self.cooldown
+            self._set_breaker("open")
+        self._changed()
+
+    # --- Requests ---
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        except ProviderBusy as e:
+            self.on_failure(e.retry_after)
+            raise
+        except httpx.TransportError:
+            self.on_failure()
+            raise
+        else:
+            self.on_success()
+        finally:
+            await self.release()
+
+    def _before_retry(self, state: RetryCallState):
+        reason = _retry_reason(state.outcome.exception())
+        PROVIDER_RETRIES.labels(self.name, reason).inc()
+        self.log.info("provider_retry", reason=reason, attempt=state.attempt_number, wait=round(state.next_action.sleep, 3))
+
+    def retrying(self) -> AsyncRetrying:
+        return AsyncRetrying(
+            retry=retry_if_exception_type((ProviderBusy, httpx.TransportError)),
+            stop=stop_after_attempt(settings.PROVIDER_MAX_ATTEMPTS),
+            wait=wait_random_exponential(multiplier=settings.PROVIDER_RETRY_BASE, max=settings.PROVIDER_RETRY_MAX_WAIT),
+            before_sleep=self._before_retry,
+            reraise=True,
+        )
+
+    @asynccontextmanager
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> AsyncIterator[CachedResponse]:
+        """
+        cached_get under the controller. 429 / 5xx / network errors are retried until the response
+        starts; the body is read inside the block (the request counts as a success once it exits cleanly).
+        Raises ProviderBusy when retries run out, ProviderUnavailable without calling the provider.
+        """
+        async for attempt in self.retrying():
+            with attempt:
+                stack = AsyncExitStack()
+                try:
+                    await stack.enter_async_context(self._slot())
+                    response = await stack.enter_async_context(
+                        cached_get(client, url, params=params, headers=headers)
+                    )
+                    if response.status_code == 429 or response.status_code >= 500:
+                        raise ProviderBusy(response.status_code, retry_after_seconds(response.headers.get("retry-after")))
+                except BaseException:
+                    await stack.__aexit__(*sys.exc_info())
+                    raise
+        async with stack:
+            yield response
+
+    # --- Persistence (ETLCheckpoint.metadata_blob["provider"]) ---
+
+    def snapshot(self) -> Dict:
+        return {
+            "rate": self.rate,
+            "concurrency": self.concurrency,
+            "breaker": self.breaker,
+            "failures": self.failures,
+            "cooldown": self.cooldown,
+            "open_until": self.open_until,
+            "blocked_until": self.blocked_until,
+            "updated_at": self.updated_at,
+        }
+
+    def restore(self, state: Optional[Dict]):
+        """Adopts a saved state newer than ours (an earlier process, or another worker). Clamped to our ceilings."""
+        if not state or float(state.get("updated_at") or 0) <= self.updated_at:
+            return
+        try:
+            if self.max_rate and state.get("rate") is not None:
+                self._set_rate(min(self.max_rate, max(self.max_rate * MIN_RATE_FRACTION, float(state["rate"]))))
+            self.concurrency = min(float(self.max_concurrency), max(1.0, float(state["concurrency"])))
+            self.breaker = state["breaker"] if state.get("breaker") in BREAKER_STATES else "closed"
+            self.failures = int(state.get("failures") or 0)
+            self.cooldown = float(state.get("cooldown") or settings.PROVIDER_BREAKER_COOLDOWN)
+            self.open_until = float(state.get("open_until") or 0)
+            self.blocked_until = float(state.get("blocked_until") or 0)
+            self.updated_at = float(state["updated_at"])
+        except (KeyError, TypeError, ValueError) as e:
+            self.log.warning("provider_state_ignored", error=str(e))
+            return
+        self._publish()
+        self.log.info("provider_state_restored", **self.snapshot())
+
+class ProviderControllers:
+    """source_id -> ProviderController, shared by every instance of a source in the process."""
+
+    def __init__(self):
+        self._by_source: Dict[str, ProviderController] = {}
+
+    def get(self, source_id: str, max_rate: Optional[float], max_concurrency: int, burst: float = 1.0) -> ProviderController:
+        controller = self._by_source.get(source_id)
+        if controller is None or (controller.max_rate, controller.max_concurrency) != (max_rate, max_concurrency):
+            # New ceilings (e.g. another API tier): start over; the next run restores and clamps the saved state
+            controller = self._by_source[source_id] = ProviderController(source_id, max_rate, max_concurrency, burst)
+        return controller
+
+    def forget(self):
+        self._by_source.clear()
+
+provider_controllers = ProviderControllers()
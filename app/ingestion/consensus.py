@@ -0,0 +1,85 @@
+"""
+Cross-source consensus price.
+
+Each canonical row keeps the latest quote of every provider in `provider_data`
+({source_id: {"price", "updated_at", "last_seen"}}). Whenever a batch touches a symbol, its
+consensus is recomputed from those quotes and stored in typed columns
+(consensus_price, price_spread, source_count), so readers never parse provider_data.
+A provider's timestamps are refreshed even when its quote is skipped as unchanged, so a
+stable price doesn't age out.
+
+  1. quotes older than CONSENSUS_MAX_AGE are ignored, unless none is fresher
+  2. with 3+ quotes, those deviating more than CONSENSUS_MAX_DEVIATION from the median are outliers
+  3. the rest are combined: median, or a mean weighted by 0.5 ** (age / CONSENSUS_HALF_LIFE)
+"""
+import statistics
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+
+METHODS = ("median", "weighted_mean")
+
+@dataclass
+class Consensus:
+    price: float
+    spread: float  # (max - min) / price over the contributing quotes
+    sources: int   # Number of contributing quotes
+
+def _age(entry: Dict, now: datetime) -> float:
+    """Seconds since the provider's own timestamp (falls back to when we saw it; 0 if unknown)."""
+    stamp = entry.get("updated_at") or entry.get("last_seen")
+    if not stamp:
+        return 0.0
+    try:
+        return max((now - datetime.fromisoformat(stamp)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _quotes(providers: Dict[str, Dict], now: datetime) -> List[Tuple[float, float]]:
+    """(price, age) of every usable provider quote."""
+    quotes = []
+    for entry in providers.values():
+        price = entry.get("price") if isinstance(entry, dict) else None
+        if isinstance(price, (int, float)) and price >= 0:
+            quotes.append((float(price), _age(entry, now)))
+    return quotes
+
+def consensus(
+    providers: Optional[Dict[str, Dict]],
+    now: datetime,
+    method: Optional[str] = None,
+) -> Optional[Consensus]:
+    """Consensus of one symbol's provider quotes; None if it has no usable quote. `now` must be tz-aware."""
+    method = method or settings.CONSENSUS_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Unknown consensus method {method!r}, expected one of {METHODS}")
+
+    quotes = _quotes(providers or {}, now)
+    if not quotes:
+        return None
+
+    # 1. Staleness cut-off
+    fresh = [quote for quote in quotes if quote[1] <= settings.CONSENSUS_MAX_AGE]
+    quotes = fresh or [min(quotes, key=lambda quote: quote[1])]
+
+    # 2. Outlier rejection: with two quotes there is no majority to side with
+    if len(quotes) >= 3:
+        median = statistics.median(price for price, _ in quotes)
+        if median > 0:
+            kept = [q for q in quotes if abs(q[0] - median) / median <= settings.CONSENSUS_MAX_DEVIATION]
+            quotes = kept or quotes
+
+    # 3. Aggregate
+    prices = [price for price, _ in quotes]
+    if method == "median":
+        price = statistics.median(prices)
+    else:
+        half_life = max(settings.CONSENSUS_HALF_LIFE, 1e-9)
+        weights = [0.5 ** (age / half_life) for _, age in quotes]
+        total = sum(weights)
+        # Every quote decayed to nothing: fall back to the plain mean
+        price = sum(w * p for w, p in zip(weights, prices)) / total if total > 0 else statistics.fmean(prices)
+
+    spread = (max(prices) - min(prices)) / price if price > 0 else 0.0
+    return Consensus(price=price, spread=spread, sources=len(quotes))
@@ -0,0 +1,60 @@
+"""
+Content-hash change detection.
+
+Every normalized record gets a stable 64-bit fingerprint of the fields we store. The last
+fingerprint per (symbol, source) lives in record_hashes. Each run reads its source's hashes
+once, under the source's lock (other processes may have loaded it since), and keeps them in an
+in-process map, so unchanged records are skipped without a database round trip per batch.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.normalized import NormalizedBatch
+from app.services.models import RecordHash
+
+def fingerprints(batch: NormalizedBatch) -> np.ndarray:
+    """int64 blake2b hash of (symbol, name, price, market cap) per entry. Provider timestamps are left out."""
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(f"{symbol}\x1f{name}\x1f{price!r}\x1f{market_cap}".encode(), digest_size=8).digest(),
+                "big",
+                signed=True,
+            )
+            for symbol, name, price, market_cap in zip(
+                batch.symbol.tolist(), batch.name.tolist(), batch.price_usd.tolist(), batch.market_cap.tolist()
+            )
+        ],
+        dtype=np.int64,
+    )
+
+class RecordHashes:
+    """source_id -> {symbol: hash} for the last committed load. Only updated after a commit."""
+
+    def __init__(self):
+        self._by_source: Dict[str, Dict[str, int]] = {}
+
+    async def load(self, session: AsyncSession, source_id: str) -> Dict[str, int]:
+        """Hashes for one source, read from the database unless this run already did (see forget)."""
+        known = self._by_source.get(source_id)
+        if known is None:
+            rows = await session.execute(
+                select(RecordHash.symbol, RecordHash.hash).where(RecordHash.source == source_id)
+            )
+            known = self._by_source[source_id] = dict(rows.all())
+        return known
+
+    def update(self, source_id: str, hashes: Dict[str, int]):
+        self._by_source.setdefault(source_id, {}).update(hashes)
+
+    def forget(self, source_ids: Optional[Iterable[str]] = None):
+        """Drops cached hashes (all sources by default), e.g. after their rows were deleted."""
+        if source_ids is None:
+            self._by_source.clear()
+            return
+        for source_id in source_ids:
+            self._by_source.pop(source_id, None)
+
+record_hashes = RecordHashes()
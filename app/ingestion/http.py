@@ -0,0 +1,324 @@
+"""
+Shared HTTP layer for sources: one pooled client, plus a conditional-request cache.
+
+ResponseCache keeps the last 200 body per request (URL + params) gzip-compressed on disk,
+with its ETag / Last-Modified validators:
+  - younger than the TTL: served from disk without asking the provider (reruns, backfills, tests)
+  - otherwise: revalidated with If-None-Match / If-Modified-Since; a 304 means "no new data"
+A body's validators are only sent once the caller confirmed it (CachedResponse.confirm, after the
+data read from it was committed): a body whose load failed is fetched in full again, never
+answered with a 304 that would skip it.
+The directory is size-bounded; least recently used bodies are evicted first.
+"""
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import httpx
+from app.core.config import settings
+from app.core.logging import logger
+
+# Shared, pooled client for all sources: one TLS handshake per host, reused across pages and runs.
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0),
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+_READ_CHUNK = 64 * 1024
+
+class CachedResponse:
+    """
+    A provider response for sources: either live (teed into the cache while it is read)
+    or replayed from disk (`from_cache`). `not_modified` is set when the provider answered 304;
+    the previous body is still readable.
+    """
+
+    def __init__(
+        self,
+        status_code: int,
+        response: Optional[httpx.Response] = None,
+        cache: Optional["ResponseCache"] = None,
+        key: Optional[str] = None,
+        meta: Optional[Dict] = None,
+        from_cache: bool = False,
+        not_modified: bool = False,
+    ):
+        self.status_code = status_code
+        self.response = response
+        self.from_cache = from_cache
+        self.not_modified = not_modified
+        self._cache = cache
+        self._key = key
+        self._meta = meta
+        self._iterator: Optional[AsyncIterator[bytes]] = None
+        # The body is on disk (replayed, or fully read and committed to the cache)
+        self._stored = from_cache
+        self._confirmed = False
+
+    @property
+    def headers(self) -> httpx.Headers:
+        return self.response.headers if self.response is not None else httpx.Headers()
+
+    @property
+    def num_bytes_downloaded(self) -> int:
+        return self.response.num_bytes_downloaded if self.response is not None else 0
+
+    def raise_for_status(self):
+        if self.response is not None and not self.not_modified:
+            self.response.raise_for_status()
+
+    def confirm(self):
+        """
+        What was read from this body is committed: revalidation may trust it from now on.
+        Before the body is stored (a parser that stopped early), it takes effect once it is.
+        """
+        self._confirmed = True
+        if self._stored and self._meta is not None:
+            self._cache.confirm(self._key, self._meta)
+
+    def aiter_bytes(self) -> AsyncIterator[bytes]:
+        self._iterator = self._iter_body()
+        return self._iterator
+
+    async def finish(self, complete: bool):
+        """
+        Called when the request block exits. A body the caller stopped reading early (e.g. a JSON
+        parser that returns at the closing bracket) is drained so it gets cached; on errors it is dropped.
+        """
+        if self._iterator is None:
+            return
+        if complete:
+            async for _ in self._iterator:
+                pass
+        else:
+            await self._iterator.aclose()
+
+    async def _iter_body(self) -> AsyncIterator[bytes]:
+        if self.response is None or self.not_modified:
+            for chunk in self._cache.read(self._key):
+                yield chunk
+            return
+
+        writer = self._cache.writer(self._key) if self._cache is not None and self.status_code == 200 else None
+        try:
+            async for chunk in self.response.aiter_bytes():
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+        except BaseException:
+            if writer is not None:
+                writer.close()
+                self._cache.discard(self._key)
+            raise
+        # Only a fully read body is cached
+        if writer is not None:
+            writer.close()
+            self._cache.commit(self._key, self._meta)
+            self._stored = True
+            if self._confirmed:
+                self._cache.confirm(self._key, self._meta)
+
+    async def aiter_text(self) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        async for chunk in self.aiter_bytes():
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    async def aread(self) -> bytes:
+        return b"".join([chunk async for chunk in self.aiter_bytes()])
+
+    async def json(self):
+        return json.loads(await self.aread())
+
+class ResponseCache:
+    """On-disk, size-bounded cache of gzip-compressed response bodies with HTTP validators."""
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        self.log = logger.bind(component="http_cache")
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        query = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return hashlib.sha256(json.dumps([url, query]).encode()).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.gz")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Metadata of a complete cached body, or None."""
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if os.path.exists(self._body_path(key)) else None
+
+    def _save_meta(self, key: str, meta: Dict):
+        tmp = self._meta_path(key) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._meta_path(key))
+
+    def touch(self, key: str, meta: Dict):
+        """Marks a cached body as revalidated now (after a 304)."""
+        meta["fetched_at"] = time.time()
+        self._save_meta(key, meta)
+
+    def read(self, key: str):
+        # Local disk and mostly small bodies: plain blocking reads are cheaper than a thread hop
+        path = self._body_path(key)
+        os.utime(path)  # LRU clock for eviction
+        with gzip.open(path, "rb") as f:
+            while chunk := f.read(_READ_CHUNK):
+                yield chunk
+
+    def writer(self, key: str):
+        return gzip.open(self._body_path(key) + ".tmp", "wb", compresslevel=6)
+
+    def discard(self, key: str):
+        try:
+            os.remove(self._body_path(key) + ".tmp")
+        except OSError:
+            pass
+
+    def commit(self, key: str, meta: Dict):
+        """Stores a fully read body. Its validators stay unconfirmed until confirm()."""
+        os.replace(self._body_path(key) + ".tmp", self._body_path(key))
+        meta["fetched_at"] = time.time()
+        meta["confirmed"] = False
+        meta["size"] = os.path.getsize(self._body_path(key))
+        self._save_meta(key, meta)
+        self._evict()
+
+    def confirm(self, key: str, meta: Dict):
+        """Marks the stored body `meta` describes as loaded, unless another fetch replaced it meanwhile."""
+        current = self.lookup(key)
+        if current is None or current["fetched_at"] != meta["fetched_at"] or current.get("confirmed"):
+            return
+        current["confirmed"] = True
+        self._save_meta(key, current)
+
+    def _evict(self):
+        bodies = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".gz"):
+                stat = entry.stat()
+                bodies.append((stat.st_mtime, stat.st_size, entry.name[:-3]))
+        total = sum(size for _, size, _ in bodies)
+        for _, size, key in sorted(bodies):
+            if total <= self.max_bytes:
+                break
+            for path in (self._body_path(key), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            self.log.info("evicted", key=key, size=size)
+
+    @asynccontextmanager
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict[str, str]] = None,
+        ttl: Optional[float] = None,
+    ) -> AsyncIterator[CachedResponse]:
+        """GET through the cache. The body must be read inside the block."""
+        key = self.key(url, params)
+        meta = self.lookup(key)
+        ttl = self.ttl if ttl is None else ttl
+        if meta is not None and time.time() - meta["fetched_at"] < ttl:
+            async with self._reading(CachedResponse(200, cache=self, key=key, meta=meta, from_cache=True)) as response:
+                yield response
+            return
+
+        headers = dict(headers or {})
+        if meta is not None and meta.get("confirmed"):
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        async with client.stream("GET", url, params=params, headers=headers) as response:
+            if response.status_code == 304 and meta is not None and meta.get("confirmed"):
+                self.touch(key, meta)
+                cached = CachedResponse(304, response, cache=self, key=key, from_cache=True, not_modified=True)
+            else:
+                new_meta = {
+                    "url": url,
+                    "etag": response.headers.get("etag"),
+                    "last_modified": response.headers.get("last-modified"),
+                }
+                cached = CachedResponse(response.status_code, response, cache=self, key=key, meta=new_meta)
+            async with self._reading(cached) as cached:
+                yield cached
+
+    @asynccontextmanager
+    async def _reading(self, response: CachedResponse) -> AsyncIterator[CachedResponse]:
+        try:
+            yield response
+        except BaseException:
+            await response.finish(complete=False)
+            raise
+        await response.finish(complete=True)
+
+_cache: Optional[ResponseCache] = None
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide provider cache from settings; None when HTTP_CACHE_DIR is empty."""
+    global _cache
+    if not settings.HTTP_CACHE_DIR:
+        return None
+    if (
+        _cache is None
+        or _cache.directory != settings.HTTP_CACHE_DIR
+        or _cache.ttl != settings.HTTP_CACHE_TTL
+    ):
+        _cache = ResponseCache(settings.HTTP_CACHE_DIR, settings.HTTP_CACHE_MAX_MB * 2**20, settings.HTTP_CACHE_TTL)
+    return _cache
+
+@asynccontextmanager
+async def cached_get(
+    client: httpx.AsyncClient,
+    url: str,
+    params: Optional[Dict] = None,
+    headers: Optional[Dict[str, str]] = None,
+    ttl: Optional[float] = None,
+) -> AsyncIterator[CachedResponse]:
+    """GET through the process-wide cache, or straight through when it is disabled."""
+    cache = get_response_cache()
+    if cache is not None:
+        async with cache.request(client, url, params=params, headers=headers, ttl=ttl) as response:
+            yield response
+        return
+    async with client.stream("GET", url, params=params, headers=headers) as response:
+        yield CachedResponse(response.status_code, response)
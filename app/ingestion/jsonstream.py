@@ -0,0 +1,45 @@
+import json
+from typing import Any, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+async def iter_json_array(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """
+    Incrementally parses a top-level JSON array from text chunks and yields its elements
+    one at a time. Only the current (partial) element is ever buffered, so memory is bounded
+    by the largest element, not by the response size.
+    """
+    buf = ""
+    pos = 0
+    started = False
+    async for chunk in chunks:
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"Expected a JSON array, got {buf[pos]!r}")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            if buf[pos] == ",":
+                pos += 1
+                continue
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Element is split across chunks: wait for more data
+                break
+            if end == len(buf) and not isinstance(item, (dict, list)):
+                # A scalar at the very end of the buffer may be truncated (e.g. "12" of "123")
+                break
+            yield item
+            pos = end
+    raise ValueError("Truncated JSON array")
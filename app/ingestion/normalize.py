@@ -0,0 +1,139 @@
+"""
+Vectorized normalization helpers shared by every source.
+
+A source pulls each field out of the raw batch as a plain list (`column`), then `build_batch`
+coerces and validates all of them at once with NumPy, instead of building one Pydantic model
+per record. Records failing validation become `Reject`s with a reason rather than exceptions.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.schemas.normalized import NormalizedBatch, Reject
+
+# Largest market cap that survives the float64 -> BIGINT conversion
+_MAX_INT64_FLOAT = float(2**63 - 1024)
+
+def column(records: List[Dict], *path: str) -> List[Any]:
+    """record[path[0]][path[1]]... for every record; None where a level is missing or not a dict."""
+    values = []
+    for value in records:
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        values.append(value)
+    return values
+
+def _as_object(values: List[Any]) -> np.ndarray:
+    # np.asarray would turn nested lists into extra dimensions
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def to_float(values: List[Any]) -> np.ndarray:
+    """float64 array; NaN where a value is missing or not numeric."""
+    try:
+        # C-level conversion: numbers, numeric strings, and None (-> NaN)
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        result = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                result[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return result
+
+def to_text(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """(stripped str array, valid mask). Missing and blank values are invalid."""
+    array = _as_object(values)
+    present = np.not_equal(array, None)
+    text = np.char.strip(array.astype(str))
+    return text, present & (text != "")
+
+def _parse_timestamp(text: str) -> np.datetime64:
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return np.datetime64("NaT", "us")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(parsed, "us")
+
+def to_datetime(values: List[Any], default: np.datetime64) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (datetime64[us] UTC array, valid mask) from ISO 8601 strings.
+    Missing values get `default`; unparseable ones are invalid.
+    """
+    array = _as_object(values)
+    missing = np.equal(array, None) | np.equal(array, "")
+    text = np.where(missing, "NaT", array).astype(str)
+    # NumPy only parses naive timestamps: drop the UTC designator, other offsets take the slow path
+    text = np.char.replace(np.char.replace(text, "+00:00", ""), "Z", "")
+    offset = (np.char.find(text, "+", 10) >= 0) | (np.char.rfind(text, "-") > 10)
+    parsed = np.full(len(text), np.datetime64("NaT", "us"))
+    try:
+        parsed[~offset] = text[~offset].astype("datetime64[us]")
+    except ValueError:
+        parsed[~offset] = [_parse_timestamp(t) for t in text[~offset]]
+    if offset.any():
+        parsed[offset] = [_parse_timestamp(t) for t in text[offset]]
+    invalid = np.isnat(parsed) & ~missing
+    parsed[missing] = default
+    return parsed, ~invalid
+
+def build_batch(
+    source: str,
+    *,
+    external_id: List[Any],
+    symbol: List[Any],
+    name: List[Any],
+    price: List[Any],
+    market_cap: List[Any],
+    last_updated: List[Any],
+    now: Optional[datetime] = None,
+) -> NormalizedBatch:
+    """
+    Coerces and validates raw columns (all the same length as the raw batch) into a NormalizedBatch.
+    Symbols are upper-cased so every provider merges into the same canonical row.
+    A missing or non-positive market cap becomes 0 (unknown); a missing timestamp becomes `now`.
+    """
+    now = now or datetime.now(timezone.utc)
+    default_ts = np.datetime64(now.astimezone(timezone.utc).replace(tzinfo=None), "us")
+
+    external_ids, id_ok = to_text(external_id)
+    symbols, symbol_ok = to_text(symbol)
+    names, name_ok = to_text(name)
+    prices = to_float(price)
+    price_ok = np.isfinite(prices) & (prices >= 0)
+    caps = to_float(market_cap)
+    caps = np.where(np.isfinite(caps) & (caps > 0), np.minimum(caps, _MAX_INT64_FLOAT), 0).astype(np.int64)
+    timestamps, ts_ok = to_datetime(last_updated, default_ts)
+
+    # First failing check wins the reject reason
+    checks = [
+        (id_ok, "missing id"),
+        (symbol_ok, "missing symbol"),
+        (name_ok, "missing name"),
+        (price_ok, "invalid price"),
+        (ts_ok, "invalid last_updated"),
+    ]
+    ok = np.logical_and.reduce([passed for passed, _ in checks])
+    rejected = np.flatnonzero(~ok)
+    rejects = []
+    if rejected.size:
+        reasons = np.select(
+            [~passed[rejected] for passed, _ in checks], [reason for _, reason in checks], default="invalid"
+        )
+        rejects = [Reject(index, reason) for index, reason in zip(rejected.tolist(), reasons.tolist())]
+
+    keep = np.flatnonzero(ok)
+    return NormalizedBatch(
+        source=source,
+        index=keep,
+        external_id=external_ids[keep],
+        symbol=np.char.upper(symbols[keep]),
+        name=names[keep],
+        price_usd=prices[keep],
+        market_cap=caps[keep],
+        last_updated=timestamps[keep],
+        rejects=rejects,
+    )
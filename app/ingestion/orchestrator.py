@@ -1,127 +1,611 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from collections import Counter
+from contextlib import aclosing
+from typing import Callable, List, Dict, Optional, AsyncIterator, Set
+import json
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.services.models import ETLCheckpoint, RawData, CanonicalData
+from sqlalchemy import select, insert, literal_column, text
+from sqlalchemy.dialects.postgresql import JSONB
+from app.schemas.normalized import NormalizedBatch
+from app.services.models import ETLCheckpoint, ETLRun, RawData, CanonicalData
+from app.services.history import ensure_partition
+from app.services import raw_store
+from app.core.config import settings
+from app.core.events import data_generation, notify_commit
 from app.core.logging import logger
+from app.core.metrics import (
+    ETL_FETCH_SECONDS, ETL_NORMALIZE_SECONDS, ETL_REJECTED_RECORDS, ETL_UPSERT_SECONDS,
+    ETL_FETCH_BYTES, ETL_COMMIT_SECONDS, ETL_ROWS, ETL_RECORD_CHANGES, ETL_RUNS, etl_freshness,
+)
+from app.ingestion import tasks
+from app.ingestion.adaptive import ProviderController
+from app.ingestion.consensus import consensus
+from app.ingestion.fingerprints import fingerprints, record_hashes
 from datetime import datetime, timezone
+import time
 import traceback
 
+# Rows per statement. Keeps multi-row INSERTs well under asyncpg's 32767 bind parameter limit.
+BULK_CHUNK_SIZE = 1000
+
+# The hot-path statements take whole columns as arrays (unnest): one cached statement however
+# many rows, instead of compiling a multi-row VALUES with a bind parameter per cell.
+_UPSERT_CANONICAL = """
+INSERT INTO canonical_data AS c (
+    symbol, name, price_usd, market_cap, last_updated, provider_data, consensus_price, price_spread, source_count
+)
+-- A fresh row only has this provider's quote: it is its own consensus. Conflicting rows are recomputed after.
+SELECT v.symbol, v.name, v.price, v.market_cap, :loaded_at, CAST(v.provider_data AS jsonb), v.price, 0, 1
+FROM unnest(
+    CAST(:symbols AS text[]), CAST(:names AS text[]), CAST(:prices AS double precision[]),
+    CAST(:market_caps AS bigint[]), CAST(:provider_data AS text[])
+) AS v(symbol, name, price, market_cap, provider_data)
+ON CONFLICT (symbol) DO UPDATE SET
+    price_usd = EXCLUDED.price_usd,
+    market_cap = coalesce(nullif(EXCLUDED.market_cap, 0), c.market_cap),
+    last_updated = EXCLUDED.last_updated,
+    provider_data = coalesce(c.provider_data, '{}'::jsonb) || EXCLUDED.provider_data
+-- Replaying an old window must not roll a row back: rows written since keep their values (and aren't returned)
+WHERE c.last_updated IS NULL OR c.last_updated <= EXCLUDED.last_updated
+RETURNING c.id, c.symbol, xmax = 0 AS inserted, c.provider_data
+"""
+
+_INSERT_HISTORY = """
+INSERT INTO price_history (symbol_id, source, ts, price, market_cap)
+SELECT v.symbol_id, :source, :ts, v.price, nullif(v.market_cap, 0)
+FROM unnest(
+    CAST(:symbol_ids AS integer[]), CAST(:prices AS double precision[]), CAST(:market_caps AS bigint[])
+) AS v(symbol_id, price, market_cap)
+ON CONFLICT DO NOTHING
+"""
+
+_UPSERT_HASHES = """
+INSERT INTO record_hashes (symbol, source, hash, updated_at)
+SELECT v.symbol, :source, v.hash, :updated_at
+FROM unnest(CAST(:symbols AS text[]), CAST(:hashes AS bigint[])) AS v(symbol, hash)
+ON CONFLICT (symbol, source) DO UPDATE SET hash = EXCLUDED.hash, updated_at = EXCLUDED.updated_at
+"""
+
+_UPDATE_CONSENSUS = """
+UPDATE canonical_data AS c
+SET consensus_price = v.price, price_spread = v.spread, source_count = v.sources
+FROM unnest(
+    CAST(:ids AS integer[]), CAST(:prices AS double precision[]),
+    CAST(:spreads AS double precision[]), CAST(:counts AS integer[])
+) AS v(id, price, spread, sources)
+WHERE c.id = v.id
+"""
+
+# Rows skipped as unchanged still get this provider's quote time and last_seen, so consensus
+# staleness follows when the quote was last observed, not when its price last changed
+_TOUCH_QUOTES = """
+UPDATE canonical_data AS c
+SET provider_data = jsonb_set(
+    jsonb_set(c.provider_data, ARRAY[CAST(:source AS text), 'updated_at'], to_jsonb(v.updated_at)),
+    ARRAY[CAST(:source AS text), 'last_seen'], to_jsonb(CAST(:last_seen AS text))
+)
+FROM unnest(CAST(:symbols AS text[]), CAST(:updated_at AS text[])) AS v(symbol, updated_at)
+WHERE c.symbol = v.symbol AND c.provider_data ? CAST(:source AS text)
+"""
+
 class BaseSource(ABC):
     """Abstract Base Class for all Data Sources"""
-    
+
+    # Sources that call a provider set this (app.ingestion.adaptive); its state is kept in the checkpoint
+    controller: Optional[ProviderController] = None
+
     def __init__(self, source_id: str):
         self.source_id = source_id
+        # Provider response bytes downloaded by this instance (see count_bytes)
+        self.bytes_fetched = 0
+        # Offset at which the stream ended, once a stream reached its end (queue mode plans with it)
+        self.stream_size: Optional[int] = None
+        # Callbacks for the batch about to be yielded, run once the orchestrator has committed it
+        self._on_commit: List[Callable[[], None]] = []
+
+    def on_commit(self, callback: Callable[[], None]):
+        """
+        Registers `callback` for the next batch this source yields: it runs after that batch is
+        committed, and never if its load fails (e.g. confirming the HTTP response it came from).
+        """
+        self._on_commit.append(callback)
+
+    def batch_committed(self):
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def count_bytes(self, count: int):
+        """Sources report downloaded response bytes here: feeds the metric and the run record."""
+        self.bytes_fetched += count
+        ETL_FETCH_BYTES.labels(self.source_id).inc(count)
 
     @abstractmethod
     async def fetch_data(self, last_offset: int) -> tuple[List[Dict], int]:
         """Returns (data_batch, new_offset)"""
         pass
 
+    async def stream_batches(self, last_offset: int) -> AsyncIterator[tuple[List[Dict], int]]:
+        """
+        Yields (data_batch, new_offset) pairs as they become available.
+        The orchestrator loads and checkpoints each one before pulling the next.
+        Default: a single fetch_data call.
+        """
+        yield await self.fetch_data(last_offset)
+
+    def plan_tasks(self, offset: int, stream_size: Optional[int] = None) -> List[tuple[int, Optional[int]]]:
+        """
+        Queue mode: splits the run starting at `offset` into (start, end] offset ranges, one task each.
+        end None = to the end of the stream. Default: a single task.
+        """
+        return [(offset, None)]
+
+    async def stream_range(self, start: int, end: Optional[int]) -> AsyncIterator[tuple[List[Dict], int]]:
+        """Queue mode: stream_batches from `start`, stopping once the offset reaches `end`."""
+        async with aclosing(self.stream_batches(start)) as batches:
+            async for batch, new_offset in batches:
+                yield batch, new_offset
+                if end is not None and new_offset >= end:
+                    return
+
     @abstractmethod
-    def normalize(self, raw_record: Dict) -> Any:
-        """Pure function to convert raw dict to Pydantic Schema"""
+    def normalize(self, raw_data: List[Dict]) -> NormalizedBatch:
+        """
+        Pure function converting a whole raw batch into columns (see app.ingestion.normalize).
+        Bad records go to `rejects` with a reason; they must not raise.
+        """
         pass
 
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 class IngestionOrchestrator:
-    def __init__(self, session: AsyncSession, source: BaseSource):
+    def __init__(
+        self,
+        session: AsyncSession,
+        source: BaseSource,
+        bulk: Optional[bool] = None,
+        skip_unchanged: Optional[bool] = None,
+        raw_mode: Optional[str] = None,
+        task: Optional[tasks.TaskLease] = None,
+    ):
         self.session = session
         self.source = source
+        # Queue mode: run one leased task's range; progress goes to the task, not the checkpoint
+        self.task = task
+        # bulk=False falls back to the legacy row-by-row SELECT + ORM merge path
+        self.bulk = settings.ETL_BULK_UPSERT if bulk is None else bulk
+        self.skip_unchanged = settings.ETL_SKIP_UNCHANGED if skip_unchanged is None else skip_unchanged
+        # batch: one compressed raw_batches row per batch; record: one raw_data row per record
+        self.raw_mode = raw_mode or settings.RAW_STORAGE_MODE
+        # Symbols the last merge() left alone because their row was written after the batch
+        self.stale_symbols: Set[str] = set()
+        if self.raw_mode not in ("batch", "record"):
+            raise ValueError(f"Unknown RAW_STORAGE_MODE {self.raw_mode!r}, expected batch or record")
+        # Run summary: records fetched / rejected, canonical rows written, and change detection counts
+        self.summary = {
+            "records": 0, "rejected": 0, "inserted": 0, "updated": 0, "new": 0, "changed": 0, "unchanged": 0,
+        }
         self.log = logger.bind(source=source.source_id)
 
     async def run(self):
-        # 1. Load Checkpoint
+        # 1. Load Checkpoint (queue mode: the task's progress), and open the run record (etl_runs)
+        task = self.task
         checkpoint = await self.session.get(ETLCheckpoint, self.source.source_id)
-        if not checkpoint:
+        if not checkpoint and task is None:
             checkpoint = ETLCheckpoint(source_id=self.source.source_id, last_processed_offset=0)
             self.session.add(checkpoint)
-            await self.session.commit()
-            
-        current_offset = checkpoint.last_processed_offset
-        self.log.info("ingestion_start", offset=current_offset)
+        if self.source.controller is not None and checkpoint is not None:
+            # What earlier runs (this process, a previous one, another worker) learned about the provider
+            self.source.controller.restore((checkpoint.metadata_blob or {}).get("provider"))
+        self.source.stream_size = None
+        self.source._on_commit = []
+        # Another process (worker replica, API trigger, CLI, queue task) may have loaded this source
+        # since our last run: its hashes are read again, once, under the source's lock
+        record_hashes.forget([self.source.source_id])
+        run_started = time.perf_counter()
+        bytes_before = self.source.bytes_fetched
+        run = ETLRun(source_id=self.source.source_id, started_at=datetime.now(timezone.utc), status="RUNNING")
+        self.session.add(run)
+        await self.session.commit()
+
+        if task is None:
+            current_offset = checkpoint.last_processed_offset
+            stream = self.source.stream_batches(current_offset)
+        else:
+            current_offset = task.progress_offset
+            stream = self.source.stream_range(current_offset, task.end_offset)
+        self.log.info("ingestion_start", offset=current_offset, bulk=self.bulk, task=task.id if task else None)
 
+        source_id = self.source.source_id
+        summary = self.summary
         try:
-            # 2. Fetch Data (Incremental)
-            raw_batch, new_offset = await self.source.fetch_data(current_offset)
-            
-            if not raw_batch:
-                self.log.info("no_new_data")
-                return
+            # 2. Fetch Data (Incremental). Sources may stream several batches per run.
+            async with aclosing(stream) as batches:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        raw_batch, new_offset = await batches.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    ETL_FETCH_SECONDS.labels(source_id).observe(time.perf_counter() - started)
 
-            # 3. Process Batch
-            for record in raw_batch:
-                # A. Store Raw (EL)
-                raw_entry = RawData(source_id=self.source.source_id, payload=record)
-                self.session.add(raw_entry)
-                
-                # B. Normalize & Validate (T)
-                try:
-                    # Note: normalize now returns a list because one raw record could equal multiple coins, 
-                    # but usually it's 1-to-1. We handle the 1-to-1 case here.
-                    clean_data_list = self.source.normalize([record])
-                    if not clean_data_list:
+                    if not raw_batch and new_offset == current_offset:
                         continue
-                        
-                    clean_data = clean_data_list[0]
-                    
-                    # C. Load Canonical (Normalization Logic)
-                    # FIX: Query by SYMBOL (Unique ID), not by Source+ExternalID
-                    stmt = select(CanonicalData).where(
-                        CanonicalData.symbol == clean_data.symbol
-                    )
-                    existing = (await self.session.execute(stmt)).scalar_one_or_none()
-                    
-                    current_time = datetime.now(timezone.utc)
-                    
-                    if existing:
-                        # UPDATE existing coin (Merge Strategy)
-                        existing.price_usd = clean_data.price_usd
-                        existing.market_cap = clean_data.market_cap or existing.market_cap
-                        existing.last_updated = current_time
-                        
-                        # Merge provider specific data into JSON
-                        # We must create a new dict to ensure SQLAlchemy detects the change
-                        current_providers = dict(existing.provider_data) if existing.provider_data else {}
-                        current_providers[self.source.source_id] = {
-                            "price": clean_data.price_usd,
-                            "last_seen": str(current_time)
-                        }
-                        existing.provider_data = current_providers
-                        
+
+                    # 3. Process Batch (Normalize, then Raw + Canonical)
+                    pending_hashes: Dict[str, int] = {}
+                    unchanged = None
+                    changes = {"new": 0, "changed": 0, "unchanged": 0}
+                    if raw_batch:
+                        started = time.perf_counter()
+                        normalized = self.source.normalize(raw_batch)
+                        ETL_NORMALIZE_SECONDS.labels(source_id).observe(time.perf_counter() - started)
+                        if normalized.rejects:
+                            ETL_REJECTED_RECORDS.labels(source_id).inc(len(normalized.rejects))
+                            summary["rejected"] += len(normalized.rejects)
+                            self.log.warning(
+                                "records_rejected",
+                                count=len(normalized.rejects),
+                                reasons=dict(Counter(reject.reason for reject in normalized.rejects)),
+                            )
+
+                        started = time.perf_counter()
+                        if self.skip_unchanged:
+                            to_load, normalized, pending_hashes, changes, unchanged = await self._detect_changes(
+                                raw_batch, normalized
+                            )
+                        else:
+                            to_load = raw_batch
+
+                        if self.bulk:
+                            inserted, updated = await self._load_bulk(to_load, normalized)
+                        else:
+                            inserted, updated = await self._load_row_by_row(to_load, normalized)
+                        await self.save_hashes(pending_hashes)
+                        await self.touch_quotes(unchanged)
+                        ETL_UPSERT_SECONDS.labels(source_id).observe(time.perf_counter() - started)
+
+                    # 4. Update Checkpoint (queue mode: the task's progress, which fails if we lost the lease)
+                    if task is None:
+                        checkpoint.last_processed_offset = new_offset
+                        checkpoint.last_run_timestamp = datetime.now(timezone.utc)
+                        checkpoint.status = "SUCCESS"
+                        self._save_metadata(checkpoint)
                     else:
-                        # INSERT new coin
-                        new_entry = CanonicalData(
-                            symbol=clean_data.symbol,
-                            name=clean_data.name,
-                            price_usd=clean_data.price_usd,
-                            market_cap=clean_data.market_cap,
-                            last_updated=current_time,
-                            provider_data={
-                                self.source.source_id: {
-                                    "price": clean_data.price_usd,
-                                    "last_seen": str(current_time)
-                                }
-                            }
-                        )
-                        self.session.add(new_entry)
-                        
-                except Exception as e:
-                    self.log.error("normalization_error", error=str(e), record=record)
-                    continue
-
-            # 4. Update Checkpoint
-            checkpoint.last_processed_offset = new_offset
-            checkpoint.status = "SUCCESS"
-            
-            # 5. ATOMIC COMMIT (Raw + Canonical + Checkpoint)
+                        await tasks.advance(self.session, task, new_offset)
+
+                    # 5. ATOMIC COMMIT (Raw + Canonical + Checkpoint), once per batch.
+                    # The NOTIFY is delivered to other processes only if the commit succeeds.
+                    started = time.perf_counter()
+                    commit = await notify_commit(self.session, source_id)
+                    await self.session.commit()
+                    ETL_COMMIT_SECONDS.labels(source_id).observe(time.perf_counter() - started)
+                    self.source.batch_committed()
+                    current_offset = new_offset
+                    data_generation.bump(source_id, commit)
+                    etl_freshness.checkpoint_advanced(source_id)
+                    if raw_batch:
+                        # The in-memory hashes only move once the matching rows are committed
+                        record_hashes.update(source_id, pending_hashes)
+                        ETL_ROWS.labels(source_id, "inserted").inc(inserted)
+                        ETL_ROWS.labels(source_id, "updated").inc(updated)
+                        summary["inserted"] += inserted
+                        summary["updated"] += updated
+                        for change, count in changes.items():
+                            ETL_RECORD_CHANGES.labels(source_id, change).inc(count)
+                            summary[change] += count
+
+                    summary["records"] += len(raw_batch)
+                    self.log.info("batch_committed", records=len(raw_batch), new_offset=new_offset, **changes)
+
+            # 6. Close the run record
+            status = "SUCCESS" if summary["records"] else "NO_DATA"
+            if task is None:
+                self._save_metadata(checkpoint)
+            else:
+                # Queue mode: the checkpoint is re-derived from the job's tasks
+                checkpoint = await tasks.complete(
+                    self.session, task, summary["records"], self.source.stream_size is not None,
+                    self._metadata_updates(),
+                )
+            self._finish_run(run, status, run_started, bytes_before)
+            commit = await notify_commit(self.session, source_id)
             await self.session.commit()
-            self.log.info("ingestion_success", records=len(raw_batch), new_offset=new_offset)
+            data_generation.bump(source_id, commit)
+
+            if status == "NO_DATA":
+                ETL_RUNS.labels(source_id, "no_data").inc()
+                self.log.info("no_new_data")
+                return
+
+            ETL_RUNS.labels(source_id, "success").inc()
+            etl_freshness.run_succeeded(source_id)
+            self.log.info("ingestion_success", new_offset=checkpoint.last_processed_offset, **summary)
 
         except Exception as e:
+            ETL_RUNS.labels(source_id, "failed").inc()
+            # Read before the rollback: it expires the checkpoint, and a lazy load can't run here
+            metadata = {**(checkpoint.metadata_blob or {}), **self._metadata_updates()} if task is None else None
             await self.session.rollback()
             self.log.error("ingestion_failed", error=str(e), trace=traceback.format_exc())
-            # Update checkpoint status separately
-            checkpoint.status = "FAILED"
-            self.session.add(checkpoint)
+            # Update checkpoint status (queue mode: give the task back), and the run record, separately
+            if task is None:
+                checkpoint.status = "FAILED"
+                checkpoint.metadata_blob = metadata
+                self.session.add(checkpoint)
+            elif not isinstance(e, tasks.LeaseLost):
+                await tasks.release(self.session, task, summary["records"], str(e))
+            self._finish_run(run, "FAILED", run_started, bytes_before, error=str(e))
+            self.session.add(run)
+            commit = await notify_commit(self.session, source_id)
             await self.session.commit()
-            raise e
\ No newline at end of file
+            data_generation.bump(source_id, commit)
+            raise e
+
+    def _metadata_updates(self) -> Dict:
+        """What this run learned, for the checkpoint's metadata_blob."""
+        updates = {}
+        if self.source.controller is not None:
+            updates["provider"] = self.source.controller.snapshot()
+        if self.source.stream_size is not None:
+            updates["stream_size"] = self.source.stream_size
+        return updates
+
+    def _save_metadata(self, checkpoint: ETLCheckpoint):
+        updates = self._metadata_updates()
+        if updates:
+            # New dict: JSON columns are only flushed on assignment
+            checkpoint.metadata_blob = {**(checkpoint.metadata_blob or {}), **updates}
+
+    def _finish_run(self, run: ETLRun, status: str, started: float, bytes_before: int, error: Optional[str] = None):
+        summary = self.summary
+        run.status = status
+        run.finished_at = datetime.now(timezone.utc)
+        run.duration_seconds = time.perf_counter() - started
+        run.records = summary["records"]
+        run.inserted = summary["inserted"]
+        run.updated = summary["updated"]
+        run.unchanged = summary["unchanged"]
+        run.rejected = summary["rejected"]
+        run.bytes = self.source.bytes_fetched - bytes_before
+        run.error = error
+
+    async def _detect_changes(self, raw_batch: List[Dict], normalized: NormalizedBatch):
+        """
+        Splits a batch by content hash against the last committed load of this source.
+        Returns (raw records to store, entries to load, hashes to save, counts by change, unchanged entries).
+        Unchanged symbols are dropped entirely, including their raw records; only their quote
+        timestamps are refreshed (touch_quotes).
+        """
+        source_id = self.source.source_id
+        known = await record_hashes.load(self.session, source_id)
+        deduped = normalized.dedupe_last()
+        hashes = fingerprints(deduped)
+        symbols = deduped.symbol.tolist()
+
+        seen = np.array([symbol in known for symbol in symbols], dtype=bool)
+        previous = np.array([known.get(symbol, 0) for symbol in symbols], dtype=np.int64)
+        unchanged = seen & (previous == hashes)
+        changes = {
+            "new": int((~seen).sum()),
+            "changed": int((seen & ~unchanged).sum()),
+            "unchanged": int(unchanged.sum()),
+        }
+        if not changes["unchanged"]:
+            return raw_batch, deduped, dict(zip(symbols, hashes.tolist())), changes, None
+
+        skipped = set(normalized.index[np.isin(normalized.symbol, deduped.symbol[unchanged])].tolist())
+        to_load = deduped.take(np.flatnonzero(~unchanged))
+        pending = dict(zip(to_load.symbol.tolist(), hashes[~unchanged].tolist()))
+        raw_kept = [record for i, record in enumerate(raw_batch) if i not in skipped]
+        return raw_kept, to_load, pending, changes, deduped.take(np.flatnonzero(unchanged))
+
+    async def save_hashes(self, hashes: Dict[str, int]):
+        """Upserts the new content hashes in the batch's transaction."""
+        if not hashes:
+            return
+        current_time = datetime.now(timezone.utc)
+        for chunk in _chunks(list(hashes.items()), BULK_CHUNK_SIZE):
+            await self.session.execute(text(_UPSERT_HASHES), {
+                "source": self.source.source_id,
+                "updated_at": current_time,
+                "symbols": [symbol for symbol, _ in chunk],
+                "hashes": [value for _, value in chunk],
+            })
+
+    async def touch_quotes(self, unchanged: Optional[NormalizedBatch]):
+        """Refreshes this source's quote time and last_seen on the rows skipped as unchanged."""
+        if unchanged is None or not len(unchanged):
+            return
+        current_time = datetime.now(timezone.utc)
+        quotes = [(symbol, updated_at.isoformat()) for symbol, _, _, _, updated_at in unchanged.rows()]
+        for chunk in _chunks(quotes, BULK_CHUNK_SIZE):
+            await self.session.execute(text(_TOUCH_QUOTES), {
+                "source": self.source.source_id,
+                "last_seen": str(current_time),
+                "symbols": [symbol for symbol, _ in chunk],
+                "updated_at": [updated_at for _, updated_at in chunk],
+            })
+
+    def _provider_entry(self, price: float, current_time: datetime, updated_at: datetime) -> Dict:
+        return {
+            "price": price,
+            # Provider's own quote time: consensus staleness is measured from it
+            "updated_at": updated_at.isoformat(),
+            "last_seen": str(current_time)
+        }
+
+    def _consensus_columns(self, provider_data: Optional[Dict], current_time: datetime) -> Dict:
+        result = consensus(provider_data, current_time)
+        if result is None:
+            return {"consensus_price": None, "price_spread": None, "source_count": 0}
+        return {"consensus_price": result.price, "price_spread": result.spread, "source_count": result.sources}
+
+    async def _load_bulk(self, raw_batch: List[Dict], normalized: NormalizedBatch) -> tuple[int, int]:
+        """
+        Set-based load: one raw_batches row (or multi-row INSERT for raw_data), one upsert for canonical_data.
+        Returns (inserted, updated) canonical row counts.
+        """
+        current_time = datetime.now(timezone.utc)
+
+        # A. Store Raw (EL)
+        if self.raw_mode == "batch":
+            await raw_store.write_batch(self.session, self.source.source_id, raw_batch, current_time)
+        else:
+            raw_rows = [{"source_id": self.source.source_id, "payload": record} for record in raw_batch]
+            for chunk in _chunks(raw_rows, BULK_CHUNK_SIZE):
+                await self.session.execute(insert(RawData).values(chunk))
+
+        return await self.merge(normalized, current_time)
+
+    async def merge(self, normalized: NormalizedBatch, current_time: datetime) -> tuple[int, int]:
+        """
+        Steps B-E of the bulk load: canonical upsert, consensus and price history, as of `current_time`.
+        Replay calls it with the original ingestion time, so replayed history rows land on the same keys.
+        Rows last written after `current_time` only get the history samples (see stale_symbols).
+        """
+        # B. Collapse duplicates by symbol, last record wins,
+        # because ON CONFLICT cannot touch the same row twice in one statement.
+        rows = [
+            {
+                "symbol": symbol,
+                "name": name,
+                "price_usd": price,
+                "market_cap": market_cap,
+                "provider_data": {self.source.source_id: self._provider_entry(price, current_time, updated_at)},
+            }
+            for symbol, name, price, market_cap, updated_at in normalized.dedupe_last().rows()
+        ]
+
+        # C. Load Canonical (Merge Strategy, server-side, _UPSERT_CANONICAL):
+        # provider_data = existing || incoming (JSONB concatenation keeps other providers' keys),
+        # market_cap = incoming or existing, and xmax = 0 only for freshly inserted tuples
+        upsert = text(_UPSERT_CANONICAL).columns(
+            literal_column("id"), literal_column("symbol"), literal_column("inserted"), provider_data=JSONB,
+        )
+        symbol_ids: Dict[str, int] = {}
+        consensus_rows = []
+        inserted = 0
+        for chunk in _chunks(rows, BULK_CHUNK_SIZE):
+            result = await self.session.execute(upsert, {
+                "loaded_at": current_time,
+                "symbols": [row["symbol"] for row in chunk],
+                "names": [row["name"] for row in chunk],
+                "prices": [row["price_usd"] for row in chunk],
+                "market_caps": [row["market_cap"] for row in chunk],
+                "provider_data": [json.dumps(row["provider_data"]) for row in chunk],
+            })
+            for row_id, symbol, was_inserted, provider_data in result:
+                symbol_ids[symbol] = row_id
+                inserted += was_inserted
+                if not was_inserted:
+                    consensus_rows.append((row_id, self._consensus_columns(provider_data, current_time)))
+
+        # Rows newer than this batch were skipped by the upsert: look up their ids for the history samples
+        self.stale_symbols = {row["symbol"] for row in rows} - symbol_ids.keys()
+        for chunk in _chunks(sorted(self.stale_symbols), BULK_CHUNK_SIZE):
+            result = await self.session.execute(
+                select(CanonicalData.symbol, CanonicalData.id).where(CanonicalData.symbol.in_(chunk))
+            )
+            symbol_ids.update(result.all())
+
+        # D. Consensus of the updated rows, from their merged provider_data: one UPDATE ... FROM unnest per chunk
+        for chunk in _chunks(consensus_rows, BULK_CHUNK_SIZE):
+            await self.session.execute(text(_UPDATE_CONSENSUS), {
+                "ids": [row_id for row_id, _ in chunk],
+                "prices": [columns["consensus_price"] for _, columns in chunk],
+                "spreads": [columns["price_spread"] for _, columns in chunk],
+                "counts": [columns["source_count"] for _, columns in chunk],
+            })
+
+        # E. Append Price History
+        await self._write_history(
+            [(symbol_ids[row["symbol"]], row["price_usd"], row["market_cap"]) for row in rows],
+            current_time,
+        )
+        return inserted, len(rows) - inserted - len(self.stale_symbols)
+
+    async def _write_history(self, samples: List[tuple], current_time: datetime):
+        """Bulk-appends (symbol_id, price, market_cap) samples to the partitioned price_history."""
+        if not samples:
+            return
+        await ensure_partition(self.session.bind, current_time)
+        for chunk in _chunks(samples, BULK_CHUNK_SIZE):
+            await self.session.execute(text(_INSERT_HISTORY), {
+                "source": self.source.source_id,
+                "ts": current_time,
+                "symbol_ids": [symbol_id for symbol_id, _, _ in chunk],
+                "prices": [price for _, price, _ in chunk],
+                # 0 = unknown: stored as NULL
+                "market_caps": [market_cap or 0 for _, _, market_cap in chunk],
+            })
+
+    async def _load_row_by_row(self, raw_batch: List[Dict], normalized: NormalizedBatch) -> tuple[int, int]:
+        """Legacy path: one SELECT per record, then ORM merge. Kept as a fallback."""
+        # A. Store Raw (EL)
+        if self.raw_mode == "batch":
+            await raw_store.write_batch(self.session, self.source.source_id, raw_batch, datetime.now(timezone.utc))
+        else:
+            for record in raw_batch:
+                self.session.add(RawData(source_id=self.source.source_id, payload=record))
+
+        loaded: Dict[str, tuple] = {}
+        inserted = updated = 0
+        for symbol, name, price, market_cap, updated_at in normalized.rows():
+            # B. Load Canonical (Normalization Logic)
+            # FIX: Query by SYMBOL (Unique ID), not by Source+ExternalID
+            stmt = select(CanonicalData).where(
+                CanonicalData.symbol == symbol
+            )
+            existing = (await self.session.execute(stmt)).scalar_one_or_none()
+
+            current_time = datetime.now(timezone.utc)
+
+            if existing:
+                # UPDATE existing coin (Merge Strategy)
+                existing.price_usd = price
+                existing.market_cap = market_cap or existing.market_cap
+                existing.last_updated = current_time
+
+                # Merge provider specific data into JSON
+                # We must create a new dict to ensure SQLAlchemy detects the change
+                current_providers = dict(existing.provider_data) if existing.provider_data else {}
+                current_providers[self.source.source_id] = self._provider_entry(price, current_time, updated_at)
+                existing.provider_data = current_providers
+                for key, value in self._consensus_columns(current_providers, current_time).items():
+                    setattr(existing, key, value)
+                # Count rows, not records: a repeat within this batch is still one insert
+                if symbol not in loaded:
+                    updated += 1
+
+            else:
+                # INSERT new coin
+                new_entry = CanonicalData(
+                    symbol=symbol,
+                    name=name,
+                    price_usd=price,
+                    market_cap=market_cap,
+                    last_updated=current_time,
+                    provider_data={
+                        self.source.source_id: self._provider_entry(price, current_time, updated_at)
+                    },
+                    consensus_price=price,
+                    price_spread=0.0,
+                    source_count=1,
+                )
+                self.session.add(new_entry)
+                existing = new_entry
+                inserted += 1
+
+            loaded[symbol] = (existing, price, market_cap)
+
+        # C. Append Price History (flush first so new coins have ids)
+        await self.session.flush()
+        await self._write_history(
+            [(entry.id, price, market_cap) for entry, price, market_cap in loaded.values()],
+            datetime.now(timezone.utc),
+        )
+        return inserted, updated
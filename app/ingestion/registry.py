@@ -0,0 +1,25 @@
+from typing import Callable, Dict
+from app.core.config import settings
+from app.ingestion.orchestrator import BaseSource
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+from app.ingestion.sources.coingecko import CoinGeckoSource
+
+# name -> (source_id, factory, interval in seconds)
+# source_id is the ETLCheckpoint key and the advisory lock name, so it must stay stable.
+SOURCES: Dict[str, tuple[str, Callable[[str], BaseSource], Callable[[], int]]] = {
+    "coinpaprika": ("coinpaprika_free", CoinPaprikaSource, lambda: settings.ETL_INTERVAL_COINPAPRIKA),
+    "coingecko": ("coingecko_market", CoinGeckoSource, lambda: settings.ETL_INTERVAL_COINGECKO),
+}
+
+def build_source(name: str) -> BaseSource:
+    if name not in SOURCES:
+        raise ValueError(f"Unknown source '{name}'. Use one of {list(SOURCES)}")
+    source_id, factory, _ = SOURCES[name]
+    return factory(source_id)
+
+def resolve_source_id(source: str) -> str:
+    """Accept a registry name ("coingecko") or the raw source_id ("coingecko_market")."""
+    return SOURCES[source][0] if source in SOURCES else source
+
+def source_interval(name: str) -> int:
+    return SOURCES[name][2]()
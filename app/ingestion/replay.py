@@ -0,0 +1,250 @@
+"""
+Offline replay: rebuilds canonical_data from stored raw payloads, e.g. after a normalization fix.
+
+Reads a source's raw records (raw_data, archived days and raw_batches, see app.services.raw_store)
+in ingestion order, normalizes chunks of REPLAY_CHUNK_SIZE records in a process pool, and merges
+every original batch with IngestionOrchestrator.merge as of its ingestion time: same upsert,
+provider_data merge and consensus as live ingestion, and price history lands on the same keys
+(re-written samples are no-ops). Rows written after a batch (e.g. by a newer live run) are left as
+they are: that batch only backfills price history. Never touches the network.
+
+Progress is kept in its own checkpoint ("replay:<source_id>"), committed with every chunk, so an
+interrupted replay of the same window resumes where it stopped. The source's advisory lock is held
+throughout: live runs of that source are skipped meanwhile.
+
+Usage: python -m app.ingestion.replay coinpaprika [--start 2024-03-01] [--end 2024-04-01] [--restart]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, advisory_lock, dispose_engines, engine
+from app.core.events import data_generation, notify_commit
+from app.core.logging import logger, setup_logging
+from app.ingestion.fingerprints import fingerprints, record_hashes
+from app.ingestion.orchestrator import BaseSource, IngestionOrchestrator
+from app.ingestion.registry import build_source
+from app.schemas.normalized import NormalizedBatch
+from app.services import raw_store
+from app.services.models import ETLCheckpoint, REPLAY_CHECKPOINT_PREFIX
+
+CHECKPOINT_PREFIX = REPLAY_CHECKPOINT_PREFIX
+
+# Sources built in each pool process, by name
+_worker_sources: Dict[str, BaseSource] = {}
+
+def _normalize(name: str, records: List[Dict]) -> NormalizedBatch:
+    """Runs in a pool process: normalize is a pure function of the raw records."""
+    source = _worker_sources.get(name)
+    if source is None:
+        source = _worker_sources[name] = build_source(name)
+    return source.normalize(records)
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    return ts.isoformat() if ts else None
+
+class Replayer:
+    def __init__(
+        self,
+        session: AsyncSession,
+        name: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        workers: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        restart: bool = False,
+    ):
+        self.session = session
+        self.name = name
+        self.source = build_source(name)
+        self.start = start
+        self.end = end
+        self.workers = workers or settings.REPLAY_WORKERS or os.cpu_count() or 1
+        self.chunk_size = chunk_size or settings.REPLAY_CHUNK_SIZE
+        self.restart = restart
+        # Live-ingestion merge; raw payloads are never written again
+        self.loader = IngestionOrchestrator(session, self.source)
+        self.summary = {"batches": 0, "records": 0, "rejected": 0, "inserted": 0, "updated": 0}
+        self.log = logger.bind(source=self.source.source_id, component="replay")
+
+    async def _load_checkpoint(self) -> ETLCheckpoint:
+        checkpoint_id = CHECKPOINT_PREFIX + self.source.source_id
+        checkpoint = await self.session.get(ETLCheckpoint, checkpoint_id)
+        window = {"start": _iso(self.start), "end": _iso(self.end)}
+        if checkpoint is None:
+            checkpoint = ETLCheckpoint(source_id=checkpoint_id)
+            self.session.add(checkpoint)
+        elif not self.restart and (checkpoint.metadata_blob or {}).get("window") == window:
+            return checkpoint
+        # New window (or --restart): start over
+        checkpoint.last_processed_offset = 0
+        checkpoint.metadata_blob = {"window": window, "after_record_id": None, "after_batch": None}
+        return checkpoint
+
+    async def _chunks(self, position: Dict) -> AsyncIterator[List[raw_store.StoredBatch]]:
+        """Whole stored batches, grouped until they hold at least chunk_size records."""
+        after_batch = position.get("after_batch")
+        batches = raw_store.read_batches(
+            engine,
+            self.source.source_id,
+            self.start,
+            self.end,
+            after_batch=(datetime.fromisoformat(after_batch[0]), after_batch[1]) if after_batch else None,
+            after_record_id=position.get("after_record_id"),
+        )
+        chunk: List[raw_store.StoredBatch] = []
+        size = 0
+        async for batch in batches:
+            chunk.append(batch)
+            size += len(batch.records)
+            if size >= self.chunk_size:
+                yield chunk
+                chunk, size = [], 0
+        if chunk:
+            yield chunk
+
+    async def _merge_chunk(self, chunk: List[raw_store.StoredBatch], normalized: NormalizedBatch) -> Dict[str, int]:
+        """Merges each stored batch of the chunk at its own ingestion time. Returns the hashes to save."""
+        bounds = np.cumsum([0] + [len(batch.records) for batch in chunk])
+        # Symbol -> whether its latest batch in the chunk was merged (False: the row is newer than the batch)
+        applied: Dict[str, bool] = {}
+        for batch, low, high in zip(chunk, bounds[:-1], bounds[1:]):
+            part = normalized.take(np.flatnonzero((normalized.index >= low) & (normalized.index < high)))
+            inserted, updated = await self.loader.merge(part, batch.ingested_at)
+            self.summary["inserted"] += inserted
+            self.summary["updated"] += updated
+            applied.update((symbol, symbol not in self.loader.stale_symbols) for symbol in part.symbol.tolist())
+        # Fingerprints of the replayed values, so live change detection compares against them. Rows a
+        # later live run wrote keep that run's hashes: the replay only backfilled their history
+        latest = normalized.dedupe_last()
+        return {
+            symbol: value
+            for symbol, value in zip(latest.symbol.tolist(), fingerprints(latest).tolist())
+            if applied.get(symbol)
+        }
+
+    def _advance(self, checkpoint: ETLCheckpoint, chunk: List[raw_store.StoredBatch]):
+        position = dict(checkpoint.metadata_blob)
+        for batch in chunk:
+            if batch.batch_id is None:
+                position["after_record_id"] = batch.record_ids[-1]
+            else:
+                position["after_batch"] = [batch.ingested_at.isoformat(), batch.batch_id]
+        # New dict: JSON columns are only flushed on assignment
+        checkpoint.metadata_blob = position
+        checkpoint.last_processed_offset += sum(len(batch.records) for batch in chunk)
+        checkpoint.last_run_timestamp = datetime.now(timezone.utc)
+
+    async def _load_ready(self, in_flight: deque, checkpoint: ETLCheckpoint, limit: int):
+        """Merges and commits the oldest normalized chunks until at most `limit` are in flight."""
+        source_id = self.source.source_id
+        while len(in_flight) > limit:
+            chunk, future = in_flight.popleft()
+            normalized = await future
+            hashes = await self._merge_chunk(chunk, normalized)
+            await self.loader.save_hashes(hashes)
+            self._advance(checkpoint, chunk)
+            commit = await notify_commit(self.session, source_id)
+            await self.session.commit()
+            record_hashes.update(source_id, hashes)
+            data_generation.bump(source_id, commit)
+            self.summary["batches"] += len(chunk)
+            self.summary["records"] += sum(len(batch.records) for batch in chunk)
+            self.summary["rejected"] += len(normalized.rejects)
+            self.log.info("replay_chunk_committed", records=self.summary["records"])
+
+    async def run(self) -> Dict[str, int]:
+        # 1. Checkpoint: resume the same window, or start over
+        checkpoint = await self._load_checkpoint()
+        checkpoint.status = "RUNNING"
+        await self.session.commit()
+        position = dict(checkpoint.metadata_blob)
+        self.log.info("replay_start", start=_iso(self.start), end=_iso(self.end), workers=self.workers, resume=position)
+
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if self.workers > 1:
+            # spawn: workers don't inherit this process's event loop and DB connections
+            executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            executor = ThreadPoolExecutor(1)
+        # Chunks being normalized while earlier ones load: keeps every worker and the DB busy
+        in_flight: deque = deque()
+        try:
+            # 2. Read + normalize (pool), then merge in order, one commit per chunk
+            async for chunk in self._chunks(position):
+                records = [record for batch in chunk for record in batch.records]
+                in_flight.append((chunk, loop.run_in_executor(executor, _normalize, self.name, records)))
+                await self._load_ready(in_flight, checkpoint, self.workers * 2)
+            await self._load_ready(in_flight, checkpoint, 0)
+
+            # 3. Done
+            checkpoint.status = "SUCCESS"
+            await self.session.commit()
+            elapsed = time.perf_counter() - started
+            self.log.info(
+                "replay_success", seconds=round(elapsed, 2),
+                records_per_second=round(self.summary["records"] / elapsed) if elapsed else None, **self.summary,
+            )
+            return self.summary
+        except Exception as e:
+            await self.session.rollback()
+            self.log.error("replay_failed", error=str(e), trace=traceback.format_exc())
+            # Committed chunks stay: the next run of the same window resumes after them
+            checkpoint.status = "FAILED"
+            self.session.add(checkpoint)
+            await self.session.commit()
+            raise
+        finally:
+            for _, future in in_flight:
+                future.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+async def replay_source(name: str, **options) -> Optional[Dict[str, int]]:
+    """Replays `name` under its advisory lock. Returns the summary, or None if the source is busy."""
+    source_id = build_source(name).source_id
+    async with advisory_lock(source_id) as acquired:
+        if not acquired:
+            logger.info("replay_skipped", source=source_id, reason="locked_by_another_worker")
+            return None
+        async with AsyncSessionLocal() as session:
+            return await Replayer(session, name, **options).run()
+
+def _timestamp(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+async def _main(args: argparse.Namespace):
+    try:
+        summary = await replay_source(
+            args.source, start=args.start, end=args.end, workers=args.workers,
+            chunk_size=args.chunk_size, restart=args.restart,
+        )
+    finally:
+        await dispose_engines()
+    if summary is None:
+        raise SystemExit(f"{args.source} is being ingested right now; retry when the run is over")
+
+def main(argv: Optional[List[str]] = None, prog: Optional[str] = None):
+    parser = argparse.ArgumentParser(prog=prog, description="Re-normalize stored raw payloads into canonical_data (no network).")
+    parser.add_argument("source", help="Registered source name, e.g. coinpaprika")
+    parser.add_argument("--start", type=_timestamp, help="Ingested at or after (ISO 8601, UTC if naive)")
+    parser.add_argument("--end", type=_timestamp, help="Ingested before (ISO 8601, UTC if naive)")
+    parser.add_argument("--workers", type=int, help="Normalize processes (default REPLAY_WORKERS)")
+    parser.add_argument("--chunk-size", type=int, help="Records per chunk (default REPLAY_CHUNK_SIZE)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved position of this window")
+    args = parser.parse_args(argv)
+    setup_logging()
+    asyncio.run(_main(args))
+
+if __name__ == "__main__":
+    main()
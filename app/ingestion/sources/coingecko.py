@@ -1,69 +1,170 @@
+import asyncio
 import httpx
-from datetime import datetime
-from typing import List, Dict
+from typing import Callable, List, Dict, AsyncIterator, Optional
 from app.ingestion.orchestrator import BaseSource
-from app.schemas.normalized import CanonicalSchema
+from app.ingestion.adaptive import ProviderBusy, ProviderController, ProviderUnavailable, provider_controllers
+from app.ingestion.http import get_http_client
+from app.ingestion.normalize import build_batch, column
+from app.schemas.normalized import NormalizedBatch
 from app.core.config import settings
+from app.core.logging import logger
+
+# (requests per minute, burst) per API key tier
+TIER_LIMITS = {
+    "public": (10, 1),
+    "demo": (30, 3),
+    "pro": (500, 10),
+}
 
 class CoinGeckoSource(BaseSource):
     """
     Fetches from CoinGecko API.
+    Offset = last fully ingested page. A run covers COINGECKO_PAGES_PER_RUN pages,
+    fetched concurrently through the shared client and the source's ProviderController
+    (rate and concurrency adapt below the tier's limits; see app.ingestion.adaptive).
     """
     BASE_URL = "https://api.coingecko.com/api/v3"
+    PRO_BASE_URL = "https://pro-api.coingecko.com/api/v3"
 
-    async def fetch_data(self, last_offset: int) -> tuple[List[Dict], int]:
-        # Pagination: CoinGecko uses pages (1, 2, 3...)
-        # We treat 'last_offset' as the page number. Start at 1 if offset is 0.
-        page = last_offset + 1
-        
+    def __init__(
+        self,
+        source_id: str,
+        client: Optional[httpx.AsyncClient] = None,
+        pages_per_run: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        tier: Optional[str] = None,
+    ):
+        super().__init__(source_id)
+        self.client = client
+        self.pages_per_run = pages_per_run or settings.COINGECKO_PAGES_PER_RUN
+        self.concurrency = concurrency or settings.COINGECKO_CONCURRENCY
+        self.per_page = min(settings.COINGECKO_PER_PAGE, 250)
+        self.tier = tier or settings.COINGECKO_API_TIER
+        if self.tier not in TIER_LIMITS:
+            raise ValueError(f"Unknown COINGECKO_API_TIER '{self.tier}'. Use one of {list(TIER_LIMITS)}")
+        self.log = logger.bind(source=source_id)
+
+    @property
+    def base_url(self) -> str:
+        return self.PRO_BASE_URL if self.tier == "pro" else self.BASE_URL
+
+    @property
+    def controller(self) -> ProviderController:
+        per_min, burst = TIER_LIMITS[self.tier]
+        per_min = settings.COINGECKO_RATE_PER_MIN or per_min
+        return provider_controllers.get(self.source_id, per_min / 60.0, self.concurrency, burst)
+
+    def _headers(self) -> Dict[str, str]:
+        # Add API Key if available (prevents 429 errors)
+        headers = {}
+        if settings.COINGECKO_API_KEY:
+            key_header = "x-cg-pro-api-key" if self.tier == "pro" else "x-cg-demo-api-key"
+            headers[key_header] = settings.COINGECKO_API_KEY
+        return headers
+
+    async def _fetch_page(self, page: int) -> Optional[tuple[List[Dict], bool, Callable[[], None]]]:
+        """
+        Returns (coins, not_modified, confirm), or None if we were still rate limited after the retries
+        (or the circuit is open).
+        not_modified: the provider answered 304, so the (cached) coins were already loaded.
+        confirm: call once the coins are committed, so the next fetch may be answered with a 304.
+        """
         params = {
             "vs_currency": "usd",
             "order": "market_cap_desc",
-            "per_page": 20,
+            "per_page": self.per_page,
             "page": page,
             "sparkline": "false"
         }
-        
-        # Add API Key if available (prevents 429 errors)
-        headers = {}
-        if settings.COINGECKO_API_KEY:
-            headers["x-cg-demo-api-key"] = settings.COINGECKO_API_KEY
-
+        client = self.client or get_http_client()
+        url = f"{self.base_url}/coins/markets"
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/coins/markets", 
-                    params=params,
-                    headers=headers
-                )
-                
-                if response.status_code == 429:
-                    print("CoinGecko Rate Limit Hit! (Backing off...)")
-                    # Return empty batch but do NOT increment offset, so we retry this page next time
-                    return [], last_offset 
-                
+            async with self.controller.request(client, url, params=params, headers=self._headers()) as response:
                 response.raise_for_status()
-                data = response.json()
-                
+                data = await response.json()
+                self.count_bytes(response.num_bytes_downloaded)
+                return data, response.not_modified, response.confirm
+        except (ProviderBusy, ProviderUnavailable) as e:
+            self.log.warning("rate_limited", page=page, reason=str(e))
+            return None
+
+    async def fetch_data(self, last_offset: int) -> tuple[List[Dict], int]:
+        # Pagination: CoinGecko uses pages (1, 2, 3...)
+        # We treat 'last_offset' as the page number. Start at 1 if offset is 0.
+        page = last_offset + 1
+        result = await self._fetch_page(page)
+
+        # Rate limited or past the end: do NOT increment offset, so we retry this page next time
+        if result is None or not result[0]:
+            return [], last_offset
+
+        # Increment page for next time. Unchanged since the last fetch (304): nothing to load.
+        data, not_modified, confirm = result
+        self.on_commit(confirm)
+        return ([] if not_modified else data), page
+
+    def stream_batches(self, last_offset: int) -> AsyncIterator[tuple[List[Dict], int]]:
+        return self._stream_pages(last_offset, self.pages_per_run)
+
+    def stream_range(self, start: int, end: Optional[int]) -> AsyncIterator[tuple[List[Dict], int]]:
+        return self._stream_pages(start, (end - start) if end is not None else self.pages_per_run)
+
+    def plan_tasks(self, offset: int, stream_size: Optional[int] = None) -> List[tuple[int, Optional[int]]]:
+        # The run's pages, COINGECKO_PAGES_PER_TASK per task
+        end = offset + self.pages_per_run
+        step = max(1, settings.COINGECKO_PAGES_PER_TASK)
+        return [(start, min(start + step, end)) for start in range(offset, end, step)]
+
+    async def _stream_pages(self, last_offset: int, count: int) -> AsyncIterator[tuple[List[Dict], int]]:
+        """
+        Fetches pages last_offset+1 .. last_offset+count concurrently and yields
+        each page as soon as it arrives. The yielded offset is the highest page up to which
+        every page has completed, so a crash never skips an unfetched page.
+        Reaching an empty page (end of the list) resets the offset to 0 for the next cycle.
+        The controller decides how many requests are actually in flight.
+        """
+        async def fetch(page: int):
+            return page, await self._fetch_page(page)
+
+        pages = range(last_offset + 1, last_offset + 1 + count)
+        tasks = [asyncio.create_task(fetch(page)) for page in pages]
+        completed = set()
+        watermark = last_offset
+        end_of_list = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                page, result = await next_done
+                if result is None:
+                    # Rate limited: the watermark can't pass this page during this run
+                    continue
+                data, not_modified, confirm = result
+                # Goes with this page's batch: a page whose load fails is fetched in full next time
+                self.on_commit(confirm)
+                completed.add(page)
                 if not data:
-                    return [], last_offset
-
-                # Increment page for next time
-                return data, page
-
-        except Exception as e:
-            print(f"CoinGecko Error: {e}")
-            raise e
-
-    def normalize(self, raw: Dict) -> CanonicalSchema:
-        # Normalize fields to match our database schema
-        return CanonicalSchema(
-            external_id=raw["id"],
-            source="coingecko",
-            symbol=raw["symbol"].upper(),
-            name=raw["name"],
-            price_usd=float(raw.get("current_price") or 0),
-            market_cap=int(raw.get("market_cap") or 0),
-            # CoinGecko uses ISO format with 'Z'
-            last_updated=datetime.fromisoformat(raw["last_updated"].replace("Z", "+00:00"))
-        )
\ No newline at end of file
+                    end_of_list = page if end_of_list is None else min(end_of_list, page)
+                while watermark + 1 in completed:
+                    watermark += 1
+                # 304: the page is done, but there is nothing new to load (only the checkpoint may move)
+                if not_modified:
+                    data = []
+                if end_of_list is not None and watermark >= end_of_list:
+                    self.stream_size = end_of_list - 1
+                    yield data, 0
+                    continue
+                yield data, watermark
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def normalize(self, raw_data: List[Dict]) -> NormalizedBatch:
+        # Normalize fields to match our database schema (CoinGecko timestamps are ISO with 'Z')
+        return build_batch(
+            self.source_id,
+            external_id=column(raw_data, "id"),
+            symbol=column(raw_data, "symbol"),
+            name=column(raw_data, "name"),
+            price=column(raw_data, "current_price"),
+            market_cap=column(raw_data, "market_cap"),
+            last_updated=column(raw_data, "last_updated"),
+        )
@@ -1,46 +1,100 @@
 import httpx
-from app.services.models import CanonicalData
+from contextlib import aclosing
+from typing import List, Dict, AsyncIterator, Optional
+from app.ingestion.orchestrator import BaseSource
+from app.ingestion.adaptive import ProviderController, ProviderUnavailable, provider_controllers
+from app.ingestion.http import get_http_client
+from app.ingestion.jsonstream import iter_json_array
+from app.ingestion.normalize import build_batch, column
+from app.schemas.normalized import NormalizedBatch
+from app.core.config import settings
+from app.core.logging import logger
 
-class CoinPaprikaSource:
-    def __init__(self, source_id: str):
-        self.source_id = source_id
+class CoinPaprikaSource(BaseSource):
+    """
+    Fetches from CoinPaprika API.
+    The 'tickers' endpoint returns the whole universe in one response, so we parse it
+    incrementally and hand it to the orchestrator in chunks.
+    Offset = number of tickers already ingested from the current snapshot; 0 = start a new one.
+    """
+
+    def __init__(self, source_id: str, client: Optional[httpx.AsyncClient] = None, chunk_size: Optional[int] = None):
+        super().__init__(source_id)
         self.base_url = "https://api.coinpaprika.com/v1"
-        self.client = httpx.AsyncClient(timeout=10.0)
+        self.client = client
+        self.chunk_size = chunk_size or settings.COINPAPRIKA_CHUNK_SIZE
+        self.log = logger.bind(source=source_id)
 
-    async def fetch_data(self, offset: int) -> tuple[list[dict], int]:
-        # CoinPaprika 'tickers' endpoint returns ALL data at once, so we simulate pagination.
-        if offset > 0:
-            return [], offset
+    @property
+    def controller(self) -> ProviderController:
+        # One request per run: no rate to adapt, but retries, Retry-After and the breaker apply
+        return provider_controllers.get(self.source_id, None, 1)
 
+    async def stream_batches(self, offset: int) -> AsyncIterator[tuple[List[Dict], int]]:
         url = f"{self.base_url}/tickers"
+        client = self.client or get_http_client()
+
         try:
-            response = await self.client.get(url)
-            response.raise_for_status()
-            data = response.json()
-            # Return all data as one batch (limit to first 50 for safety if needed)
-            return data[:50], offset + 50
-            
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 402:
-                print(f"⚠️ Warning: CoinPaprika 402 Payment Required. Skipping source.")
-                # Return empty list to signal 'job done' without crashing
-                return [], offset 
-            raise e  # Re-raise other errors (500, 404, etc)
-
-    def normalize(self, raw_data: list[dict]) -> list[CanonicalData]:
-        normalized = []
-        for item in raw_data:
-            try:
-                normalized.append(CanonicalData(
-                    symbol=item['symbol'].lower(),
-                    name=item['name'],
-                    price_usd=float(item['quotes']['USD']['price']),
-                    source=self.source_id
-                ))
-            except (KeyError, ValueError) as e:
-                print(f"Skipping bad record from {self.source_id}: {e}")
-                continue
-        return normalized
-
-    async def close(self):
-        await self.client.aclose()
\ No newline at end of file
+            async with self.controller.request(client, url) as response:
+                if response.status_code == 402:
+                    self.log.warning("payment_required", detail="CoinPaprika 402 Payment Required. Skipping source.")
+                    # Yield nothing to signal 'job done' without crashing
+                    return
+                response.raise_for_status()  # Re-raise other errors (500, 404, etc)
+                if response.not_modified and offset == 0:
+                    # Same snapshot as the last full cycle: no new data. (Mid-snapshot, the cached body is resumed.)
+                    self.log.info("not_modified")
+                    return
+
+                position = 0
+                counted = 0
+                chunk = []
+                async for item in iter_json_array(response.aiter_text()):
+                    position += 1
+                    # Resume: skip tickers already ingested from this snapshot
+                    if position <= offset:
+                        continue
+                    chunk.append(item)
+                    if len(chunk) >= self.chunk_size:
+                        self.count_bytes(response.num_bytes_downloaded - counted)
+                        counted = response.num_bytes_downloaded
+                        yield chunk, position
+                        chunk = []
+
+                # Snapshot complete: the next run starts a new cycle from the top
+                self.log.info("snapshot_complete", tickers=position)
+                self.stream_size = position
+                self.count_bytes(response.num_bytes_downloaded - counted)
+                # Once the last chunk is committed, the snapshot may be answered with a 304 next time
+                self.on_commit(response.confirm)
+                yield chunk, 0
+        except ProviderUnavailable as e:
+            # Circuit open / long Retry-After: nothing was requested, the next run tries again
+            self.log.warning("provider_unavailable", reason=str(e))
+
+    def plan_tasks(self, offset: int, stream_size: Optional[int] = None) -> List[tuple[int, Optional[int]]]:
+        """
+        Slices of the last snapshot's size, in whole chunks so every task stops exactly on its end.
+        The last one runs to the end of the snapshot, however much it grew.
+        """
+        step = max(1, settings.COINPAPRIKA_TICKERS_PER_TASK // self.chunk_size) * self.chunk_size
+        starts = list(range(offset, stream_size or 0, step)) or [offset]
+        return [(start, start + step) for start in starts[:-1]] + [(starts[-1], None)]
+
+    async def fetch_data(self, offset: int) -> tuple[List[Dict], int]:
+        """Single-chunk fetch, for callers that don't stream."""
+        async with aclosing(self.stream_batches(offset)) as batches:
+            async for batch, new_offset in batches:
+                return batch, new_offset
+        return [], offset
+
+    def normalize(self, raw_data: List[Dict]) -> NormalizedBatch:
+        return build_batch(
+            self.source_id,
+            external_id=column(raw_data, "id"),
+            symbol=column(raw_data, "symbol"),
+            name=column(raw_data, "name"),
+            price=column(raw_data, "quotes", "USD", "price"),
+            market_cap=column(raw_data, "quotes", "USD", "market_cap"),
+            last_updated=column(raw_data, "last_updated"),
+        )
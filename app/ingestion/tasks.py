@@ -0,0 +1,244 @@
+"""
+Ingestion work queue (ETL_MODE=queue).
+
+A source's run is planned as a job: the offset ranges of BaseSource.plan_tasks, one etl_tasks row
+each. Any number of worker processes claim tasks (FOR UPDATE SKIP LOCKED: claims never wait on
+each other) and run them through IngestionOrchestrator:
+
+  - a claim is a lease: lease_expires_at is pushed forward by a heartbeat and by every batch commit,
+    so the task of a worker that died becomes claimable again once it expires
+  - attempts, bumped by every claim, fences the lease: the commits of a worker that lost its task
+    match no row and roll back (LeaseLost)
+  - progress_offset moves with each committed batch, so a re-claimed task resumes where it stopped
+  - when a task completes, the source's ETLCheckpoint is derived from the job's tasks: the offset up
+    to which every task has finished, or 0 once a finished task reached the end of the stream
+"""
+import asyncio
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.logging import logger
+from app.services.models import ETLCheckpoint, ETLTask
+
+if TYPE_CHECKING:
+    from app.ingestion.orchestrator import BaseSource
+
+OPEN_STATUSES = ("PENDING", "RUNNING")
+
+# Oldest open task nobody holds: never queued, or its lease expired
+_CLAIM = """
+UPDATE etl_tasks
+SET status = 'RUNNING', worker = :worker, attempts = attempts + 1,
+    lease_expires_at = now() + make_interval(secs => :lease)
+WHERE id = (
+    SELECT id FROM etl_tasks
+    WHERE (status = 'PENDING' OR (status = 'RUNNING' AND lease_expires_at < now()))
+      AND attempts < :max_attempts
+      AND source_id = ANY(:source_ids)
+    ORDER BY id
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, source_id, job_id, start_offset, end_offset, progress_offset, attempts
+"""
+
+_LEASE_HELD = "id = :id AND attempts = :attempt AND status = 'RUNNING'"
+
+_RENEW = f"""
+UPDATE etl_tasks SET lease_expires_at = now() + make_interval(secs => :lease)
+WHERE {_LEASE_HELD}
+"""
+
+_ADVANCE = f"""
+UPDATE etl_tasks SET progress_offset = :offset, lease_expires_at = now() + make_interval(secs => :lease)
+WHERE {_LEASE_HELD}
+"""
+
+_COMPLETE = f"""
+UPDATE etl_tasks
+SET status = 'DONE', end_of_stream = :end_of_stream, records = records + :records,
+    lease_expires_at = NULL, finished_at = now()
+WHERE {_LEASE_HELD}
+"""
+
+# Failed attempt: back in the queue, or FAILED once out of attempts
+_RELEASE = f"""
+UPDATE etl_tasks
+SET status = CASE WHEN attempts >= :max_attempts THEN 'FAILED' ELSE 'PENDING' END,
+    finished_at = CASE WHEN attempts >= :max_attempts THEN now() END,
+    records = records + :records, error = :error, lease_expires_at = NULL
+WHERE {_LEASE_HELD}
+RETURNING status
+"""
+
+# The worker died during the last attempt: nobody will claim the task again
+_FAIL_ABANDONED = """
+UPDATE etl_tasks SET status = 'FAILED', error = 'lease expired', finished_at = now()
+WHERE source_id = :source_id AND status = 'RUNNING' AND lease_expires_at < now() AND attempts >= :max_attempts
+"""
+
+class LeaseLost(RuntimeError):
+    """Our lease expired and the task may be someone else's now: nothing of this attempt may commit."""
+
+@dataclass
+class TaskLease:
+    id: int
+    source_id: str
+    job_id: str
+    start_offset: int
+    end_offset: Optional[int]
+    progress_offset: int
+    attempt: int
+    worker: str
+
+    @property
+    def params(self) -> Dict:
+        return {"id": self.id, "attempt": self.attempt, "lease": settings.ETL_TASK_LEASE_SECONDS}
+
+def worker_name(slot: int = 0) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{slot}"
+
+def job_offset(tasks: Sequence[ETLTask]) -> int:
+    """Checkpoint offset of a job: how far its finished tasks reach, contiguously from its start."""
+    tasks = sorted(tasks, key=lambda task: task.start_offset)
+    offset = tasks[0].start_offset
+    for task in tasks:
+        if task.status != "DONE":
+            break
+        if task.end_of_stream:
+            # Cycle complete: the next job starts over
+            return 0
+        offset = task.progress_offset
+        if task.end_offset is None or task.progress_offset < task.end_offset:
+            # Stopped short (e.g. a rate-limited page): the next job resumes here
+            break
+    return offset
+
+async def sync_checkpoint(session: AsyncSession, source_id: str, metadata: Optional[Dict] = None) -> ETLCheckpoint:
+    """
+    Derives the source's checkpoint from its tasks, under the checkpoint's row lock (workers completing
+    tasks of the same job queue here). `metadata` is merged into metadata_blob.
+    """
+    checkpoint = await session.get(ETLCheckpoint, source_id, with_for_update=True, populate_existing=True)
+    if checkpoint is None:
+        checkpoint = ETLCheckpoint(source_id=source_id, last_processed_offset=0, metadata_blob={})
+        session.add(checkpoint)
+    tasks = (
+        await session.execute(
+            select(ETLTask).where(ETLTask.source_id == source_id).execution_options(populate_existing=True)
+        )
+    ).scalars().all()
+    if tasks:
+        checkpoint.last_processed_offset = job_offset(tasks)
+        checkpoint.last_run_timestamp = datetime.now(timezone.utc)
+        checkpoint.status = "FAILED" if any(task.status == "FAILED" for task in tasks) else "SUCCESS"
+    if metadata:
+        # New dict: JSON columns are only flushed on assignment
+        checkpoint.metadata_blob = {**(checkpoint.metadata_blob or {}), **metadata}
+    return checkpoint
+
+async def plan_job(session: AsyncSession, source: "BaseSource") -> Optional[str]:
+    """
+    Queues the next job of `source` from its checkpoint, unless tasks of the current job are still open.
+    Call under the source's advisory lock (one planner at a time). Returns the job_id, or None.
+    """
+    source_id = source.source_id
+    # 1. Is the current job over?
+    await session.execute(
+        text(_FAIL_ABANDONED), {"source_id": source_id, "max_attempts": settings.ETL_TASK_MAX_ATTEMPTS}
+    )
+    open_tasks = (
+        await session.execute(
+            select(func.count()).select_from(ETLTask)
+            .where(ETLTask.source_id == source_id, ETLTask.status.in_(OPEN_STATUSES))
+        )
+    ).scalar()
+    if open_tasks:
+        await session.commit()
+        return None
+
+    # 2. Where it got to. The checkpoint (and etl_runs) now summarize it: its tasks can go
+    checkpoint = await sync_checkpoint(session, source_id)
+    await session.execute(delete(ETLTask).where(ETLTask.source_id == source_id))
+
+    # 3. The next job
+    offset = checkpoint.last_processed_offset or 0
+    ranges = source.plan_tasks(offset, (checkpoint.metadata_blob or {}).get("stream_size"))
+    job_id = uuid.uuid4().hex
+    session.add_all([
+        ETLTask(source_id=source_id, job_id=job_id, start_offset=start, end_offset=end, progress_offset=start)
+        for start, end in ranges
+    ])
+    await session.commit()
+    logger.info("etl_job_planned", source=source_id, job=job_id, offset=offset, tasks=len(ranges))
+    return job_id
+
+async def claim(session: AsyncSession, worker: str, source_ids: List[str]) -> Optional[TaskLease]:
+    """Leases the oldest claimable task of `source_ids`, or returns None."""
+    row = (
+        await session.execute(
+            text(_CLAIM),
+            {
+                "worker": worker,
+                "lease": settings.ETL_TASK_LEASE_SECONDS,
+                "max_attempts": settings.ETL_TASK_MAX_ATTEMPTS,
+                "source_ids": source_ids,
+            },
+        )
+    ).one_or_none()
+    await session.commit()
+    if row is None:
+        return None
+    return TaskLease(*row, worker=worker)
+
+async def heartbeat(engine: AsyncEngine, lease: TaskLease):
+    """Renews the lease every ETL_TASK_HEARTBEAT_SECONDS until cancelled, or until it turns out lost."""
+    log = logger.bind(source=lease.source_id, task=lease.id)
+    while True:
+        await asyncio.sleep(settings.ETL_TASK_HEARTBEAT_SECONDS)
+        try:
+            async with engine.begin() as conn:
+                renewed = (await conn.execute(text(_RENEW), lease.params)).rowcount
+        except Exception as e:
+            # Transient: the next beat (or the next batch commit) retries before the lease runs out
+            log.warning("etl_task_heartbeat_failed", error=str(e))
+            continue
+        if not renewed:
+            # The next commit of this attempt raises LeaseLost
+            log.warning("etl_task_lease_lost")
+            return
+
+async def advance(session: AsyncSession, lease: TaskLease, offset: int):
+    """Moves the task's progress in the batch's transaction (and renews the lease). Raises LeaseLost."""
+    result = await session.execute(text(_ADVANCE), {**lease.params, "offset": offset})
+    if not result.rowcount:
+        raise LeaseLost(f"task {lease.id} attempt {lease.attempt}")
+
+async def complete(
+    session: AsyncSession, lease: TaskLease, records: int, end_of_stream: bool, metadata: Optional[Dict] = None,
+) -> ETLCheckpoint:
+    """Marks the task DONE and re-derives the checkpoint, in the caller's transaction. Raises LeaseLost."""
+    result = await session.execute(
+        text(_COMPLETE), {**lease.params, "records": records, "end_of_stream": end_of_stream}
+    )
+    if not result.rowcount:
+        raise LeaseLost(f"task {lease.id} attempt {lease.attempt}")
+    return await sync_checkpoint(session, lease.source_id, metadata)
+
+async def release(session: AsyncSession, lease: TaskLease, records: int, error: str) -> Optional[str]:
+    """Gives a failed attempt back (PENDING) or gives up (FAILED). Returns the new status; None if lost."""
+    status = (
+        await session.execute(
+            text(_RELEASE),
+            {**lease.params, "records": records, "error": error, "max_attempts": settings.ETL_TASK_MAX_ATTEMPTS},
+        )
+    ).scalar()
+    if status == "FAILED":
+        await sync_checkpoint(session, lease.source_id)
+    return status
@@ -1,34 +1,49 @@
 from fastapi import FastAPI
-from app.api.routes import data
+from fastapi.responses import ORJSONResponse
+from app.api.routes import admin, data, history, export, quotes, stream
 from app.core.logging import setup_logging
 from contextlib import asynccontextmanager
 from prometheus_client import make_asgi_app
-from app.core.db import engine, Base
-
-# IMPORTANT: Import models here so SQLAlchemy knows they exist
-# If you don't import them, the tables won't be created!
-from app.services.models import ETLCheckpoint, RawData, CanonicalData
+from app.core.db import check_schema, dispose_engines
+from app.core.events import commit_listener
+from app.core.instrumentation import RequestMetricsMiddleware
+from app.ingestion.http import close_http_client
+from app.services.quotes import quote_store
+from app.services.stream import stream_hub
 
 setup_logging()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # STARTUP: Create all tables defined in models
-    print("Creating database tables...")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("Database tables created.")
-    
+    # STARTUP: The schema is managed by migrations (alembic upgrade head runs before the server starts);
+    # refuse to serve against a database that isn't at this code's revision
+    await check_schema()
+
+    # Invalidate response caches when any process commits ETL data
+    commit_listener.start()
+
     yield
-    # SHUTDOWN: Cleanup if needed
+    # SHUTDOWN: Release pooled provider and database connections
+    await stream_hub.stop()
+    await quote_store.stop()
+    await commit_listener.stop()
+    await close_http_client()
+    await dispose_engines()
 
-app = FastAPI(title="Kasparro Evaluation Platform", lifespan=lifespan)
+# Plain dict responses are encoded with orjson; cached routes build their bytes in app.core.cache
+app = FastAPI(title="Kasparro Evaluation Platform", lifespan=lifespan, default_response_class=ORJSONResponse)
 
-# Observability
+# Observability: per-route latency, SQL count and Server-Timing for every request
+app.add_middleware(RequestMetricsMiddleware)
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
 
 app.include_router(data.router, prefix="/api/v1")
+app.include_router(history.router, prefix="/api/v1")
+app.include_router(export.router, prefix="/api/v1")
+app.include_router(stream.router, prefix="/api/v1")
+app.include_router(quotes.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 @app.get("/health")
 async def health_check():
@@ -1,6 +1,8 @@
+from dataclasses import dataclass, field
 from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional
+import numpy as np
 
 class CanonicalSchema(BaseModel):
     external_id: str
@@ -10,5 +12,85 @@ class CanonicalSchema(BaseModel):
     price_usd: float
     market_cap: int
     last_updated: datetime
-    
-    # We removed user_name, email, transaction_amount
\ No newline at end of file
+
+    # We removed user_name, email, transaction_amount
+
+@dataclass
+class Reject:
+    """A raw record that failed normalization: its position in the raw batch and why."""
+    index: int
+    reason: str
+
+@dataclass
+class NormalizedBatch:
+    """
+    Columnar result of BaseSource.normalize: parallel NumPy arrays, one entry per accepted record.
+    `index` maps each entry back to its position in the raw batch.
+    """
+    source: str
+    index: np.ndarray         # int64
+    external_id: np.ndarray   # str
+    symbol: np.ndarray        # str, upper-cased
+    name: np.ndarray          # str
+    price_usd: np.ndarray     # float64, finite and >= 0
+    market_cap: np.ndarray    # int64, 0 = unknown
+    last_updated: np.ndarray  # datetime64[us], UTC (provider's timestamp)
+    rejects: List[Reject] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def take(self, positions: np.ndarray) -> "NormalizedBatch":
+        return NormalizedBatch(
+            source=self.source,
+            index=self.index[positions],
+            external_id=self.external_id[positions],
+            symbol=self.symbol[positions],
+            name=self.name[positions],
+            price_usd=self.price_usd[positions],
+            market_cap=self.market_cap[positions],
+            last_updated=self.last_updated[positions],
+            rejects=self.rejects,
+        )
+
+    def dedupe_last(self) -> "NormalizedBatch":
+        """Keeps the last entry per symbol (raw order preserved): ON CONFLICT can't touch a row twice."""
+        if len(self) == 0:
+            return self
+        _, first_in_reversed = np.unique(self.symbol[::-1], return_index=True)
+        return self.take(np.sort(len(self) - 1 - first_in_reversed))
+
+    def rows(self) -> Iterator[tuple]:
+        """(symbol, name, price_usd, market_cap, last_updated) as plain Python values."""
+        last_updated = [
+            ts.replace(tzinfo=timezone.utc) for ts in self.last_updated.astype("datetime64[us]").tolist()
+        ]
+        return zip(
+            self.symbol.tolist(), self.name.tolist(), self.price_usd.tolist(),
+            self.market_cap.tolist(), last_updated,
+        )
+
+    def to_schemas(self) -> List[CanonicalSchema]:
+        """Row-wise view, for debugging and callers that want Pydantic models."""
+        return [
+            CanonicalSchema(
+                external_id=external_id, source=self.source, symbol=symbol, name=name,
+                price_usd=price, market_cap=market_cap, last_updated=last_updated,
+            )
+            for external_id, (symbol, name, price, market_cap, last_updated)
+            in zip(self.external_id.tolist(), self.rows())
+        ]
+
+    @classmethod
+    def empty(cls, source: str, rejects: Optional[List[Reject]] = None) -> "NormalizedBatch":
+        return cls(
+            source=source,
+            index=np.empty(0, dtype=np.int64),
+            external_id=np.empty(0, dtype=str),
+            symbol=np.empty(0, dtype=str),
+            name=np.empty(0, dtype=str),
+            price_usd=np.empty(0, dtype=np.float64),
+            market_cap=np.empty(0, dtype=np.int64),
+            last_updated=np.empty(0, dtype="datetime64[us]"),
+            rejects=rejects or [],
+        )
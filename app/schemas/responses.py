@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+class CanonicalRow(BaseModel):
+    """One GET /data row. Every field is optional: `fields=` keeps only the requested columns."""
+    id: Optional[int] = None
+    symbol: Optional[str] = None
+    name: Optional[str] = None
+    price_usd: Optional[float] = None
+    market_cap: Optional[int] = None
+    consensus_price: Optional[float] = None
+    price_spread: Optional[float] = None
+    source_count: Optional[int] = None
+    last_updated: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+    provider_data: Optional[Dict[str, Any]] = None
+
+# Selectable canonical_data columns, in response order
+DATA_FIELDS = tuple(CanonicalRow.model_fields)
+
+class DataMetadata(BaseModel):
+    limit: int
+    sort: str
+    order: str
+    fields: List[str]
+    next_cursor: Optional[str] = None
+
+class DataPage(BaseModel):
+    metadata: DataMetadata
+    data: List[CanonicalRow]
@@ -0,0 +1,172 @@
+"""
+Long-running ETL worker.
+
+Every registered source runs on its own interval, concurrently, with its own AsyncSession.
+The price history rollups, and the raw_batches archival, run as scheduled jobs too.
+A Postgres advisory lock per source_id guarantees that API triggers, trigger scripts and any
+number of worker replicas never run the same pipeline at the same time.
+
+ETL_MODE=queue: a run of a source is planned as etl_tasks rows instead (still under its lock),
+and every worker process claims and runs tasks of any source, ETL_QUEUE_CONCURRENCY at a time
+(app.ingestion.tasks).
+
+Usage: python -m app.services.etl_service (one-off runs: python -m app.etl run <source>)
+"""
+import asyncio
+import signal
+from functools import partial
+from prometheus_client import start_http_server
+from typing import Awaitable, Callable, Optional, Set
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine, advisory_lock, check_schema, dispose_engines
+from app.core.logging import logger, setup_logging
+from app.ingestion import tasks
+from app.ingestion.http import close_http_client
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.ingestion.registry import SOURCES, build_source, source_interval
+from app.services import history, raw_store
+
+# Sources currently running in this process (cheap check before touching the DB)
+_running: Set[str] = set()
+
+def is_running(name: str) -> bool:
+    return name in _running
+
+async def run_source(name: str) -> bool:
+    """
+    Runs one ingestion for `name`. Returns False if it was already running anywhere.
+    Queue mode: plans it, and returns False while the previous run still has open tasks.
+    """
+    if settings.ETL_MODE == "queue":
+        return await plan_source(name)
+    source = build_source(name)
+    log = logger.bind(source=source.source_id)
+    if name in _running:
+        log.info("etl_skipped", reason="already_running_in_process")
+        return False
+
+    _running.add(name)
+    try:
+        async with advisory_lock(source.source_id) as acquired:
+            if not acquired:
+                log.info("etl_skipped", reason="locked_by_another_worker")
+                return False
+            async with AsyncSessionLocal() as session:
+                await IngestionOrchestrator(session, source).run()
+            return True
+    finally:
+        _running.discard(name)
+
+async def plan_source(name: str) -> bool:
+    """Queues the next run of `name` as tasks. False if it is locked, or its current run isn't over."""
+    source = build_source(name)
+    async with advisory_lock(source.source_id) as acquired:
+        if not acquired:
+            return False
+        async with AsyncSessionLocal() as session:
+            return await tasks.plan_job(session, source) is not None
+
+# source_id -> source name, for claimed tasks
+_SOURCE_NAMES = {source_id: name for name, (source_id, _, _) in SOURCES.items()}
+
+async def run_next_task(worker: str) -> bool:
+    """Claims one queued task and runs it. Returns False if there was nothing to claim."""
+    async with AsyncSessionLocal() as session:
+        lease = await tasks.claim(session, worker, list(_SOURCE_NAMES))
+    if lease is None:
+        return False
+
+    beat = asyncio.create_task(tasks.heartbeat(engine, lease))
+    try:
+        async with AsyncSessionLocal() as session:
+            await IngestionOrchestrator(session, build_source(_SOURCE_NAMES[lease.source_id]), task=lease).run()
+    finally:
+        beat.cancel()
+    return True
+
+async def _consume(worker: str, stop: asyncio.Event):
+    """Runs queued tasks back to back; polls every ETL_QUEUE_POLL_SECONDS when there are none."""
+    while not stop.is_set():
+        try:
+            ran = await run_next_task(worker)
+        except Exception as e:
+            # The orchestrator logged the trace and gave the task back
+            logger.error("etl_task_failed", worker=worker, error=str(e))
+            ran = True
+        if ran:
+            continue
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.ETL_QUEUE_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_rollups() -> bool:
+    """Refreshes the 1m/1h/1d OHLC rollups. Returns False if another worker is already on it."""
+    async with advisory_lock("price_rollups") as acquired:
+        if not acquired:
+            return False
+        await history.run_rollups(engine)
+        return True
+
+async def run_raw_archive() -> bool:
+    """Archives raw_batches partitions past RAW_RETENTION_DAYS to Parquet. False if another worker is on it."""
+    async with advisory_lock("raw_archive") as acquired:
+        if not acquired:
+            return False
+        await raw_store.archive_partitions(engine)
+        return True
+
+async def _schedule(name: str, job: Callable[[], Awaitable[bool]], interval: Callable[[], int], stop: asyncio.Event):
+    """Runs `job` every interval seconds (measured start to start) until stopped."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        try:
+            await job()
+        except Exception as e:
+            # Jobs log their own traces (the orchestrator also marks the checkpoint FAILED)
+            logger.error("etl_run_failed", source=name, error=str(e))
+        delay = max(0.0, interval() - (loop.time() - started))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+async def run_forever(stop: Optional[asyncio.Event] = None):
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Migrations are applied by the deploy (alembic upgrade head), not here
+    await check_schema()
+
+    if settings.WORKER_METRICS_PORT:
+        # Per-stage ETL metrics (app.core.metrics) for Prometheus to scrape
+        start_http_server(settings.WORKER_METRICS_PORT)
+
+    logger.info(
+        "worker_start", sources=list(SOURCES), mode=settings.ETL_MODE, metrics_port=settings.WORKER_METRICS_PORT,
+    )
+    try:
+        jobs = [
+            _schedule(name, partial(run_source, name), partial(source_interval, name), stop)
+            for name in SOURCES
+        ]
+        if settings.ETL_MODE == "queue":
+            jobs += [_consume(tasks.worker_name(slot), stop) for slot in range(settings.ETL_QUEUE_CONCURRENCY)]
+        jobs.append(_schedule("rollups", run_rollups, lambda: settings.ETL_INTERVAL_ROLLUPS, stop))
+        if settings.RAW_RETENTION_DAYS > 0:
+            jobs.append(_schedule("raw_archive", run_raw_archive, lambda: settings.ETL_INTERVAL_RAW_ARCHIVE, stop))
+        await asyncio.gather(*jobs)
+    finally:
+        await close_http_client()
+        await dispose_engines()
+        logger.info("worker_stopped")
+
+def run_all():
+    setup_logging()
+    asyncio.run(run_forever())
+
+if __name__ == "__main__":
+    run_all()
@@ -0,0 +1,126 @@
+"""
+Price history: monthly partitions for price_history and OHLC rollups (1m -> 1h -> 1d).
+
+A trigger on price_history records the minute of every inserted sample in price_rollup_dirty;
+run_rollups rebuilds exactly the 1m/1h/1d buckets containing those minutes, so late rows and
+replayed history land in their buckets too.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.events import data_generation, notify_commit
+from app.core.logging import logger
+from app.services import partitions
+
+# resolution -> (date_trunc unit, bucket width, table the rollup reads from)
+RESOLUTIONS = {
+    "1m": ("minute", timedelta(minutes=1), "price_history"),
+    "1h": ("hour", timedelta(hours=1), "1m"),
+    "1d": ("day", timedelta(days=1), "1h"),
+}
+
+# source_id of the generation bumps made by run_rollups
+ROLLUPS_SOURCE = "price_rollups"
+
+def partition_name(ts: datetime) -> str:
+    return partitions.partition_name("price_history", ts, "month")
+
+async def ensure_partition(engine: AsyncEngine, ts: datetime):
+    """Creates the monthly price_history partition covering `ts` (and the next one) if missing."""
+    await partitions.ensure_partition(engine, "price_history", "month", ts)
+
+_ROLLUP_FROM_HISTORY = """
+INSERT INTO price_rollups (resolution, symbol_id, bucket, open, high, low, close, market_cap, samples)
+SELECT :resolution, symbol_id, date_trunc(:unit, ts, 'UTC') AS bucket,
+       (array_agg(price ORDER BY ts))[1], max(price), min(price),
+       (array_agg(price ORDER BY ts DESC))[1],
+       (array_agg(market_cap ORDER BY ts DESC))[1],
+       count(*)
+FROM price_history
+JOIN unnest(CAST(:starts AS timestamptz[]), CAST(:ends AS timestamptz[])) AS r(start_ts, end_ts)
+    ON ts >= r.start_ts AND ts < coalesce(r.end_ts, 'infinity')
+GROUP BY symbol_id, date_trunc(:unit, ts, 'UTC')
+ON CONFLICT (resolution, symbol_id, bucket) DO UPDATE SET
+    open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close,
+    market_cap = EXCLUDED.market_cap, samples = EXCLUDED.samples
+"""
+
+_ROLLUP_FROM_ROLLUP = """
+INSERT INTO price_rollups (resolution, symbol_id, bucket, open, high, low, close, market_cap, samples)
+SELECT :resolution, symbol_id, date_trunc(:unit, bucket, 'UTC') AS coarse,
+       (array_agg(open ORDER BY bucket))[1], max(high), min(low),
+       (array_agg(close ORDER BY bucket DESC))[1],
+       (array_agg(market_cap ORDER BY bucket DESC))[1],
+       sum(samples)
+FROM price_rollups
+JOIN unnest(CAST(:starts AS timestamptz[]), CAST(:ends AS timestamptz[])) AS r(start_ts, end_ts)
+    ON bucket >= r.start_ts AND bucket < coalesce(r.end_ts, 'infinity')
+WHERE resolution = :source_resolution
+GROUP BY symbol_id, date_trunc(:unit, bucket, 'UTC')
+ON CONFLICT (resolution, symbol_id, bucket) DO UPDATE SET
+    open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, close = EXCLUDED.close,
+    market_cap = EXCLUDED.market_cap, samples = EXCLUDED.samples
+"""
+
+def _bucket_start(ts: datetime, width: timedelta) -> datetime:
+    seconds = width.total_seconds()
+    return datetime.fromtimestamp(ts.timestamp() // seconds * seconds, timezone.utc)
+
+def _bucket_ranges(minutes: Iterable[datetime], width: timedelta) -> List[Tuple[datetime, datetime]]:
+    """[start, end) of the buckets of `width` containing `minutes`, adjacent buckets merged."""
+    ranges: List[Tuple[datetime, datetime]] = []
+    for start in sorted({_bucket_start(minute, width) for minute in minutes}):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], start + width)
+        else:
+            ranges.append((start, start + width))
+    return ranges
+
+async def run_rollups(engine: AsyncEngine, since: Optional[datetime] = None) -> dict:
+    """
+    Downsamples price_history into 1m, then 1m into 1h, then 1h into 1d buckets.
+    Drains price_rollup_dirty and rebuilds every bucket containing a dirty minute, in the same
+    transaction, so a crash leaves them dirty and the job stays idempotent. `since` forces a
+    backfill of everything from there on, truncated to each resolution's bucket so no bucket is
+    rebuilt from partial input. A pass that changed buckets notifies like an ETL commit, so cached
+    /history responses are rebuilt. Returns rows upserted per resolution.
+    """
+    upserted = {}
+    async with engine.begin() as conn:
+        dirty: List[datetime] = []
+        if since is None:
+            dirty = (await conn.execute(text("DELETE FROM price_rollup_dirty RETURNING bucket"))).scalars().all()
+        for resolution, (unit, width, source) in RESOLUTIONS.items():
+            if since is not None:
+                ranges = [(_bucket_start(since, width), None)]
+            else:
+                ranges = _bucket_ranges(dirty, width)
+            if not ranges:
+                upserted[resolution] = 0
+                continue
+
+            params = {
+                "resolution": resolution,
+                "unit": unit,
+                "starts": [start for start, _ in ranges],
+                "ends": [end for _, end in ranges],
+            }
+            if source == "price_history":
+                result = await conn.execute(text(_ROLLUP_FROM_HISTORY), params)
+            else:
+                result = await conn.execute(text(_ROLLUP_FROM_ROLLUP), {**params, "source_resolution": source})
+            upserted[resolution] = result.rowcount
+        commit = await notify_commit(conn, ROLLUPS_SOURCE) if any(upserted.values()) else None
+    if commit is not None:
+        data_generation.bump(ROLLUPS_SOURCE, commit)
+    logger.info("rollups_complete", **upserted)
+    return upserted
+
+def choose_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """Finest rollup whose bucket count over [start, end] fits in max_points (falls back to 1d)."""
+    window = end - start
+    for resolution, (_, width, _) in RESOLUTIONS.items():
+        if window / width <= max_points:
+            return resolution
+    return "1d"
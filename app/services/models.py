@@ -1,6 +1,10 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, BigInteger, Index
+from sqlalchemy import (
+    Column, Integer, String, Text, DateTime, JSON, Float, BigInteger, Boolean, Index, PrimaryKeyConstraint,
+    LargeBinary, event, literal_column, text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
-from app.core.db import Base
+from app.core.db import Base, ADVISORY_LOCK_NAMESPACE
 
 class ETLCheckpoint(Base):
     __tablename__ = "etl_checkpoints"
@@ -10,12 +14,18 @@ class ETLCheckpoint(Base):
     status = Column(String, default="SUCCESS")
     metadata_blob = Column(JSON, default={})
 
+# Replay progress is kept in etl_checkpoints under "replay:<source_id>"; it isn't a pipeline,
+# so the pipeline views (/stats, `python -m app.etl status`) leave those rows out
+REPLAY_CHECKPOINT_PREFIX = "replay:"
+
 class RawData(Base):
+    """Legacy raw storage (RAW_STORAGE_MODE=record): one JSON row per fetched record."""
     __tablename__ = "raw_data"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     source_id = Column(String, index=True)
     payload = Column(JSON)
-    ingested_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Indexed for time-window exports
+    ingested_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 class CanonicalData(Base):
     __tablename__ = "canonical_data"
@@ -31,10 +41,274 @@ class CanonicalData(Base):
     market_cap = Column(BigInteger, nullable=True)
     
     # Store source-specific data here (e.g. {"coingecko": {"price": 500}, "coinpaprika": {"price": 501}})
-    provider_data = Column(JSON, default=dict)
+    # JSONB + GIN index so "coins seen by <source_id>" (provider_data ? 'source_id') is an index lookup
+    provider_data = Column(JSONB, default=dict)
+
+    # Cross-source consensus, recomputed from provider_data whenever a batch touches the coin
+    # (see app.ingestion.consensus). spread = (max - min) / consensus over contributing quotes.
+    consensus_price = Column(Float, nullable=True)
+    price_spread = Column(Float, nullable=True)
+    source_count = Column(Integer, nullable=True, index=True)
     
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     processed_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # No composite index on source+external_id anymore. 
-    # Normalization is enforced by the unique symbol constraint.
\ No newline at end of file
+    # Normalization is enforced by the unique symbol constraint.
+
+# Keyset pagination sort keys for GET /data. Each one is paired with `id` as a tie-breaker
+# and backed by a matching (key, id) btree index; Postgres scans it backwards for DESC.
+# market_cap is nullable, so it sorts as coalesce(market_cap, 0). The literal must stay inline
+# (not a bind parameter) or the planner won't match the expression index.
+CANONICAL_SORT_KEYS = {
+    "market_cap": func.coalesce(CanonicalData.market_cap, literal_column("0")),
+    "price_usd": CanonicalData.price_usd,
+    # Rows loaded before consensus existed fall back to the last written price
+    "consensus_price": func.coalesce(CanonicalData.consensus_price, CanonicalData.price_usd),
+    "last_updated": CanonicalData.last_updated,
+}
+
+Index("ix_canonical_data_market_cap_id", CANONICAL_SORT_KEYS["market_cap"], CanonicalData.id)
+Index("ix_canonical_data_price_usd_id", CanonicalData.price_usd, CanonicalData.id)
+Index("ix_canonical_data_consensus_price_id", CANONICAL_SORT_KEYS["consensus_price"], CanonicalData.id)
+Index("ix_canonical_data_last_updated_id", CanonicalData.last_updated, CanonicalData.id)
+Index("ix_canonical_data_provider_data", CanonicalData.provider_data, postgresql_using="gin")
+
+class RawBatch(Base):
+    """
+    Raw storage (RAW_STORAGE_MODE=batch): one row per fetched batch, payload = the batch's records
+    as a compressed JSON array. Range-partitioned by day on ingested_at; partitions are created on
+    demand and archived to Parquet after RAW_RETENTION_DAYS (app.services.raw_store).
+    """
+    __tablename__ = "raw_batches"
+    id = Column(BigInteger, autoincrement=True)
+    source_id = Column(String, nullable=False)
+    ingested_at = Column(DateTime(timezone=True), nullable=False)
+    codec = Column(String, nullable=False)  # zstd | gzip
+    record_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)  # Uncompressed
+    checksum = Column(String, nullable=False)  # blake2b-128 hex of the uncompressed payload
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "ingested_at"),
+        # Replay and export read one source over a time range
+        Index("ix_raw_batches_source_ingested", "source_id", "ingested_at"),
+        {"postgresql_partition_by": "RANGE (ingested_at)"},
+    )
+
+class PriceHistory(Base):
+    """
+    Append-only price samples, one row per (coin, source, ingestion time).
+    Range-partitioned by month on ts; partitions are created on demand (app.services.history).
+    """
+    __tablename__ = "price_history"
+    symbol_id = Column(Integer, nullable=False)  # canonical_data.id
+    source = Column(String, nullable=False)
+    ts = Column(DateTime(timezone=True), nullable=False)
+    price = Column(Float, nullable=False)
+    market_cap = Column(BigInteger, nullable=True)
+
+    __table_args__ = (
+        # (symbol_id, ts) first so "BTC over the last 24h" is a single index range scan
+        PrimaryKeyConstraint("symbol_id", "ts", "source"),
+        Index("ix_price_history_ts", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+class PriceRollup(Base):
+    """OHLC buckets downsampled from price_history. resolution is '1m', '1h' or '1d'."""
+    __tablename__ = "price_rollups"
+    resolution = Column(String, primary_key=True)
+    symbol_id = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    market_cap = Column(BigInteger, nullable=True)
+    samples = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Coarser rollups read a bucket range of the finer resolution
+        Index("ix_price_rollups_resolution_bucket", "resolution", "bucket"),
+    )
+
+class PriceRollupDirty(Base):
+    """
+    Minute buckets of price_history that got rows since the last rollup run: written by a trigger
+    (ROLLUP_DIRTY_DDL), drained by app.services.history.run_rollups. Not unique on purpose, so
+    concurrent batches never wait on each other's bucket row.
+    """
+    __tablename__ = "price_rollup_dirty"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    bucket = Column(DateTime(timezone=True), nullable=False)
+
+class RecordHash(Base):
+    """
+    Content hash of the last record loaded per (symbol, source), for change detection:
+    a record whose hash matches is skipped (no raw_data, canonical or history write).
+    """
+    __tablename__ = "record_hashes"
+    symbol = Column(String, primary_key=True)
+    source = Column(String, primary_key=True)
+    hash = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # Warm-up and lazy loads read one source at a time
+        Index("ix_record_hashes_source", "source"),
+    )
+
+class ETLRun(Base):
+    """One IngestionOrchestrator.run: timings and volumes, for run history and throughput stats."""
+    __tablename__ = "etl_runs"
+    id = Column(Integer, primary_key=True)
+    source_id = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="RUNNING")  # RUNNING | SUCCESS | NO_DATA | FAILED
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    records = Column(Integer, nullable=False, default=0)  # Raw records fetched
+    inserted = Column(Integer, nullable=False, default=0)
+    updated = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=False, default=0)  # Provider response bytes
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Rolling windows (GET /stats/runs) and "latest runs of a source"
+        Index("ix_etl_runs_started_at", "started_at"),
+        Index("ix_etl_runs_source_started", "source_id", "started_at"),
+    )
+
+class ETLTask(Base):
+    """
+    Queue mode (ETL_MODE=queue, app.ingestion.tasks): one slice of a source's run, offsets
+    (start_offset, end_offset]; end_offset NULL = to the end of the stream. Tasks planned together
+    share a job_id, and the source's checkpoint is derived from the job's finished tasks.
+    """
+    __tablename__ = "etl_tasks"
+    id = Column(BigInteger, primary_key=True)
+    source_id = Column(String, nullable=False)
+    job_id = Column(String, nullable=False)
+    start_offset = Column(BigInteger, nullable=False)
+    end_offset = Column(BigInteger, nullable=True)
+    progress_offset = Column(BigInteger, nullable=False)  # Moves with every committed batch
+    status = Column(String, nullable=False, default="PENDING")  # PENDING | RUNNING | DONE | FAILED
+    attempts = Column(Integer, nullable=False, default=0)  # Also the lease's fencing token
+    worker = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    end_of_stream = Column(Boolean, nullable=False, default=False)  # The source's stream ended inside this task
+    records = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Claims scan open tasks in id order; finished ones drop out of the index
+        Index("ix_etl_tasks_open", "id", postgresql_where=text("status IN ('PENDING', 'RUNNING')")),
+        Index("ix_etl_tasks_source_job", "source_id", "job_id"),
+    )
+
+class ETLCounter(Base):
+    """
+    Row (or record) counts of COUNTED_TABLES, maintained by statement-level triggers so /stats never counts rows.
+    Sharded by backend pid, so concurrent pipelines don't queue on one row; a count is the sum of its shards.
+    """
+    __tablename__ = "etl_counters"
+    name = Column(String, primary_key=True)  # Table name
+    shard = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+# Table -> what a row is worth. raw_batches counts records, and keeps counting archived ones
+# (dropping a partition fires no trigger).
+COUNTED_TABLES = {"canonical_data": "count(*)", "raw_data": "count(*)", "raw_batches": "sum(record_count)"}
+COUNTER_SHARDS = 8
+
+def _count_branch(rows: str) -> str:
+    branches = " ELS".join(
+        f"IF TG_TABLE_NAME = '{table}' THEN SELECT coalesce({expression}, 0) INTO delta FROM {rows};\n"
+        for table, expression in COUNTED_TABLES.items()
+    )
+    return branches + "END IF;"
+
+_COUNT_ROWS_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION etl_count_rows() RETURNS trigger LANGUAGE plpgsql AS $fn$
+DECLARE
+    delta bigint;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE etl_counters SET value = 0 WHERE name = TG_TABLE_NAME;
+        RETURN NULL;
+    ELSIF TG_OP = 'INSERT' THEN
+        {_count_branch("new_rows")}
+    ELSE
+        {_count_branch("old_rows")}
+        delta = -delta;
+    END IF;
+    IF delta <> 0 THEN
+        INSERT INTO etl_counters (name, shard, value)
+        VALUES (TG_TABLE_NAME, mod(pg_backend_pid(), {COUNTER_SHARDS}), delta)
+        ON CONFLICT (name, shard) DO UPDATE SET value = etl_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END
+$fn$;
+"""
+
+def _counter_triggers(table: str, expression: str) -> str:
+    # Created (and the counter seeded with one full count) only once, in the same transaction,
+    # so no row is missed or counted twice
+    return f"""
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_count_insert') THEN
+        CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        CREATE TRIGGER {table}_count_truncate AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION etl_count_rows();
+        INSERT INTO etl_counters (name, shard, value) SELECT '{table}', 0, coalesce({expression}, 0) FROM {table}
+        ON CONFLICT (name, shard) DO NOTHING;
+    END IF;
+    """
+
+COUNTER_DDL = f"""
+DO $$
+BEGIN
+    -- Test and benchmark processes may run create_all concurrently
+    PERFORM pg_advisory_xact_lock({ADVISORY_LOCK_NAMESPACE}, hashtext('etl_counters'));
+    {_COUNT_ROWS_FUNCTION}
+    {"".join(_counter_triggers(table, expression) for table, expression in COUNTED_TABLES.items())}
+END
+$$;
+"""
+
+# Statement-level, so a bulk history insert adds one row per distinct minute, not per sample
+ROLLUP_DIRTY_DDL = f"""
+DO $$
+BEGIN
+    PERFORM pg_advisory_xact_lock({ADVISORY_LOCK_NAMESPACE}, hashtext('price_rollup_dirty'));
+    CREATE OR REPLACE FUNCTION price_rollup_mark_dirty() RETURNS trigger LANGUAGE plpgsql AS $fn$
+    BEGIN
+        INSERT INTO price_rollup_dirty (bucket) SELECT DISTINCT date_trunc('minute', ts, 'UTC') FROM new_rows;
+        RETURN NULL;
+    END
+    $fn$;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'price_history_mark_dirty') THEN
+        CREATE TRIGGER price_history_mark_dirty AFTER INSERT ON price_history
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION price_rollup_mark_dirty();
+    END IF;
+END
+$$;
+"""
+
+# create_all (tests, benchmarks). Deployed databases get the triggers from the migrations
+# (alembic/versions): changes to COUNTER_DDL or ROLLUP_DIRTY_DDL, like any schema change, need a new revision.
+@event.listens_for(Base.metadata, "after_create")
+def _install_triggers(target, connection, **kw):
+    if "etl_counters" in target.tables:
+        connection.execute(text(COUNTER_DDL))
+    if "price_rollup_dirty" in target.tables:
+        connection.execute(text(ROLLUP_DIRTY_DDL))
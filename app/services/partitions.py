@@ -0,0 +1,53 @@
+"""
+Range partitions created on demand: monthly for price_history, daily for raw_batches.
+
+Partitions are named `<table>_y<YYYY>m<MM>` (month) or `<table>_y<YYYY>m<MM>d<DD>` (day), cover
+[start, next start) in UTC, and are created one period ahead so writers near a boundary never miss.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Set
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.core.db import ADVISORY_LOCK_NAMESPACE
+
+Unit = Literal["month", "day"]
+
+# Partitions we know exist, so writers only pay for the DDL check once per period per process
+_known_partitions: Set[str] = set()
+
+def period_start(ts: datetime, unit: Unit) -> datetime:
+    start = ts.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start.replace(day=1) if unit == "month" else start
+
+def next_period(start: datetime, unit: Unit) -> datetime:
+    if unit == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+def partition_name(table: str, ts: datetime, unit: Unit) -> str:
+    start = period_start(ts, unit)
+    name = f"{table}_y{start.year}m{start.month:02d}"
+    return name if unit == "month" else f"{name}d{start.day:02d}"
+
+async def ensure_partition(engine: AsyncEngine, table: str, unit: Unit, ts: datetime):
+    """Creates the `table` partition covering `ts` (and the next one) if missing."""
+    start = period_start(ts, unit)
+    for current in (start, next_period(start, unit)):
+        name = partition_name(table, current, unit)
+        if name in _known_partitions:
+            continue
+        async with engine.begin() as conn:
+            # Serialize concurrent workers: CREATE ... IF NOT EXISTS can still race on the catalog
+            await conn.execute(
+                text("SELECT pg_advisory_xact_lock(:ns, hashtext(:key))"),
+                {"ns": ADVISORY_LOCK_NAMESPACE, "key": f"{table}_partitions"},
+            )
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{current.isoformat()}') TO ('{next_period(current, unit).isoformat()}')"
+            ))
+        _known_partitions.add(name)
+
+def forget_partition(name: str):
+    """Call after dropping a partition, so the next write re-creates it."""
+    _known_partitions.discard(name)
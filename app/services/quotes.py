@@ -0,0 +1,131 @@
+"""
+In-memory quote snapshot for GET /quotes.
+
+One QuoteSnapshot per API process holds every canonical_data row:
+  - index: symbol -> the quote, already encoded as JSON bytes
+  - presorted arrays: symbols and market caps, by market cap descending (top-N lookups)
+Snapshots are immutable. A commit notification (data_generation) marks the current one stale, a
+background task reads the table once and swaps the new snapshot in with a single assignment, so
+readers always see one complete generation and lookups never wait on the database.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import List, Mapping, Optional, Tuple
+import numpy as np
+import orjson
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.db import engine
+from app.core.events import CoalescingRefresher, data_generation
+from app.core.logging import logger
+from app.core.metrics import QUOTE_SNAPSHOT_SECONDS, QUOTE_SNAPSHOT_SYMBOLS
+from app.services.models import CANONICAL_SORT_KEYS, CanonicalData
+from app.services.stream import QUOTE_COLUMNS, quote_from_row
+
+def _encode(quote: dict) -> bytes:
+    return orjson.dumps(quote)
+
+@dataclass(frozen=True)
+class QuoteSnapshot:
+    generation: int  # data_generation.value when the rows were read
+    built_at: datetime
+    quotes: Mapping[str, bytes] = field(repr=False)
+    # Market cap descending; a missing market cap sorts as 0, ties by id
+    symbols: np.ndarray = field(repr=False)
+    market_caps: np.ndarray = field(repr=False)
+
+    def __len__(self) -> int:
+        return len(self.quotes)
+
+    def lookup(self, symbols: List[str]) -> Tuple[List[bytes], List[str]]:
+        """(encoded quotes in request order, unknown symbols)."""
+        found, missing = [], []
+        for symbol in symbols:
+            quote = self.quotes.get(symbol)
+            if quote is None:
+                missing.append(symbol)
+            else:
+                found.append(quote)
+        return found, missing
+
+    def top(self, limit: int, min_market_cap: int = 0) -> List[bytes]:
+        """The `limit` largest coins by market cap, optionally above `min_market_cap`."""
+        if min_market_cap:
+            # Binary search on the ascending view: how many are at or above the threshold
+            ascending = self.market_caps[::-1]
+            limit = min(limit, len(ascending) - int(np.searchsorted(ascending, min_market_cap, side="left")))
+        return [self.quotes[symbol] for symbol in self.symbols[:limit]]
+
+    def body(self, key: str, payload: bytes, **extra) -> bytes:
+        """Response JSON around pre-encoded quotes: nothing is serialized per quote."""
+        header = {"generation": self.generation, "built_at": self.built_at.isoformat(), **extra}
+        return _encode(header)[:-1] + b',"' + key.encode() + b'":' + payload + b"}"
+
+async def build_snapshot() -> QuoteSnapshot:
+    generation = data_generation.value
+    started = time.perf_counter()
+    # Always the primary: a replica may not have replayed the commit we were notified about yet
+    query = select(*QUOTE_COLUMNS).order_by(CANONICAL_SORT_KEYS["market_cap"].desc(), CanonicalData.id)
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+    quotes = {row.symbol: _encode(quote_from_row(row)) for row in rows}
+    snapshot = QuoteSnapshot(
+        generation=generation,
+        built_at=datetime.now(timezone.utc),
+        quotes=MappingProxyType(quotes),
+        symbols=np.array([row.symbol for row in rows], dtype=object),
+        market_caps=np.array([row.market_cap or 0 for row in rows], dtype=np.int64),
+    )
+    QUOTE_SNAPSHOT_SECONDS.observe(time.perf_counter() - started)
+    QUOTE_SNAPSHOT_SYMBOLS.set(len(quotes))
+    return snapshot
+
+class QuoteStore:
+    """Holds the current QuoteSnapshot and rebuilds it after commits, QUOTES_REBUILD_MIN_SECONDS apart at most."""
+
+    def __init__(self):
+        self.snapshot: Optional[QuoteSnapshot] = None
+        self._first_build: Optional[asyncio.Task] = None
+        self.log = logger.bind(component="quote_store")
+        self.refresher = CoalescingRefresher(self.rebuild, lambda: settings.QUOTES_REBUILD_MIN_SECONDS, self.log)
+
+    async def current(self) -> QuoteSnapshot:
+        """The latest snapshot. Only the first call of the process waits, for the initial build."""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot
+        if self._first_build is None or self._first_build.done():
+            # Concurrent first requests share one build
+            self._first_build = asyncio.create_task(self.rebuild())
+        await asyncio.shield(self._first_build)
+        # Commits that landed during the first build are picked up straight away
+        self.refresher.start(dirty=self.snapshot is None or self.snapshot.generation != data_generation.value)
+        return self.snapshot
+
+    async def rebuild(self):
+        snapshot = await build_snapshot()
+        if self.snapshot is not None and self.snapshot.generation > snapshot.generation:
+            # A build that started later already swapped in
+            return
+        # One reference swap: requests hold either the old or the new snapshot, never a mix
+        self.snapshot = snapshot
+        self.log.debug("quote_snapshot_built", generation=snapshot.generation, symbols=len(snapshot))
+
+    async def stop(self):
+        await self.refresher.stop()
+        if self._first_build is not None and not self._first_build.done():
+            self._first_build.cancel()
+            try:
+                await self._first_build
+            except asyncio.CancelledError:
+                pass
+        self._first_build = None
+
+    def clear(self):
+        """Drops the snapshot (tests); the next lookup builds a fresh one."""
+        self.snapshot = None
+
+quote_store = QuoteStore()
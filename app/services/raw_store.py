@@ -0,0 +1,318 @@
+"""
+Raw payload storage: compressed batches, daily partitions, Parquet archival, and a reader.
+
+In batch mode (RAW_STORAGE_MODE=batch) every fetched batch becomes one raw_batches row: the
+records as a JSON array, zstd- (or gzip-) compressed, with its record count, uncompressed size
+and a checksum. raw_batches is range-partitioned by day; `archive_partitions` moves days older
+than RAW_RETENTION_DAYS into one Parquet file each under RAW_ARCHIVE_DIR and drops them.
+
+`read_batches` yields a source's raw records across all three places they may live: legacy
+per-record raw_data rows, archived Parquet days, and raw_batches.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.core.config import settings
+from app.core.logging import logger
+from app.services import partitions
+from app.services.models import RawBatch, RawData
+
+CODECS = ("zstd", "gzip")
+# Rows per read (DB cursor fetch, Parquet row group)
+READ_BATCH_SIZE = 500
+
+_PARTITION_RE = re.compile(r"^raw_batches_y(\d{4})m(\d{2})d(\d{2})$")
+ARCHIVE_COLUMNS = ["id", "source_id", "ingested_at", "codec", "record_count", "size_bytes", "checksum", "payload"]
+
+class RawBatchCorrupt(ValueError):
+    """A stored batch whose payload doesn't match its checksum or record count."""
+
+@dataclass
+class StoredBatch:
+    """Raw records as stored: one raw_batches row, or a chunk of legacy raw_data rows (batch_id None)."""
+    source_id: str
+    ingested_at: datetime
+    records: List[Dict]
+    batch_id: Optional[int] = None
+    record_ids: Optional[List[int]] = None  # raw_data ids, legacy rows only
+
+# --- Encoding ---
+
+def _codec() -> str:
+    codec = settings.RAW_COMPRESSION
+    if codec not in CODECS:
+        raise ValueError(f"Unknown RAW_COMPRESSION {codec!r}, expected one of {CODECS}")
+    if codec == "zstd":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            # zstd comes from pyarrow (no extra dependency); without it, still store something
+            return "gzip"
+    return codec
+
+def checksum(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def encode(records: List[Dict]) -> Dict:
+    """Column values of a raw_batches row (all but source_id / ingested_at)."""
+    data = json.dumps(records, separators=(",", ":")).encode()
+    codec = _codec()
+    if codec == "zstd":
+        import pyarrow as pa
+        payload = pa.compress(data, codec="zstd", asbytes=True)
+    else:
+        payload = gzip.compress(data, compresslevel=6)
+    return {
+        "codec": codec,
+        "record_count": len(records),
+        "size_bytes": len(data),
+        "checksum": checksum(data),
+        "payload": payload,
+    }
+
+def decode(codec: str, payload: bytes, size_bytes: int, digest: str, record_count: int) -> List[Dict]:
+    if codec == "zstd":
+        import pyarrow as pa
+        data = pa.decompress(payload, decompressed_size=size_bytes, codec="zstd", asbytes=True)
+    elif codec == "gzip":
+        data = gzip.decompress(payload)
+    else:
+        raise RawBatchCorrupt(f"unknown codec {codec!r}")
+    if checksum(data) != digest:
+        raise RawBatchCorrupt("checksum mismatch")
+    records = json.loads(data)
+    if len(records) != record_count:
+        raise RawBatchCorrupt(f"expected {record_count} records, found {len(records)}")
+    return records
+
+# --- Partitions ---
+
+def partition_name(day: date) -> str:
+    return partitions.partition_name("raw_batches", _day_start(day), "day")
+
+def partition_day(name: str) -> Optional[date]:
+    match = _PARTITION_RE.match(name)
+    return date(*map(int, match.groups())) if match else None
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time(), tzinfo=timezone.utc)
+
+async def ensure_partition(engine: AsyncEngine, ts: datetime):
+    """Creates the daily raw_batches partition covering `ts` (and the next day's) if missing."""
+    await partitions.ensure_partition(engine, "raw_batches", "day", ts)
+
+async def write_batch(session: AsyncSession, source_id: str, records: List[Dict], ingested_at: datetime):
+    """Stores a fetched batch as one compressed row, in the caller's transaction."""
+    if not records:
+        return
+    await ensure_partition(session.bind, ingested_at)
+    await session.execute(insert(RawBatch).values(source_id=source_id, ingested_at=ingested_at, **encode(records)))
+
+# --- Archival ---
+
+def archive_path(day: date, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or settings.RAW_ARCHIVE_DIR, f"{partition_name(day)}.parquet")
+
+def _archive_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()), ("source_id", pa.string()), ("ingested_at", pa.timestamp("us", tz="UTC")),
+        ("codec", pa.string()), ("record_count", pa.int32()), ("size_bytes", pa.int32()),
+        ("checksum", pa.string()), ("payload", pa.binary()),
+    ])
+
+async def _list_partitions(conn) -> List[Tuple[str, date]]:
+    rows = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'raw_batches'::regclass"
+    ))
+    partitions = [(name, partition_day(name)) for (name,) in rows]
+    return sorted((name, day) for name, day in partitions if day is not None)
+
+async def _archive_one(engine: AsyncEngine, name: str, day: date) -> int:
+    """Copies one partition to Parquet (tmp file, then rename), then detaches and drops it."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = archive_path(day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    schema = _archive_schema()
+    rows_written = 0
+    async with engine.connect() as conn:
+        result = await conn.stream(text(
+            f"SELECT {', '.join(ARCHIVE_COLUMNS)} FROM {name} ORDER BY ingested_at, id"
+        ))
+        # Payloads are already compressed: Parquet only compresses the small columns
+        with pq.ParquetWriter(path + ".tmp", schema, compression="zstd") as writer:
+            async for rows in result.partitions(READ_BATCH_SIZE):
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema,
+                ))
+                rows_written += len(rows)
+
+    async with engine.begin() as conn:
+        stored = (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar()
+        if stored != rows_written:
+            # Rows landed in an "old" partition meanwhile (clock skew): keep it for the next run
+            os.remove(path + ".tmp")
+            raise RuntimeError(f"{name} changed while archiving ({stored} rows, {rows_written} archived)")
+        if rows_written:
+            os.replace(path + ".tmp", path)
+        else:
+            # Pre-created day that never got a batch: nothing worth a file
+            os.remove(path + ".tmp")
+        await conn.execute(text(f"ALTER TABLE raw_batches DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+    partitions.forget_partition(name)
+    return rows_written
+
+async def archive_partitions(engine: AsyncEngine, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Moves every raw_batches partition whose whole day is older than RAW_RETENTION_DAYS to Parquet.
+    Returns rows archived per partition. Idempotent; RAW_RETENTION_DAYS=0 disables it.
+    """
+    if settings.RAW_RETENTION_DAYS <= 0:
+        return {}
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=settings.RAW_RETENTION_DAYS)
+    async with engine.connect() as conn:
+        partitions = await _list_partitions(conn)
+
+    archived = {}
+    for name, day in partitions:
+        if _day_start(day + timedelta(days=1)) > cutoff:
+            break
+        archived[name] = await _archive_one(engine, name, day)
+        logger.info("raw_partition_archived", partition=name, rows=archived[name])
+    return archived
+
+# --- Reading ---
+
+def _archived_days(start: Optional[datetime], end: Optional[datetime]) -> List[date]:
+    directory = settings.RAW_ARCHIVE_DIR
+    if not directory or not os.path.isdir(directory):
+        return []
+    days = []
+    for file_name in os.listdir(directory):
+        day = partition_day(file_name.removesuffix(".parquet")) if file_name.endswith(".parquet") else None
+        if day is None:
+            continue
+        if start is not None and _day_start(day + timedelta(days=1)) <= start:
+            continue
+        if end is not None and _day_start(day) >= end:
+            continue
+        days.append(day)
+    return sorted(days)
+
+def _in_window(ts: datetime, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    return (start is None or ts >= start) and (end is None or ts < end)
+
+def _read_archive(day: date, source_id: Optional[str], start: Optional[datetime], end: Optional[datetime]):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(archive_path(day))
+    for group in range(parquet.num_row_groups):
+        for row in parquet.read_row_group(group).to_pylist():
+            if source_id and row["source_id"] != source_id:
+                continue
+            if not _in_window(row["ingested_at"], start, end):
+                continue
+            yield row
+
+def _batch_query(source_id: Optional[str], start: Optional[datetime], end: Optional[datetime]):
+    query = select(*(getattr(RawBatch, c) for c in ARCHIVE_COLUMNS)).order_by(RawBatch.ingested_at, RawBatch.id)
+    if source_id:
+        query = query.where(RawBatch.source_id == source_id)
+    if start:
+        query = query.where(RawBatch.ingested_at >= start)
+    if end:
+        query = query.where(RawBatch.ingested_at < end)
+    return query
+
+def _legacy_query(source_id: Optional[str], start: Optional[datetime], end: Optional[datetime], after_id: Optional[int]):
+    query = select(RawData.id, RawData.source_id, RawData.ingested_at, RawData.payload).order_by(RawData.id)
+    if after_id is not None:
+        query = query.where(RawData.id > after_id)
+    if source_id:
+        query = query.where(RawData.source_id == source_id)
+    if start:
+        query = query.where(RawData.ingested_at >= start)
+    if end:
+        query = query.where(RawData.ingested_at < end)
+    return query
+
+def _from_row(row) -> StoredBatch:
+    row = row if isinstance(row, dict) else row._mapping
+    return StoredBatch(
+        source_id=row["source_id"],
+        ingested_at=row["ingested_at"],
+        records=decode(row["codec"], row["payload"], row["size_bytes"], row["checksum"], row["record_count"]),
+        batch_id=row["id"],
+    )
+
+async def read_batches(
+    engine: AsyncEngine,
+    source_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    after_batch: Optional[Tuple[datetime, int]] = None,
+    after_record_id: Optional[int] = None,
+) -> AsyncIterator[StoredBatch]:
+    """
+    Stored raw records of a source (all sources if None) in [start, end), oldest first: legacy
+    raw_data rows (in chunks), then archived days, then raw_batches. Never touches the network.
+    Resuming: `after_record_id` skips legacy rows up to that raw_data id; `after_batch` =
+    (ingested_at, batch_id) resumes after that batch and skips the legacy rows altogether.
+    """
+    if after_batch is None:
+        query = _legacy_query(source_id, start, end, after_record_id)
+        async with engine.connect() as conn:
+            result = await conn.stream(query.execution_options(yield_per=READ_BATCH_SIZE))
+            async for rows in result.partitions():
+                # One StoredBatch per source run of consecutive rows
+                chunk: List = []
+                for row in rows:
+                    if chunk and chunk[-1].source_id != row.source_id:
+                        yield _legacy_batch(chunk)
+                        chunk = []
+                    chunk.append(row)
+                if chunk:
+                    yield _legacy_batch(chunk)
+
+    resume_start = start
+    if after_batch is not None and (start is None or after_batch[0] > start):
+        resume_start = after_batch[0]
+
+    def after_resume_point(batch: StoredBatch) -> bool:
+        return after_batch is None or (batch.ingested_at, batch.batch_id) > after_batch
+
+    for day in _archived_days(resume_start, end):
+        for row in _read_archive(day, source_id, resume_start, end):
+            batch = _from_row(row)
+            if after_resume_point(batch):
+                yield batch
+
+    async with engine.connect() as conn:
+        result = await conn.stream(_batch_query(source_id, resume_start, end).execution_options(yield_per=READ_BATCH_SIZE))
+        async for rows in result.partitions():
+            for row in rows:
+                batch = _from_row(row)
+                if after_resume_point(batch):
+                    yield batch
+
+def _legacy_batch(rows: List) -> StoredBatch:
+    return StoredBatch(
+        source_id=rows[0].source_id,
+        ingested_at=rows[-1].ingested_at,
+        records=[row.payload for row in rows],
+        record_ids=[row.id for row in rows],
+    )
@@ -0,0 +1,55 @@
+"""
+Pipeline statistics without table scans: trigger-maintained row counters (etl_counters)
+and rolling aggregates over the run history (etl_runs).
+"""
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy import case, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.models import ETLCounter, ETLRun, COUNTED_TABLES
+
+async def row_counts(session: AsyncSession) -> Dict[str, int]:
+    """table -> row count, summed over the counter shards (at most COUNTER_SHARDS rows per table)."""
+    rows = await session.execute(
+        select(ETLCounter.name, func.sum(ETLCounter.value)).group_by(ETLCounter.name)
+    )
+    counts = {table: 0 for table in COUNTED_TABLES}
+    counts.update({name: int(value) for name, value in rows.all()})
+    return counts
+
+async def run_stats(session: AsyncSession, since: datetime) -> List[Dict]:
+    """Per source: finished runs started since `since`, p50/p95 durations and records/sec."""
+    duration = ETLRun.duration_seconds
+    # Runs that fetched nothing would drag throughput to zero: NULL, which percentile_cont skips
+    rate = case((ETLRun.records > 0, ETLRun.records / func.nullif(duration, 0)))
+    query = (
+        select(
+            ETLRun.source_id,
+            func.count().label("runs"),
+            func.count().filter(ETLRun.status == "FAILED").label("failed"),
+            func.percentile_cont(0.5).within_group(duration).label("duration_p50"),
+            func.percentile_cont(0.95).within_group(duration).label("duration_p95"),
+            func.percentile_cont(0.5).within_group(rate).label("records_per_sec_p50"),
+            func.percentile_cont(0.95).within_group(rate).label("records_per_sec_p95"),
+            func.sum(ETLRun.records).label("records"),
+            func.sum(ETLRun.bytes).label("bytes"),
+            func.max(ETLRun.finished_at).label("last_finished_at"),
+        )
+        .where(ETLRun.started_at >= since, ETLRun.finished_at.is_not(None))
+        .group_by(ETLRun.source_id)
+        .order_by(ETLRun.source_id)
+    )
+    result = await session.execute(query)
+    return [
+        {
+            "source": row.source_id,
+            "runs": row.runs,
+            "failed": row.failed,
+            "duration_seconds": {"p50": row.duration_p50, "p95": row.duration_p95},
+            "records_per_sec": {"p50": row.records_per_sec_p50, "p95": row.records_per_sec_p95},
+            "records": int(row.records or 0),
+            "bytes": int(row.bytes or 0),
+            "last_finished_at": row.last_finished_at,
+        }
+        for row in result
+    ]
@@ -0,0 +1,156 @@
+"""
+Live quote deltas for /stream (SSE) and /ws (WebSocket) clients.
+
+One StreamHub per API process. It wakes up on every data_generation bump (local orchestrator
+commits, and other processes' commits via LISTEN/NOTIFY), re-reads the watched symbols in one
+query and hands each subscriber only the quotes that changed.
+
+Subscribers don't have a message queue: each keeps the latest pending quote per symbol, so a slow
+consumer gets fewer, coalesced updates and memory stays bounded by the size of its symbol list.
+"""
+import asyncio
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.db import engine
+from app.core.events import CoalescingRefresher
+from app.core.logging import logger
+from app.core.metrics import STREAM_SUBSCRIBERS, STREAM_COALESCED
+from app.services.models import CanonicalData
+
+QUOTE_COLUMNS = (
+    CanonicalData.symbol, CanonicalData.price_usd, CanonicalData.consensus_price, CanonicalData.price_spread,
+    CanonicalData.source_count, CanonicalData.market_cap, CanonicalData.last_updated,
+)
+
+def quote_from_row(row) -> Dict:
+    quote = dict(row._mapping)
+    quote["last_updated"] = quote["last_updated"].isoformat() if quote["last_updated"] else None
+    return quote
+
+class Subscription:
+    """One client's symbol set and its pending (not yet sent) quotes, latest value per symbol."""
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols: Set[str] = set(symbols)
+        self.pending: Dict[str, Dict] = {}
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._sent_snapshot = False
+
+    def offer(self, quotes: Dict[str, Dict]):
+        if len(quotes) > len(self.symbols):
+            matches = [symbol for symbol in self.symbols if symbol in quotes]
+        else:
+            matches = [symbol for symbol in quotes if symbol in self.symbols]
+        for symbol in matches:
+            if symbol in self.pending:
+                # The client hasn't taken the previous value yet: it only ever gets the latest one
+                STREAM_COALESCED.inc()
+            self.pending[symbol] = quotes[symbol]
+        if matches:
+            self._ready.set()
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Waits for pending quotes: ("snapshot" | "delta", quotes). The first message is the snapshot.
+        None on timeout (send a heartbeat) or once closed.
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        if self.closed:
+            return None
+        quotes, self.pending = self.pending, {}
+        kind = "delta" if self._sent_snapshot else "snapshot"
+        self._sent_snapshot = True
+        return kind, [quotes[symbol] for symbol in sorted(quotes)]
+
+class StreamHub:
+    def __init__(self):
+        self.subscriptions: Set[Subscription] = set()
+        # Last published quote per watched symbol, and how many subscriptions watch it
+        self.quotes: Dict[str, Dict] = {}
+        self.watchers: Counter = Counter()
+        self.log = logger.bind(component="stream_hub")
+        self.refresher = CoalescingRefresher(
+            self.refresh, lambda: settings.STREAM_COALESCE_SECONDS, self.log, wanted=lambda: bool(self.subscriptions),
+        )
+
+    async def stop(self):
+        await self.refresher.stop()
+        for subscription in list(self.subscriptions):
+            subscription.close()
+
+    async def _load(self, symbols: List[str]) -> Dict[str, Dict]:
+        # Always the primary: a replica may not have replayed the commit we were notified about yet
+        async with engine.connect() as conn:
+            rows = await conn.execute(select(*QUOTE_COLUMNS).where(CanonicalData.symbol.in_(symbols)))
+            return {row.symbol: quote_from_row(row) for row in rows}
+
+    async def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        self.refresher.start()
+        subscription = Subscription(symbols)
+        self.subscriptions.add(subscription)
+        STREAM_SUBSCRIBERS.set(len(self.subscriptions))
+        try:
+            await self.watch(subscription, subscription.symbols)
+        except BaseException:
+            # Snapshot load failed or the caller was cancelled: don't leave it registered
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    async def watch(self, subscription: Subscription, symbols: Iterable[str]):
+        """Adds symbols to a subscription; their current quotes are sent with the next message."""
+        symbols = set(symbols)
+        subscription.symbols |= symbols
+        self.watchers.update(symbols)
+        missing = [symbol for symbol in symbols if symbol not in self.quotes]
+        if missing:
+            self.quotes.update(await self._load(missing))
+        subscription.offer({symbol: self.quotes[symbol] for symbol in symbols if symbol in self.quotes})
+
+    def unwatch(self, subscription: Subscription, symbols: Iterable[str]):
+        symbols = set(symbols) & subscription.symbols
+        subscription.symbols -= symbols
+        for symbol in symbols:
+            subscription.pending.pop(symbol, None)
+            self.watchers[symbol] -= 1
+            if self.watchers[symbol] <= 0:
+                del self.watchers[symbol]
+                self.quotes.pop(symbol, None)
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription not in self.subscriptions:
+            return
+        self.unwatch(subscription, list(subscription.symbols))
+        self.subscriptions.discard(subscription)
+        subscription.close()
+        STREAM_SUBSCRIBERS.set(len(self.subscriptions))
+
+    async def refresh(self):
+        """Re-reads every watched symbol and offers the changed quotes to the subscribers."""
+        symbols = list(self.watchers)
+        if not symbols:
+            return
+        current = await self._load(symbols)
+        # Symbols unwatched while we were reading are dropped
+        changed = {
+            symbol: quote for symbol, quote in current.items()
+            if symbol in self.watchers and self.quotes.get(symbol) != quote
+        }
+        if not changed:
+            return
+        self.quotes.update(changed)
+        for subscription in list(self.subscriptions):
+            subscription.offer(changed)
+
+stream_hub = StreamHub()
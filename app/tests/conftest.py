@@ -1,7 +1,25 @@
+import os
 import pytest
+import pytest_asyncio
 import asyncio
+from alembic import command
+from alembic.config import Config
 from sqlalchemy import text
-from app.core.db import engine, Base, AsyncSessionLocal
+from app.core.config import settings
+from app.core.db import engine, AsyncSessionLocal
+from app.core.events import data_generation
+from app.ingestion.adaptive import provider_controllers
+from app.ingestion.fingerprints import record_hashes
+from app.services.quotes import quote_store
+
+ALEMBIC_INI = os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini")
+
+def alembic_config(url: str = None) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.attributes["configure_logger"] = False
+    if url:
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
 
 # 1. FIX THE LOOP ERROR: Force one event loop for the whole test session
 @pytest.fixture(scope="session")
@@ -11,17 +29,36 @@ def event_loop():
     yield loop
     loop.close()
 
+# Each test gets its own provider response cache, so mock responses never leak between tests
+@pytest.fixture(autouse=True)
+def isolated_http_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_CACHE_DIR", str(tmp_path / "http_cache"))
+
+# Provider retries back off for milliseconds
+@pytest.fixture(autouse=True)
+def fast_provider_retries(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_RETRY_BASE", 0.01)
+
+# The test database is built by the migrations, like a deployed one
+@pytest.fixture(scope="session")
+def migrated_db():
+    command.upgrade(alembic_config(), "head")
+
 # 2. FIX THE DIRTY DB: Wipe database before every test function
-@pytest.fixture(scope="function", autouse=True)
-async def setup_db():
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def setup_db(migrated_db):
     """Cleans the database before each test."""
     async with engine.begin() as conn:
-        # Create tables if missing
-        await conn.run_sync(Base.metadata.create_all)
-        
         # TRUNCATE all tables to ensure a clean slate
         # We restart identity to reset ID counters to 1
-        await conn.execute(text("TRUNCATE TABLE canonical_data, etl_checkpoints RESTART IDENTITY CASCADE"))
+        await conn.execute(text("TRUNCATE TABLE canonical_data, etl_checkpoints, raw_data, price_history, price_rollups, price_rollup_dirty, record_hashes, etl_runs, raw_batches, etl_tasks RESTART IDENTITY CASCADE"))
+
+    # Tests write to the DB directly, not through the orchestrator: drop cached API responses
+    data_generation.bump()
+    record_hashes.forget()
+    provider_controllers.forget()
+    await quote_store.stop()
+    quote_store.clear()
     
     yield
     
@@ -0,0 +1,136 @@
+import asyncio
+import time
+import httpx
+import pytest
+from email.utils import formatdate
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.ingestion.adaptive import (
+    ProviderBusy, ProviderController, ProviderUnavailable, provider_controllers, retry_after_seconds,
+)
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.ingestion.sources.coingecko import CoinGeckoSource
+from app.services.models import ETLCheckpoint, ETLRun
+from app.tests.test_coingecko import mock_client
+
+pytestmark = pytest.mark.asyncio
+
+URL = "https://provider.test/items"
+
+def scripted_client(responses: list) -> tuple[httpx.AsyncClient, list]:
+    """Answers with `responses` in order (the last one repeats). Returns the client and the request log."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        return responses[min(len(calls), len(responses)) - 1]
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), calls
+
+async def fetch(controller: ProviderController, client: httpx.AsyncClient, url: str = URL):
+    async with controller.request(client, url) as response:
+        return response.status_code, await response.json()
+
+async def test_aimd_cuts_once_per_burst_and_climbs_back():
+    controller = ProviderController("p", max_rate=8.0, max_concurrency=4)
+
+    controller.on_failure()
+    controller.on_failure()  # Same burst: no second cut
+    assert (controller.rate, controller.limit) == (4.0, 2)
+
+    for _ in range(5):
+        controller.on_success()
+    assert (controller.rate, controller.limit) == (8.0, 4)
+
+async def test_retry_after_is_honoured(monkeypatch):
+    client, calls = scripted_client([
+        httpx.Response(503),
+        httpx.Response(429, headers={"Retry-After": "0.2"}),
+        httpx.Response(200, json=[1]),
+    ])
+    controller = ProviderController("p", max_rate=None, max_concurrency=2)
+
+    assert await fetch(controller, client) == (200, [1])
+    assert len(calls) == 3
+    assert calls[2] - calls[1] >= 0.2
+    assert controller.failures == 0
+
+    # Out of attempts: the last answer is raised (another URL: the 200 above is cached)
+    client, calls = scripted_client([httpx.Response(500)])
+    with pytest.raises(ProviderBusy):
+        await fetch(controller, client, URL + "/other")
+    assert len(calls) == settings.PROVIDER_MAX_ATTEMPTS
+
+    # Too far away: don't wait, don't call
+    controller.on_failure(retry_after=settings.PROVIDER_MAX_RETRY_AFTER + 60)
+    with pytest.raises(ProviderUnavailable):
+        await fetch(controller, client)
+    assert len(calls) == settings.PROVIDER_MAX_ATTEMPTS
+
+async def test_circuit_opens_then_probes(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(settings, "PROVIDER_BREAKER_COOLDOWN", 0.1)
+    controller = ProviderController("p", max_rate=None, max_concurrency=1)
+    client, calls = scripted_client([httpx.Response(502), httpx.Response(502), httpx.Response(200, json=[])])
+
+    # The second failure opens it: the third attempt isn't sent
+    with pytest.raises(ProviderUnavailable):
+        await fetch(controller, client)
+    assert controller.breaker == "open"
+    with pytest.raises(ProviderUnavailable):
+        await fetch(controller, client)
+    assert len(calls) == 2
+
+    # After the cooldown a single probe goes out; its success closes the circuit
+    await asyncio.sleep(0.1)
+    assert await fetch(controller, client) == (200, [])
+    assert (controller.breaker, len(calls)) == ("closed", 3)
+
+async def test_open_circuit_survives_a_restart(monkeypatch):
+    monkeypatch.setattr(settings, "PROVIDER_BREAKER_FAILURES", 2)
+    client, calls = scripted_client([httpx.Response(429)])
+
+    def source():
+        return CoinGeckoSource("coingecko_test", client=client, pages_per_run=1, concurrency=1, tier="pro")
+
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source()).run()
+    assert len(calls) == 2
+
+    async with AsyncSessionLocal() as session:
+        checkpoint = await session.get(ETLCheckpoint, "coingecko_test")
+    assert checkpoint.metadata_blob["provider"]["breaker"] == "open"
+
+    # New process: the controller starts from the saved state and leaves the provider alone
+    provider_controllers.forget()
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source()).run()
+    assert len(calls) == 2
+    assert provider_controllers.get("coingecko_test", 500 / 60.0, 1, 10).breaker == "open"
+
+async def test_failed_batch_keeps_the_provider_state(monkeypatch):
+    async def failing_save(self, hashes):
+        # Fails inside the batch's transaction, after its first statements
+        await self.session.execute(text("SELECT 1 / 0"))
+
+    monkeypatch.setattr(IngestionOrchestrator, "save_hashes", failing_save)
+    source = CoinGeckoSource("coingecko_test", client=mock_client(last_page=3), pages_per_run=2, concurrency=1, tier="pro")
+
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(DBAPIError, match="division by zero"):
+            await IngestionOrchestrator(session, source).run()
+
+    async with AsyncSessionLocal() as session:
+        checkpoint = await session.get(ETLCheckpoint, "coingecko_test")
+        run = (await session.execute(select(ETLRun))).scalar_one()
+    assert (checkpoint.status, checkpoint.last_processed_offset) == ("FAILED", 0)
+    assert checkpoint.metadata_blob["provider"]["breaker"] == "closed"
+    assert run.status == "FAILED" and "division by zero" in run.error
+
+async def test_retry_after_http_date():
+    now = time.time()
+    assert retry_after_seconds("3") == 3.0
+    assert 29 <= retry_after_seconds(formatdate(now + 30, usegmt=True), now=now) <= 30
+    assert retry_after_seconds("soon") is None
@@ -1,10 +1,16 @@
+import asyncio
+import base64
+import json
 import pytest
 from httpx import AsyncClient, ASGITransport
 from app.main import app
-from app.services.models import CanonicalData, ETLCheckpoint
+from app.services.models import CanonicalData, ETLCheckpoint, ETLRun
+from app.core.cache import response_cache
+from app.core.config import settings
 from app.core.db import AsyncSessionLocal
-from sqlalchemy import text
-from datetime import datetime
+from app.core.events import data_generation, notify_commit, CommitListener
+from sqlalchemy import select, text
+from datetime import datetime, timedelta, timezone
 
 # Mark all tests as asyncio
 pytestmark = pytest.mark.asyncio
@@ -27,13 +33,12 @@ async def seed_and_clean_data():
 
         # 3. Insert Mock Crypto Data
         crypto_entry = CanonicalData(
-            external_id="test-btc",
-            source="test_source_1",
             symbol="BTC",
             name="Bitcoin Test",
             price_usd=50000.00,
             market_cap=1000000000,
-            last_updated=datetime.now()
+            last_updated=datetime.now(),
+            provider_data={"test_source_1": {"price": 50000.00}}
         )
         session.add(crypto_entry)
         await session.commit()
@@ -56,8 +61,11 @@ async def test_read_market_data():
     assert json_data["data"][0]["symbol"] == "BTC"
 
 async def test_read_stats():
-    # 1. Prepare DB (Clean + Seed)
+    # 1. Prepare DB (Clean + Seed); replay progress is not a pipeline
     await seed_and_clean_data()
+    async with AsyncSessionLocal() as session:
+        session.add(ETLCheckpoint(source_id="replay:test_source_1", last_processed_offset=7))
+        await session.commit()
 
     # 2. Request
     async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
@@ -68,4 +76,230 @@ async def test_read_stats():
     stats = response.json()
     
     assert stats["total_records_processed"] == 1
-    assert stats["pipelines"][0]["source"] == "test_source_1"
\ No newline at end of file
+    assert [p["source"] for p in stats["pipelines"]] == ["test_source_1"]
+async def seed_many(count: int):
+    """Inserts `count` coins; even ones are seen by coingecko, odd ones by coinpaprika."""
+    async with AsyncSessionLocal() as session:
+        for i in range(count):
+            source_id = "coingecko_market" if i % 2 == 0 else "coinpaprika_free"
+            session.add(CanonicalData(
+                symbol=f"C{i}",
+                name=f"Coin {i}",
+                price_usd=float(i),
+                # Duplicate market caps exercise the id tie-breaker
+                market_cap=1000 * (i // 2),
+                last_updated=datetime.now(),
+                provider_data={source_id: {"price": float(i)}}
+            ))
+        await session.commit()
+
+async def _page_through(ac: AsyncClient, **params) -> list[str]:
+    symbols, cursor = [], None
+    while True:
+        query = dict(params, limit=3)
+        if cursor:
+            query["cursor"] = cursor
+        body = (await ac.get("/api/v1/data", params=query)).json()
+        symbols += [row["symbol"] for row in body["data"]]
+        cursor = body["metadata"]["next_cursor"]
+        if not cursor:
+            return symbols
+
+async def test_cursor_pagination_visits_every_row_once():
+    await seed_many(10)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        by_cap = await _page_through(ac, sort="market_cap", order="desc")
+        by_price = await _page_through(ac, sort="price_usd", order="asc")
+
+    assert by_price == [f"C{i}" for i in range(10)]
+    assert sorted(by_cap) == sorted(by_price)
+    assert by_cap[:2] == ["C9", "C8"]
+
+async def test_source_filter_uses_provider_data():
+    await seed_many(6)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        by_name = await _page_through(ac, source="coingecko", sort="price_usd", order="asc")
+        by_id = await _page_through(ac, source="coinpaprika_free", sort="price_usd", order="asc")
+
+    assert by_name == ["C0", "C2", "C4"]
+    assert by_id == ["C1", "C3", "C5"]
+
+async def test_min_sources_and_consensus_sort():
+    await seed_many(4)
+    async with AsyncSessionLocal() as session:
+        for row in (await session.execute(select(CanonicalData))).scalars():
+            row.source_count = 2 if row.symbol in ("C1", "C2") else 1
+            row.consensus_price = 10.0 - int(row.symbol[1:])
+        await session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        multi = await _page_through(ac, min_sources=2, sort="price_usd", order="asc")
+        by_consensus = await _page_through(ac, sort="consensus_price", order="asc")
+
+    assert multi == ["C1", "C2"]
+    assert by_consensus == ["C3", "C2", "C1", "C0"]
+
+async def test_fields_projection():
+    await seed_many(5)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        body = (await ac.get("/api/v1/data", params={"fields": "symbol,price_usd", "limit": 2})).json()
+        rest = await _page_through(ac, fields="symbol", cursor=body["metadata"]["next_cursor"])
+        unknown = await ac.get("/api/v1/data", params={"fields": "symbol,password"})
+
+    assert body["metadata"]["fields"] == ["symbol", "price_usd"]
+    assert [set(row) for row in body["data"]] == [{"symbol", "price_usd"}] * 2
+    # The cursor doesn't depend on the selected columns
+    assert [row["symbol"] for row in body["data"]] + rest == ["C4", "C3", "C2", "C1", "C0"]
+    assert unknown.status_code == 400
+
+async def test_invalid_cursor_is_rejected():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/api/v1/data", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("sort,value,row_id", [
+    ("market_cap", 100, "x"),
+    ("market_cap", 100, None),
+    ("price_usd", "not-a-price", 1),
+    ("market_cap", None, 1),
+    ("last_updated", "yesterday", 1),
+])
+async def test_cursor_with_uncoercible_values_is_rejected(sort, value, row_id):
+    raw = json.dumps([sort, "desc", value, row_id]).encode()
+    cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/api/v1/data", params={"cursor": cursor, "sort": sort})
+
+    assert response.status_code == 400
+
+async def test_stats_counts_come_from_counters():
+    await seed_many(5)
+    async with AsyncSessionLocal() as session:
+        await session.execute(text("DELETE FROM canonical_data WHERE symbol = 'C0'"))
+        await session.commit()
+    data_generation.bump()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        stats = (await ac.get("/api/v1/stats")).json()
+    assert stats["total_records_processed"] == 4
+
+async def test_run_stats_percentiles():
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        for i in range(1, 11):
+            session.add(ETLRun(
+                source_id="coingecko_market", status="SUCCESS", records=100 * i,
+                started_at=now - timedelta(minutes=i), finished_at=now, duration_seconds=float(i),
+            ))
+        # Outside the window, still running, and an empty run
+        session.add(ETLRun(source_id="coingecko_market", status="SUCCESS", records=1,
+                           started_at=now - timedelta(days=2), finished_at=now, duration_seconds=500.0))
+        session.add(ETLRun(source_id="coingecko_market", status="RUNNING", started_at=now))
+        session.add(ETLRun(source_id="coinpaprika_free", status="NO_DATA", records=0,
+                           started_at=now, finished_at=now, duration_seconds=0.5))
+        await session.commit()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        body = (await ac.get("/api/v1/stats/runs", params={"hours": 24})).json()
+
+    gecko, paprika = body["sources"]
+    assert (gecko["source"], gecko["runs"], gecko["records"]) == ("coingecko_market", 10, 5500)
+    assert gecko["duration_seconds"]["p50"] == pytest.approx(5.5)
+    assert gecko["duration_seconds"]["p95"] == pytest.approx(9.55)
+    # Every run loaded 100 records/sec
+    assert gecko["records_per_sec"] == {"p50": pytest.approx(100.0), "p95": pytest.approx(100.0)}
+    assert paprika["runs"] == 1 and paprika["records_per_sec"]["p50"] is None
+
+async def test_responses_are_cached_until_next_commit():
+    await seed_and_clean_data()
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first = await ac.get("/api/v1/stats")
+        etag = first.headers["etag"]
+
+        # Unchanged data: the client's copy is still valid
+        not_modified = await ac.get("/api/v1/stats", headers={"If-None-Match": etag})
+        assert not_modified.status_code == 304
+
+        # Direct DB writes are invisible until a commit bumps the generation
+        await seed_many(3)
+        assert (await ac.get("/api/v1/stats")).json()["total_records_processed"] == 1
+
+        data_generation.bump("test_source_1")
+        refreshed = await ac.get("/api/v1/stats", headers={"If-None-Match": etag})
+
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+    assert refreshed.json()["total_records_processed"] == 4
+
+async def test_etag_names_the_commit_not_the_bytes():
+    await seed_many(3)
+    data_generation.bump("test_source_1", 1_000)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first = await ac.get("/api/v1/data", params={"limit": 2})
+        # Another replica that saw the same commit builds the same page and ETag
+        response_cache.clear()
+        rebuilt = await ac.get("/api/v1/data", params={"limit": 2})
+        other_query = await ac.get("/api/v1/data", params={"limit": 3})
+
+    assert "latency_ms" not in first.json()["metadata"]
+    assert rebuilt.content == first.content
+    assert rebuilt.headers["etag"] == first.headers["etag"]
+    assert other_query.headers["etag"] != first.headers["etag"]
+
+async def test_lagging_replica_is_not_cached(monkeypatch):
+    # The "replica" is the primary itself; a txid that hasn't committed yet stands in for replay lag
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_URL", settings.DATABASE_URL)
+    await seed_and_clean_data()
+    async with AsyncSessionLocal() as session:
+        future = (await session.execute(text("SELECT txid_current() + 1000"))).scalar_one()
+    data_generation.bump("test_source_1", future)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        lagging = await ac.get("/api/v1/stats")
+        await seed_many(3)
+        assert (await ac.get("/api/v1/stats")).json()["total_records_processed"] == 4
+
+        async with AsyncSessionLocal() as session:
+            commit = await notify_commit(session, "test_source_1")
+            await session.commit()
+        data_generation.bump("test_source_1", commit)
+        replayed = await ac.get("/api/v1/stats")
+        async with AsyncSessionLocal() as session:
+            session.add(CanonicalData(symbol="LATE", name="Late", price_usd=1.0, provider_data={}))
+            await session.commit()
+        cached = await ac.get("/api/v1/stats")
+
+    assert "etag" not in lagging.headers
+    assert replayed.headers["etag"] == cached.headers["etag"]
+    assert cached.json()["total_records_processed"] == 4
+
+async def test_commit_listener_picks_up_notify():
+    listener = CommitListener(reconnect_delay=0.1)
+    listener.start()
+    try:
+        # Wait for the listener to connect (it bumps once on connect)
+        before = data_generation.value
+        for _ in range(50):
+            if data_generation.value > before:
+                break
+            await asyncio.sleep(0.05)
+
+        before = data_generation.value
+        async with AsyncSessionLocal() as session:
+            commit = await notify_commit(session, "other_replica")
+            await session.commit()
+        for _ in range(50):
+            if data_generation.value > before:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await listener.stop()
+
+    assert data_generation.value > before
+    assert data_generation.commit == commit
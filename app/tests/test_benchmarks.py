@@ -0,0 +1,47 @@
+import asyncio
+import pytest
+from app.benchmarks.bench_suite import ENCODING_VARIANTS, bench_encoding, bench_ingestion
+from app.benchmarks.bench_startup import bench_startup
+from app.benchmarks.providers import MockProvider
+
+pytestmark = pytest.mark.asyncio
+
+async def test_mock_provider_pages_and_rate_limits():
+    provider = MockProvider(coins=5, rate_limit_every=3)
+    async with provider.client() as client:
+        url = "https://api.example.com/api/v3/coins/markets"
+        first = await client.get(url, params={"page": 1, "per_page": 4})
+        second = await client.get(url, params={"page": 2, "per_page": 4})
+        limited = await client.get(url, params={"page": 3, "per_page": 4})
+        tickers = await client.get("https://api.example.com/v1/tickers")
+
+    assert [c["symbol"] for c in first.json()] == ["bench0", "bench1", "bench2", "bench3"]
+    assert len(second.json()) == 1
+    assert limited.status_code == 429
+    assert [t["symbol"] for t in tickers.json()] == [f"BENCH{i}" for i in range(5)]
+    assert provider.rate_limited == 1
+
+@pytest.mark.parametrize("source", ["coingecko", "coinpaprika"])
+async def test_bench_ingestion_reports_runs(source):
+    result = await bench_ingestion(source, coins=30, runs=2)
+
+    assert [run["records"] for run in result["runs"]] == [30, 30]
+    assert result["failed_runs"] == 0
+    assert result["queries_per_run"] > 0
+    assert result["peak_memory_mb"] > 0
+
+async def test_bench_encoding_compares_page_builds():
+    await bench_ingestion("coingecko", coins=30, runs=1)
+    results = await bench_encoding(limit=20, repeats=2)
+
+    assert [r["variant"] for r in results] == list(ENCODING_VARIANTS)
+    sizes = {r["variant"]: r["bytes"] for r in results}
+    # The projection drops most of each row
+    assert sizes["projected_orjson"] < sizes["tuples_orjson"]
+
+async def test_bench_startup_cli_stays_lean():
+    results = await asyncio.to_thread(bench_startup, 1, ["cli_help", "cli_status"])
+
+    for result in results:
+        assert result["error"] is None
+        assert result["unexpected_imports"] == []
@@ -0,0 +1,73 @@
+import asyncio
+import httpx
+import pytest
+from sqlalchemy import select
+from app.core.db import AsyncSessionLocal
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.ingestion.sources.coingecko import CoinGeckoSource
+from app.services.models import CanonicalData, ETLCheckpoint
+
+pytestmark = pytest.mark.asyncio
+
+def _coin(page: int, i: int) -> dict:
+    return {
+        "id": f"coin-{page}-{i}",
+        "symbol": f"c{page}x{i}",
+        "name": f"Coin {page}-{i}",
+        "current_price": float(page * 100 + i),
+        "market_cap": 1000 * page + i,
+        "last_updated": "2024-01-01T00:00:00.000Z",
+    }
+
+def mock_client(last_page: int, rate_limited=(), delays=None) -> httpx.AsyncClient:
+    """Serves pages 1..last_page of 2 coins each. Later pages return []."""
+    delays = delays or {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        await asyncio.sleep(delays.get(page, 0))
+        if page in rate_limited:
+            return httpx.Response(429)
+        coins = [_coin(page, i) for i in range(2)] if page <= last_page else []
+        return httpx.Response(200, json=coins)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def _source(client, pages: int) -> CoinGeckoSource:
+    # "pro" tier: high rate so the token bucket doesn't slow the tests down
+    return CoinGeckoSource("coingecko_test", client=client, pages_per_run=pages, concurrency=4, tier="pro")
+
+async def _collect(source: CoinGeckoSource, offset: int):
+    return [(len(batch), new_offset) async for batch, new_offset in source.stream_batches(offset)]
+
+async def test_stream_yields_pages_as_they_complete():
+    # Page 1 is slowest, so pages 2 and 3 arrive first but can't move the checkpoint
+    client = mock_client(last_page=10, delays={1: 0.05})
+    batches = await _collect(_source(client, pages=3), offset=0)
+
+    assert batches == [(2, 0), (2, 0), (2, 3)]
+
+async def test_stream_rate_limited_page_holds_watermark():
+    client = mock_client(last_page=10, rate_limited={2})
+    batches = await _collect(_source(client, pages=3), offset=0)
+
+    # Pages 1 and 3 are loaded, but the next run must restart at page 2
+    assert sorted(batches) == [(2, 1), (2, 1)]
+
+async def test_stream_end_of_list_starts_new_cycle():
+    client = mock_client(last_page=2)
+    batches = await _collect(_source(client, pages=3), offset=1)
+
+    assert batches[-1][1] == 0
+
+async def test_orchestrator_loads_streamed_pages():
+    client = mock_client(last_page=10)
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, _source(client, pages=4)).run()
+
+    async with AsyncSessionLocal() as session:
+        symbols = (await session.execute(select(CanonicalData.symbol))).scalars().all()
+        checkpoint = await session.get(ETLCheckpoint, "coingecko_test")
+
+    assert len(symbols) == 8
+    assert checkpoint.last_processed_offset == 4
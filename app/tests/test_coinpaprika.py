@@ -0,0 +1,81 @@
+import json
+import httpx
+import pytest
+from sqlalchemy import select, func
+from app.core.db import AsyncSessionLocal
+from app.ingestion.jsonstream import iter_json_array
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+from app.services.models import CanonicalData, ETLCheckpoint
+
+pytestmark = pytest.mark.asyncio
+
+def _ticker(i: int) -> dict:
+    return {
+        "id": f"c{i}-coin-{i}",
+        "name": f"Coin {i}",
+        "symbol": f"c{i}",
+        "last_updated": "2024-01-01T00:00:00Z",
+        "quotes": {"USD": {"price": 1.5 * i, "market_cap": 1000 * i}},
+    }
+
+TICKERS = [_ticker(i) for i in range(1, 8)]
+
+async def _byte_chunks(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+def mock_client(status: int = 200, chunk_bytes: int = 37) -> httpx.AsyncClient:
+    body = json.dumps(TICKERS).encode()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if status != 200:
+            return httpx.Response(status)
+        return httpx.Response(200, content=_byte_chunks(body, chunk_bytes))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+async def test_iter_json_array_handles_split_elements():
+    async def chunks():
+        text = json.dumps([{"a": "x]y"}, 123, [1, 2], "s", None])
+        for i in range(0, len(text), 3):
+            yield text[i:i + 3]
+
+    items = [item async for item in iter_json_array(chunks())]
+    assert items == [{"a": "x]y"}, 123, [1, 2], "s", None]
+
+async def test_iter_json_array_rejects_truncated_body():
+    async def chunks():
+        yield '[{"a": 1}, {"b"'
+
+    with pytest.raises(ValueError):
+        [item async for item in iter_json_array(chunks())]
+
+async def test_stream_chunks_and_resets_after_snapshot():
+    source = CoinPaprikaSource("paprika_test", client=mock_client(), chunk_size=3)
+    batches = [(len(b), offset) async for b, offset in source.stream_batches(0)]
+
+    assert batches == [(3, 3), (3, 6), (1, 0)]
+
+async def test_stream_resumes_mid_snapshot():
+    source = CoinPaprikaSource("paprika_test", client=mock_client(), chunk_size=3)
+    batches = [(b[0]["symbol"], offset) async for b, offset in source.stream_batches(3)]
+
+    assert batches == [("c4", 6), ("c7", 0)]
+
+async def test_payment_required_yields_nothing():
+    source = CoinPaprikaSource("paprika_test", client=mock_client(status=402))
+    assert [b async for b in source.stream_batches(0)] == []
+
+async def test_orchestrator_ingests_full_universe():
+    source = CoinPaprikaSource("paprika_test", client=mock_client(), chunk_size=3)
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source).run()
+
+    async with AsyncSessionLocal() as session:
+        count = (await session.execute(select(func.count(CanonicalData.id)))).scalar()
+        checkpoint = await session.get(ETLCheckpoint, "paprika_test")
+
+    assert count == len(TICKERS)
+    # Whole snapshot ingested: next run starts a new cycle
+    assert checkpoint.last_processed_offset == 0
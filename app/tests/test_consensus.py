@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.core.config import settings
+from app.ingestion.consensus import consensus
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def quote(price, age_seconds: float = 0) -> dict:
+    return {"price": price, "updated_at": (NOW - timedelta(seconds=age_seconds)).isoformat()}
+
+def test_median_and_spread():
+    result = consensus({"a": quote(100.0), "b": quote(102.0)}, NOW, method="median")
+    assert result.price == 101.0
+    assert result.sources == 2
+    assert result.spread == pytest.approx(2.0 / 101.0)
+
+def test_outlier_is_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "CONSENSUS_MAX_DEVIATION", 0.05)
+    result = consensus({"a": quote(100.0), "b": quote(101.0), "c": quote(150.0)}, NOW, method="median")
+    assert result.sources == 2
+    assert result.price == 100.5
+
+def test_weighted_mean_favours_fresh_quotes(monkeypatch):
+    monkeypatch.setattr(settings, "CONSENSUS_HALF_LIFE", 60)
+    # Weights 1 and 0.5
+    result = consensus({"a": quote(100.0), "b": quote(103.0, age_seconds=60)}, NOW, method="weighted_mean")
+    assert result.price == pytest.approx(101.0)
+
+def test_stale_quotes_are_ignored_unless_nothing_is_fresher(monkeypatch):
+    monkeypatch.setattr(settings, "CONSENSUS_MAX_AGE", 600)
+    result = consensus({"a": quote(100.0), "b": quote(90.0, age_seconds=3600)}, NOW, method="median")
+    assert (result.price, result.sources) == (100.0, 1)
+
+    result = consensus({"a": quote(95.0, age_seconds=7200), "b": quote(90.0, age_seconds=3600)}, NOW)
+    assert (result.price, result.sources) == (90.0, 1)
+
+def test_unusable_quotes():
+    # Legacy entries without timestamps still count; non-numeric prices don't
+    assert consensus({"a": {"price": 5.0}, "b": {"price": "n/a"}}, NOW).sources == 1
+    assert consensus({}, NOW) is None
+    with pytest.raises(ValueError):
+        consensus({"a": quote(1.0)}, NOW, method="mode")
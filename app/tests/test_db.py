@@ -0,0 +1,31 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from app.core.config import Settings
+from app.core.db import AsyncSessionLocal, ReadSessionLocal, engine, read_engine, get_db
+
+pytestmark = pytest.mark.asyncio
+
+async def test_read_url_defaults_to_primary():
+    base = dict(POSTGRES_USER="u", POSTGRES_PASSWORD="p", POSTGRES_SERVER="db", POSTGRES_DB="d")
+    assert Settings(**base).DATABASE_READ_URL == "postgresql+asyncpg://u:p@db/d"
+    replica = "postgresql+asyncpg://u:p@replica/d"
+    assert Settings(**base, DATABASE_REPLICA_URL=replica).DATABASE_READ_URL == replica
+
+async def test_reads_and_writes_use_separate_pools():
+    assert read_engine.sync_engine.pool is not engine.sync_engine.pool
+
+    sessions = get_db()
+    session = await sessions.__anext__()
+    try:
+        assert session.bind is read_engine
+        assert (await session.execute(text("SELECT 1"))).scalar() == 1
+    finally:
+        await sessions.aclose()
+
+    async with AsyncSessionLocal() as write, ReadSessionLocal() as read:
+        await write.execute(text("SELECT 1"))
+        await read.execute(text("SELECT 1"))
+        assert REGISTRY.get_sample_value("db_pool_checked_out", {"role": "write"}) >= 1
+        assert REGISTRY.get_sample_value("db_pool_checked_out", {"role": "read"}) >= 1
+        assert 0 < REGISTRY.get_sample_value("db_pool_saturation", {"role": "read"}) <= 1
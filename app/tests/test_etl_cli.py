@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import pytest
+from app import etl
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.ingestion.sources import coingecko
+from app.services.models import ETLCheckpoint
+from app.tests.test_coingecko import mock_client
+
+pytestmark = pytest.mark.asyncio
+
+def cli(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "app.etl", *args], capture_output=True, text=True)
+
+async def test_run_then_status(monkeypatch, capsys):
+    monkeypatch.setattr(settings, "COINGECKO_API_TIER", "pro")
+    monkeypatch.setattr(settings, "COINGECKO_PAGES_PER_RUN", 2)
+    monkeypatch.setattr(coingecko, "get_http_client", lambda: mock_client(last_page=10))
+
+    assert await etl._run(["coingecko"], run_all=False) == 0
+    assert "coingecko: done" in capsys.readouterr().out
+    # Replay progress shares etl_checkpoints but isn't listed as a pipeline
+    async with AsyncSessionLocal() as session:
+        session.add(ETLCheckpoint(source_id="replay:coingecko_market", last_processed_offset=3))
+        await session.commit()
+
+    assert await etl._status(as_json=False) == 0
+    [line] = capsys.readouterr().out.splitlines()
+    assert line.startswith("coingecko_market")
+    assert "offset=2" in line and "last run: SUCCESS" in line
+
+async def test_usage_errors():
+    assert await etl._run(["nope"], run_all=False) == 2
+    assert cli("run", "--bogus").returncode == 2
+    assert cli().returncode == 2
+
+async def test_replay_and_help_go_to_their_parsers():
+    replay_help = cli("replay", "--help")
+    assert replay_help.returncode == 0
+    assert "python -m app.etl replay" in replay_help.stdout and "--chunk-size" in replay_help.stdout
+    assert "run,replay,status" in cli("--help").stdout
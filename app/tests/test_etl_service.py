@@ -0,0 +1,35 @@
+import asyncio
+import pytest
+from app.core.db import advisory_lock
+from app.services import etl_service
+
+pytestmark = pytest.mark.asyncio
+
+async def test_advisory_lock_is_exclusive():
+    async with advisory_lock("lock_test") as first:
+        async with advisory_lock("lock_test") as second:
+            assert first is True
+            assert second is False
+    # Released on exit
+    async with advisory_lock("lock_test") as again:
+        assert again is True
+
+async def test_run_source_skips_when_locked_elsewhere():
+    # Simulates another worker replica holding the coingecko pipeline
+    async with advisory_lock("coingecko_market"):
+        assert await etl_service.run_source("coingecko") is False
+
+async def test_scheduler_stops_on_event():
+    calls = []
+
+    async def job():
+        calls.append("coingecko")
+        return True
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(etl_service._schedule("coingecko", job, lambda: 3600, stop))
+    await asyncio.sleep(0.05)
+    stop.set()
+    await asyncio.wait_for(task, timeout=1)
+
+    assert calls == ["coingecko"]
@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.api.routes import export
+from app.core.db import AsyncSessionLocal
+from app.services.models import CanonicalData, RawData
+
+pytestmark = pytest.mark.asyncio
+
+async def seed(count: int):
+    async with AsyncSessionLocal() as session:
+        for i in range(count):
+            session.add(CanonicalData(
+                symbol=f"C{i}", name=f"Coin {i}", price_usd=float(i), market_cap=i,
+                provider_data={"coingecko_market": {"price": float(i)}}
+            ))
+            session.add(RawData(source_id="coingecko_market", payload={"id": i}))
+        await session.commit()
+
+async def test_export_ndjson_streams_every_row(monkeypatch):
+    # Small batches so the export spans several cursor fetches
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 3)
+    await seed(10)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/api/v1/export", params={"format": "ndjson"}, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["symbol"] for r in rows] == [f"C{i}" for i in range(10)]
+    assert rows[0]["provider_data"] == {"coingecko_market": {"price": 0.0}}
+    # Datetimes are ISO 8601, as in the JSON API
+    assert "T" in rows[0]["last_updated"]
+    assert datetime.fromisoformat(rows[0]["last_updated"]).tzinfo is not None
+
+@pytest.mark.parametrize("accept,gzipped", [
+    ("gzip", True),
+    ("deflate, gzip;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0, *", False),
+    ("*;q=0", False),
+    ("identity", False),
+])
+async def test_export_gzip_honours_q_values(accept, gzipped):
+    await seed(1)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/api/v1/export", params={"format": "ndjson"}, headers={"Accept-Encoding": accept})
+
+    assert ("content-encoding" in response.headers) == gzipped
+    assert json.loads(response.text.splitlines()[0])["symbol"] == "C0"
+
+async def test_export_raw_csv_window():
+    await seed(4)
+    now = datetime.now(timezone.utc)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        inside = await ac.get("/api/v1/export", params={
+            "format": "csv", "table": "raw", "start": (now - timedelta(hours=1)).isoformat()
+        })
+        outside = await ac.get("/api/v1/export", params={
+            "format": "csv", "table": "raw", "end": (now - timedelta(hours=1)).isoformat()
+        })
+
+    rows = list(csv.DictReader(io.StringIO(inside.text)))
+    assert [json.loads(r["payload"])["id"] for r in rows] == [0, 1, 2, 3]
+    assert list(csv.DictReader(io.StringIO(outside.text))) == []
+
+async def test_export_canonical_filters():
+    await seed(3)
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as session:
+        session.add(CanonicalData(
+            symbol="OLD", name="Old", price_usd=1.0, last_updated=now - timedelta(days=2),
+            provider_data={"coinpaprika_free": {"price": 1.0}},
+        ))
+        await session.commit()
+
+    async def symbols(**params):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            response = await ac.get("/api/v1/export", params=params)
+        return [json.loads(line)["symbol"] for line in response.text.splitlines()]
+
+    assert await symbols(source="coingecko_market") == ["C0", "C1", "C2"]
+    assert await symbols(source="coinpaprika_free") == ["OLD"]
+    # Registry names resolve to their source_id, as on /data
+    assert await symbols(source="coinpaprika") == ["OLD"]
+    assert await symbols(start=(now - timedelta(hours=1)).isoformat()) == ["C0", "C1", "C2"]
+    assert await symbols(end=(now - timedelta(days=1)).isoformat()) == ["OLD"]
+
+async def test_export_parquet():
+    pq = pytest.importorskip("pyarrow.parquet")
+    await seed(5)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        response = await ac.get("/api/v1/export", params={"format": "parquet"})
+
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("symbol").to_pylist() == [f"C{i}" for i in range(5)]
@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
+from app.main import app
+from app.core.db import AsyncSessionLocal, engine
+from app.ingestion.orchestrator import BaseSource, IngestionOrchestrator
+from app.ingestion.normalize import build_batch, column
+from app.services.history import ensure_partition, run_rollups, choose_resolution
+from app.services.models import CanonicalData, PriceHistory, PriceRollup
+
+pytestmark = pytest.mark.asyncio
+
+T0 = datetime(2024, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+class OneCoinSource(BaseSource):
+    def __init__(self, source_id: str, price: float):
+        super().__init__(source_id)
+        self.price = price
+
+    async def fetch_data(self, last_offset: int):
+        return [{"symbol": "BTC", "price": self.price}], last_offset + 1
+
+    def normalize(self, raw_data):
+        return build_batch(
+            self.source_id,
+            external_id=["bitcoin"] * len(raw_data), symbol=column(raw_data, "symbol"),
+            name=["Bitcoin"] * len(raw_data), price=column(raw_data, "price"),
+            market_cap=[0] * len(raw_data), last_updated=[None] * len(raw_data),
+        )
+
+async def seed_history(symbol_id: int, prices: list[tuple[timedelta, float]]):
+    await ensure_partition(engine, T0)
+    async with AsyncSessionLocal() as session:
+        for offset, price in prices:
+            session.add(PriceHistory(symbol_id=symbol_id, source="test", ts=T0 + offset, price=price))
+        await session.commit()
+
+async def test_ingestion_appends_history():
+    for source_id, price in [("source_a", 100.0), ("source_b", 101.0)]:
+        async with AsyncSessionLocal() as session:
+            await IngestionOrchestrator(session, OneCoinSource(source_id, price)).run()
+
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(PriceHistory.source, PriceHistory.price))).all()
+    assert sorted(rows) == [("source_a", 100.0), ("source_b", 101.0)]
+
+async def test_rollups_build_ohlc_buckets():
+    await seed_history(1, [
+        (timedelta(seconds=5), 10.0),
+        (timedelta(seconds=30), 15.0),
+        (timedelta(seconds=50), 8.0),
+        (timedelta(minutes=1, seconds=10), 12.0),
+        (timedelta(hours=1, seconds=1), 20.0),
+    ])
+    await run_rollups(engine)
+
+    async with AsyncSessionLocal() as session:
+        buckets = {
+            (r.resolution, r.bucket): (r.open, r.high, r.low, r.close, r.samples)
+            for r in (await session.execute(select(PriceRollup))).scalars()
+        }
+
+    assert buckets[("1m", T0)] == (10.0, 15.0, 8.0, 8.0, 3)
+    assert buckets[("1h", T0)] == (10.0, 15.0, 8.0, 12.0, 4)
+    assert buckets[("1d", T0.replace(hour=0))] == (10.0, 20.0, 8.0, 20.0, 5)
+
+    # Re-running rebuilds only the buckets that got new rows, and doesn't double count
+    await seed_history(1, [(timedelta(hours=1, seconds=30), 25.0)])
+    await run_rollups(engine)
+    async with AsyncSessionLocal() as session:
+        day = (await session.execute(
+            select(PriceRollup).where(PriceRollup.resolution == "1d")
+        )).scalar_one()
+    assert (day.high, day.close, day.samples) == (25.0, 25.0, 6)
+
+async def test_late_rows_are_rolled_up():
+    await seed_history(1, [(timedelta(seconds=5), 10.0), (timedelta(hours=2), 30.0)])
+    assert await run_rollups(engine) == {"1m": 2, "1h": 2, "1d": 1}
+    # Nothing new: nothing to rebuild
+    assert await run_rollups(engine) == {"1m": 0, "1h": 0, "1d": 0}
+
+    # A replayed sample, older than the latest bucket
+    await seed_history(1, [(timedelta(seconds=40), 5.0)])
+    assert await run_rollups(engine) == {"1m": 1, "1h": 1, "1d": 1}
+
+    async with AsyncSessionLocal() as session:
+        buckets = {
+            (r.resolution, r.bucket): (r.low, r.close, r.samples)
+            for r in (await session.execute(select(PriceRollup))).scalars()
+        }
+    assert buckets[("1m", T0)] == (5.0, 5.0, 2)
+    assert buckets[("1h", T0)] == (5.0, 5.0, 2)
+    assert buckets[("1d", T0.replace(hour=0))] == (5.0, 30.0, 3)
+
+async def test_history_endpoint_picks_resolution():
+    async with AsyncSessionLocal() as session:
+        session.add(CanonicalData(symbol="BTC", name="Bitcoin", price_usd=1.0))
+        await session.commit()
+        symbol_id = (await session.execute(select(CanonicalData.id))).scalar()
+    await seed_history(symbol_id, [(timedelta(minutes=i), float(i)) for i in range(5)])
+    await run_rollups(engine)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        short = (await ac.get("/api/v1/history/btc", params={
+            "start": T0.isoformat(), "end": (T0 + timedelta(hours=1)).isoformat()
+        })).json()
+        long = (await ac.get("/api/v1/history/btc", params={
+            "start": (T0 - timedelta(days=30)).isoformat(), "end": T0.isoformat()
+        })).json()
+        missing = await ac.get("/api/v1/history/nope")
+
+    assert short["resolution"] == "1m"
+    assert [p["close"] for p in short["points"]] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert long["resolution"] == "1h"
+    assert missing.status_code == 404
+
+async def test_history_cache_sees_new_rollups():
+    async with AsyncSessionLocal() as session:
+        session.add(CanonicalData(symbol="BTC", name="Bitcoin", price_usd=1.0))
+        await session.commit()
+        symbol_id = (await session.execute(select(CanonicalData.id))).scalar()
+    await seed_history(symbol_id, [(timedelta(seconds=5), 1.0)])
+    await run_rollups(engine)
+    window = {"start": T0.isoformat(), "end": (T0 + timedelta(hours=1)).isoformat(), "resolution": "1m"}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        first = await ac.get("/api/v1/history/btc", params=window)
+        # The rollup pass invalidates the cached response
+        await seed_history(symbol_id, [(timedelta(minutes=1), 2.0)])
+        await run_rollups(engine)
+        second = await ac.get("/api/v1/history/btc", params=window)
+        # Default end (now) is never cached
+        rolling = await ac.get("/api/v1/history/btc")
+
+    assert "etag" in first.headers
+    assert [p["close"] for p in first.json()["points"]] == [1.0]
+    assert [p["close"] for p in second.json()["points"]] == [1.0, 2.0]
+    assert "etag" not in rolling.headers
+
+async def test_choose_resolution():
+    assert choose_resolution(T0, T0 + timedelta(hours=6), 1500) == "1m"
+    assert choose_resolution(T0, T0 + timedelta(days=30), 1500) == "1h"
+    assert choose_resolution(T0, T0 + timedelta(days=365), 1500) == "1d"
@@ -0,0 +1,203 @@
+import json
+import os
+import httpx
+import pytest
+from sqlalchemy import select, func
+from app.core.config import Settings, settings
+from app.core.db import AsyncSessionLocal
+from app.ingestion.http import ResponseCache
+from app.ingestion.jsonstream import iter_json_array
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.ingestion.sources.coingecko import CoinGeckoSource
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+from app.services.models import CanonicalData, ETLCheckpoint, RawBatch
+from app.tests.test_coingecko import _coin
+
+pytestmark = pytest.mark.asyncio
+
+URL = "https://api.example.com/v1/tickers"
+
+class Provider:
+    """Serves `body` with an ETag and honours If-None-Match."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.requests = 0
+        self.fail_midway = False
+
+    async def _chunks(self):
+        yield self.body[:5]
+        if self.fail_midway:
+            raise httpx.ReadError("connection reset")
+        yield self.body[5:]
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.conditional = "if-none-match" in request.headers
+        etag = f'"{len(self.body)}-{hash(self.body)}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, content=self._chunks(), headers={"ETag": etag})
+
+    def client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(transport=httpx.MockTransport(self.handler))
+
+async def _get(cache: ResponseCache, client: httpx.AsyncClient, ttl=None, confirm=True):
+    async with cache.request(client, URL, ttl=ttl) as response:
+        body = await response.aread()
+        if confirm:
+            response.confirm()
+        return response.status_code, response.not_modified, body
+
+async def test_revalidates_with_etag(tmp_path):
+    provider = Provider(b'[{"a": 1}]')
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, ttl=0)
+    client = provider.client()
+
+    assert await _get(cache, client) == (200, False, b'[{"a": 1}]')
+    # Second request is conditional: 304, previous body still readable
+    assert await _get(cache, client) == (304, True, b'[{"a": 1}]')
+
+    provider.body = b'[{"a": 2}]'
+    assert await _get(cache, client) == (200, False, b'[{"a": 2}]')
+    assert provider.requests == 3
+
+async def test_unconfirmed_body_is_fetched_again(tmp_path):
+    provider = Provider(b'[{"a": 1}]')
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, ttl=0)
+    client = provider.client()
+
+    # Read, but what was read never got committed: no validators go out
+    await _get(cache, client, confirm=False)
+    assert await _get(cache, client) == (200, False, b'[{"a": 1}]')
+    assert not provider.conditional
+    assert (await _get(cache, client))[:2] == (304, True)
+
+async def test_fresh_entries_are_served_from_disk(tmp_path):
+    provider = Provider(b"[1, 2, 3]")
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, ttl=60)
+    client = provider.client()
+
+    await _get(cache, client)
+    async with cache.request(client, URL) as response:
+        assert response.from_cache and not response.not_modified
+        assert await response.json() == [1, 2, 3]
+    assert provider.requests == 1
+
+async def test_body_read_partially_is_still_cached(tmp_path):
+    provider = Provider(b"[1, 2, 3]   ")
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, ttl=0)
+    client = provider.client()
+
+    async with cache.request(client, URL) as response:
+        # The parser returns at "]" without reading the trailing whitespace
+        assert [item async for item in iter_json_array(response.aiter_text())] == [1, 2, 3]
+        # Confirmed before the body is stored: applies once it is
+        response.confirm()
+    assert (await _get(cache, client))[1] is True
+
+async def test_broken_body_is_not_cached(tmp_path):
+    provider = Provider(b"[1, 2, 3]")
+    provider.fail_midway = True
+    cache = ResponseCache(str(tmp_path), max_bytes=2**20, ttl=60)
+
+    with pytest.raises(httpx.ReadError):
+        await _get(cache, provider.client())
+    assert cache.lookup(cache.key(URL)) is None
+
+async def test_default_cache_dir_does_not_depend_on_the_working_directory(monkeypatch):
+    monkeypatch.delenv("HTTP_CACHE_DIR", raising=False)
+    defaults = Settings(POSTGRES_USER="u", POSTGRES_PASSWORD="p", POSTGRES_SERVER="db", POSTGRES_DB="d")
+    assert os.path.isabs(defaults.HTTP_CACHE_DIR)
+
+async def test_cache_is_size_bounded(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=200, ttl=60)
+    client = Provider(b"[" + b"1," * 500 + b"1]").client()
+    for page in range(5):
+        async with cache.request(client, URL, params={"page": page}) as response:
+            await response.aread()
+
+    sizes = [path.stat().st_size for path in tmp_path.glob("*.gz")]
+    assert sum(sizes) <= 200
+    assert cache.lookup(cache.key(URL, {"page": 4})) is not None
+
+async def test_not_modified_snapshot_is_no_new_data(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_CACHE_TTL", 0)
+    tickers = [{"id": "btc-bitcoin", "symbol": "BTC", "name": "Bitcoin", "quotes": {"USD": {"price": 1.0}}}]
+    provider = Provider(json.dumps(tickers).encode())
+    source = CoinPaprikaSource("paprika_test", client=provider.client())
+
+    for _ in range(2):
+        async with AsyncSessionLocal() as session:
+            await IngestionOrchestrator(session, source).run()
+
+    async with AsyncSessionLocal() as session:
+        raw_count = (await session.execute(select(func.sum(RawBatch.record_count)))).scalar()
+    assert provider.requests == 2
+    assert raw_count == 1
+
+async def test_failed_load_is_not_skipped_by_a_304(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_CACHE_TTL", 0)
+    coins = [_coin(1, i) for i in range(2)]
+    provider = Provider(json.dumps(coins).encode())
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        # Page 1 is the provider's body (ETag-aware), the list ends after it
+        if request.url.params["page"] != "1":
+            return httpx.Response(200, json=[])
+        return provider.handler(request)
+
+    source = CoinGeckoSource(
+        "coingecko_test", client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        pages_per_run=1, concurrency=1, tier="pro",
+    )
+    load = IngestionOrchestrator._load_bulk
+
+    async def failing_load(self, raw_batch, normalized):
+        raise RuntimeError("load failed")
+
+    monkeypatch.setattr(IngestionOrchestrator, "_load_bulk", failing_load)
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(RuntimeError):
+            await IngestionOrchestrator(session, source).run()
+
+    # The retry gets the page in full, not a 304, and loads it
+    monkeypatch.setattr(IngestionOrchestrator, "_load_bulk", load)
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source).run()
+    assert not provider.conditional
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(func.count(CanonicalData.id)))).scalar()
+        checkpoint = await session.get(ETLCheckpoint, "coingecko_test")
+    assert (rows, checkpoint.last_processed_offset, checkpoint.status) == (2, 1, "SUCCESS")
+
+    # Committed: now the page is revalidated
+    _, not_modified, _ = await source._fetch_page(1)
+    assert not_modified and provider.conditional
+
+async def test_failed_snapshot_load_is_not_skipped_by_a_304(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_CACHE_TTL", 0)
+    tickers = [{"id": "btc-bitcoin", "symbol": "BTC", "name": "Bitcoin", "quotes": {"USD": {"price": 1.0}}}]
+    provider = Provider(json.dumps(tickers).encode())
+    source = CoinPaprikaSource("paprika_test", client=provider.client())
+    load = IngestionOrchestrator._load_bulk
+
+    async def failing_load(self, raw_batch, normalized):
+        raise RuntimeError("load failed")
+
+    monkeypatch.setattr(IngestionOrchestrator, "_load_bulk", failing_load)
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(RuntimeError):
+            await IngestionOrchestrator(session, source).run()
+
+    monkeypatch.setattr(IngestionOrchestrator, "_load_bulk", load)
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source).run()
+    assert not provider.conditional
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(func.count(CanonicalData.id)))).scalar() == 1
+
+    # Loaded: the next run is a 304, no new data
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source).run()
+    assert provider.conditional and provider.requests == 3
@@ -0,0 +1,118 @@
+import asyncio
+import re
+import pytest
+from httpx import AsyncClient, ASGITransport
+from prometheus_client import REGISTRY
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.instrumentation import RequestMetricsMiddleware, profiler
+from app.main import app
+from app.services.models import CanonicalData
+
+pytestmark = pytest.mark.asyncio
+
+TOKEN = "test-admin-token"
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", TOKEN)
+    profiler.clear()
+    yield
+    profiler.clear()
+
+async def seed():
+    async with AsyncSessionLocal() as session:
+        for i in range(3):
+            session.add(CanonicalData(symbol=f"C{i}", name=f"C{i}", price_usd=float(i), provider_data={}))
+        await session.commit()
+
+async def get(path: str, **kwargs):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        return await ac.get(path, **kwargs)
+
+def server_timing(response) -> dict:
+    return {
+        name: float(duration)
+        for name, duration in re.findall(r"(\w+);dur=([\d.]+)", response.headers["server-timing"])
+    }
+
+def observed(metric: str, route: str) -> float:
+    return REGISTRY.get_sample_value(metric + "_count", {"route": route}) or 0.0
+
+async def test_server_timing_and_route_histograms():
+    await seed()
+    before = observed("http_request_queries", "/api/v1/data")
+
+    response = await get("/api/v1/data", params={"limit": 2})
+    timing = server_timing(response)
+    assert set(timing) == {"db", "serialize", "total"}
+    assert timing["db"] > 0 and timing["total"] >= timing["db"]
+    assert '"1 queries"' in response.headers["server-timing"]
+    assert observed("http_request_queries", "/api/v1/data") == before + 1
+
+    # Route template, not the raw path
+    await get("/api/v1/quotes/C1")
+    assert observed("http_request_db_seconds", "/api/v1/quotes/{symbol}") >= 1
+    assert REGISTRY.get_sample_value(
+        "http_request_seconds_count", {"method": "GET", "route": "/api/v1/quotes/{symbol}", "status": "200"}
+    ) >= 1
+
+    # Served from the response cache: no SQL
+    assert '"0 queries"' in (await get("/api/v1/data", params={"limit": 2})).headers["server-timing"]
+
+async def test_profiled_request_is_kept_with_its_statements(admin):
+    await seed()
+    # Without the token the header is ignored
+    await get("/api/v1/data", params={"limit": 3}, headers={"X-Profile": "wrong"})
+    assert profiler.samples == []
+
+    await get("/api/v1/stats", headers={"X-Profile": TOKEN})
+    listing = (await get("/api/v1/admin/profiles", headers={"X-Admin-Token": TOKEN})).json()
+    [sample] = listing["profiles"]
+    assert (sample["route"], sample["status"]) == ("/api/v1/stats", 200)
+    assert sample["queries"] == sum(count for _, count in sample["top_statements"])
+
+    detail = await get(f"/api/v1/admin/profiles/{sample['id']}", headers={"X-Admin-Token": TOKEN})
+    assert "SQL statements by executions" in detail.text
+    assert "get_stats" in detail.text
+
+async def test_admin_endpoints_need_the_token(admin, monkeypatch):
+    assert (await get("/api/v1/admin/profiles")).status_code == 403
+    assert (await get("/api/v1/admin/profiles", headers={"X-Admin-Token": "nope"})).status_code == 403
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "")
+    assert (await get("/api/v1/admin/profiles", headers={"X-Admin-Token": ""})).status_code == 404
+
+async def test_sampling_rate(admin, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "PROFILE_KEEP", 2)
+    for _ in range(3):
+        await get("/health")
+    assert len(profiler.samples) == 2
+    durations = [s.duration_ms for s in profiler.samples]
+    assert durations == sorted(durations, reverse=True)
+
+async def test_streaming_request_releases_the_profiler(admin, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_MAX_SECONDS", 0.05)
+    release = asyncio.Event()
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await release.wait()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/stream", "headers": [(b"x-profile", TOKEN.encode())]}
+    stream = asyncio.create_task(RequestMetricsMiddleware(streaming_app)(scope, None, send))
+    await asyncio.sleep(0.2)
+    try:
+        # Still streaming, but the profile was recorded and the next request can be profiled
+        [sample] = profiler.samples
+        assert sample.status == 200 and sample.duration_ms < 200
+        await get("/api/v1/stats", headers={"X-Profile": TOKEN})
+        assert len(profiler.samples) == 2
+    finally:
+        release.set()
+        await stream
+    assert len(profiler.samples) == 2
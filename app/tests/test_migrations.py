@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import pool, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.core.db import SCHEMA_REVISION, Base, SchemaOutOfDate, check_schema, engine
+from app.tests.conftest import alembic_config
+
+pytestmark = pytest.mark.asyncio
+
+# What the first release's create_all built (revision 0001 adopts it)
+BASELINE_DDL = [
+    """CREATE TABLE canonical_data (
+        id SERIAL NOT NULL, symbol VARCHAR NOT NULL, name VARCHAR NOT NULL, price_usd FLOAT NOT NULL,
+        market_cap BIGINT, provider_data JSON, last_updated TIMESTAMP WITH TIME ZONE DEFAULT now(),
+        processed_at TIMESTAMP WITH TIME ZONE DEFAULT now(), PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_canonical_data_id ON canonical_data (id)",
+    "CREATE UNIQUE INDEX ix_canonical_data_symbol ON canonical_data (symbol)",
+    """CREATE TABLE etl_checkpoints (
+        source_id VARCHAR NOT NULL, last_processed_offset BIGINT, last_run_timestamp TIMESTAMP WITH TIME ZONE,
+        status VARCHAR, metadata_blob JSON, PRIMARY KEY (source_id)
+    )""",
+    """CREATE TABLE raw_data (
+        id SERIAL NOT NULL, source_id VARCHAR, payload JSON,
+        ingested_at TIMESTAMP WITH TIME ZONE DEFAULT now(), PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_raw_data_id ON raw_data (id)",
+    "CREATE INDEX ix_raw_data_source_id ON raw_data (source_id)",
+]
+
+@pytest_asyncio.fixture
+async def scratch_db():
+    """An empty database next to the test database, dropped afterwards. Yields (url, engine)."""
+    name = settings.POSTGRES_DB + "_migrations"
+    admin = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        await conn.execute(text(f'DROP DATABASE IF EXISTS "{name}"'))
+        await conn.execute(text(f'CREATE DATABASE "{name}"'))
+    url = make_url(settings.DATABASE_URL).set(database=name).render_as_string(hide_password=False)
+    scratch = create_async_engine(url, poolclass=pool.NullPool)
+    try:
+        yield url, scratch
+    finally:
+        await scratch.dispose()
+        async with admin.connect() as conn:
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{name}"'))
+
+async def migrate(url: str, revision: str = "head", downgrade: bool = False):
+    # env.py runs its own event loop
+    await asyncio.to_thread(command.downgrade if downgrade else command.upgrade, alembic_config(url), revision)
+
+async def assert_at_head(scratch):
+    await check_schema(scratch)
+    async with scratch.connect() as conn:
+        # Nothing left for autogenerate: the models and the migrated schema agree
+        diff = await conn.run_sync(lambda sync: compare_metadata(MigrationContext.configure(sync), Base.metadata))
+    assert diff == []
+
+async def test_schema_revision_is_the_head():
+    assert ScriptDirectory.from_config(alembic_config()).get_current_head() == SCHEMA_REVISION
+
+async def test_migrations_build_the_models_schema(scratch_db):
+    url, scratch = scratch_db
+    with pytest.raises(SchemaOutOfDate):
+        await check_schema(scratch)
+
+    await migrate(url)
+    await assert_at_head(scratch)
+    async with scratch.begin() as conn:
+        # The /stats counters come with them
+        await conn.execute(text("INSERT INTO canonical_data (symbol, name, price_usd) VALUES ('BTC', 'Bitcoin', 1)"))
+        assert (await conn.execute(text("SELECT sum(value) FROM etl_counters WHERE name = 'canonical_data'"))).scalar() == 1
+
+    await migrate(url, "base", downgrade=True)
+    async with scratch.connect() as conn:
+        tables = await conn.run_sync(lambda sync: sync.dialect.get_table_names(sync))
+    assert tables == ["alembic_version"]
+
+async def test_baseline_database_is_upgraded(scratch_db):
+    url, scratch = scratch_db
+    async with scratch.begin() as conn:
+        for statement in BASELINE_DDL:
+            await conn.execute(text(statement))
+        await conn.execute(text("""
+            INSERT INTO canonical_data (symbol, name, price_usd, provider_data)
+            VALUES ('BTC', 'Bitcoin', 50000, '{"coingecko": {"price": 50000}}'), ('ETH', 'Ethereum', 3000, NULL)
+        """))
+        await conn.execute(text("INSERT INTO raw_data (source_id, payload) VALUES ('coingecko_market', '{}')"))
+
+    await migrate(url)
+    await assert_at_head(scratch)
+    async with scratch.connect() as conn:
+        # json -> jsonb kept the data, and the GIN-backed ? operator works on it
+        assert (await conn.execute(text("SELECT symbol FROM canonical_data WHERE provider_data ? 'coingecko'"))).scalar() == "BTC"
+        counters = dict((await conn.execute(text("SELECT name, sum(value) FROM etl_counters GROUP BY name"))).all())
+    # Seeded with the rows already there
+    assert counters == {"canonical_data": 2, "raw_data": 1, "raw_batches": 0}
+
+async def test_create_all_database_is_adopted(scratch_db):
+    url, scratch = scratch_db
+    async with scratch.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    await migrate(url)
+    await assert_at_head(scratch)
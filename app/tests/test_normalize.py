@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+import numpy as np
+from app.ingestion.normalize import build_batch, column, to_datetime
+from app.ingestion.sources.coingecko import CoinGeckoSource
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def test_column_walks_nested_keys():
+    records = [{"quotes": {"USD": {"price": 1}}}, {"quotes": None}, "not a dict"]
+    assert column(records, "quotes", "USD", "price") == [1, None, None]
+
+def test_to_datetime_handles_offsets_and_missing():
+    default = np.datetime64("2024-01-01T00:00:00", "us")
+    parsed, valid = to_datetime(["2024-02-01T10:00:00Z", "2024-02-01T12:00:00+02:00", None, "garbage"], default)
+    assert parsed[:3].astype(str).tolist() == [
+        "2024-02-01T10:00:00.000000", "2024-02-01T10:00:00.000000", "2024-01-01T00:00:00.000000",
+    ]
+    assert valid.tolist() == [True, True, True, False]
+
+def test_build_batch_coerces_and_rejects():
+    batch = build_batch(
+        "test",
+        external_id=["a", "b", "c", "d", "e"],
+        symbol=["btc", "eth", None, "xrp", "sol"],
+        name=["Bitcoin", "Ethereum", "Nameless", "Ripple", "Solana"],
+        price=["100.5", 2, 3, "n/a", -1],
+        market_cap=[None, 1e3, 0, 0, 0],
+        last_updated=[None] * 5,
+        now=NOW,
+    )
+    assert batch.symbol.tolist() == ["BTC", "ETH"]
+    assert batch.index.tolist() == [0, 1]
+    assert batch.price_usd.tolist() == [100.5, 2.0]
+    assert batch.market_cap.tolist() == [0, 1000]
+    assert [(r.index, r.reason) for r in batch.rejects] == [
+        (2, "missing symbol"), (3, "invalid price"), (4, "invalid price"),
+    ]
+    assert [s.last_updated for s in batch.to_schemas()] == [NOW, NOW]
+
+def test_dedupe_keeps_last_per_symbol():
+    batch = build_batch(
+        "test",
+        external_id=["a", "b", "c"], symbol=["btc", "eth", "BTC"], name=["x", "y", "z"],
+        price=[1, 2, 3], market_cap=[0, 0, 0], last_updated=[None] * 3,
+    ).dedupe_last()
+    assert [(symbol, price) for symbol, _, price, _, _ in batch.rows()] == [("ETH", 2.0), ("BTC", 3.0)]
+
+def test_sources_share_the_contract():
+    gecko = CoinGeckoSource("g", tier="pro").normalize([
+        {"id": "bitcoin", "symbol": "btc", "name": "Bitcoin", "current_price": 1.0,
+         "market_cap": 5, "last_updated": "2024-01-01T00:00:00.000Z"},
+        {"id": "broken"},
+    ])
+    paprika = CoinPaprikaSource("p").normalize([
+        {"id": "btc-bitcoin", "symbol": "BTC", "name": "Bitcoin", "quotes": {"USD": {"price": 2.0, "market_cap": 6}}},
+        {"id": "no-quotes", "symbol": "X", "name": "X"},
+    ])
+    assert gecko.symbol.tolist() == paprika.symbol.tolist() == ["BTC"]
+    assert [r.index for r in gecko.rejects] == [r.index for r in paprika.rejects] == [1]
@@ -0,0 +1,204 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from prometheus_client import REGISTRY
+from sqlalchemy import select, func
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.ingestion.fingerprints import record_hashes
+from app.ingestion.orchestrator import BaseSource, IngestionOrchestrator
+from app.ingestion.normalize import build_batch, column
+from app.schemas.normalized import NormalizedBatch
+from app.services.models import CanonicalData, RawData, RawBatch, ETLCheckpoint, ETLRun
+
+pytestmark = pytest.mark.asyncio
+
+class FakeSource(BaseSource):
+    """In-memory source that returns a fixed batch once per offset."""
+
+    def __init__(self, source_id: str, batch: list[dict]):
+        super().__init__(source_id)
+        self.batch = batch
+
+    async def fetch_data(self, last_offset: int):
+        return self.batch, last_offset + 1
+
+    def normalize(self, raw_data: list[dict]) -> NormalizedBatch:
+        return build_batch(
+            self.source_id,
+            external_id=column(raw_data, "id"),
+            symbol=column(raw_data, "symbol"),
+            name=column(raw_data, "name"),
+            price=column(raw_data, "price"),
+            market_cap=column(raw_data, "market_cap"),
+            last_updated=column(raw_data, "last_updated"),
+        )
+
+BATCH_A = [
+    {"id": "bitcoin", "symbol": "BTC", "name": "Bitcoin", "price": 100.0, "market_cap": 1000},
+    {"id": "ethereum", "symbol": "ETH", "name": "Ethereum", "price": 10.0, "market_cap": 500},
+    # Duplicate symbol in the same batch: last one wins
+    {"id": "bitcoin", "symbol": "BTC", "name": "Bitcoin", "price": 101.0, "market_cap": 1001},
+    # Rejected by normalize (missing fields)
+    {"id": "broken"},
+]
+
+BATCH_B = [
+    {"id": "btc-bitcoin", "symbol": "BTC", "name": "Bitcoin", "price": 102.0, "market_cap": 0},
+]
+
+async def _run(source: BaseSource, bulk: bool):
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, source, bulk=bulk).run()
+
+async def _snapshot():
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(CanonicalData).order_by(CanonicalData.symbol))).scalars().all()
+        # Raw records, whichever RAW_STORAGE_MODE stored them
+        raw_count = (await session.execute(select(func.count(RawData.id)))).scalar()
+        raw_count += (await session.execute(select(func.coalesce(func.sum(RawBatch.record_count), 0)))).scalar()
+        return rows, raw_count
+
+@pytest.mark.parametrize("bulk", [True, False])
+async def test_run_merges_providers(bulk):
+    await _run(FakeSource("source_a", BATCH_A), bulk)
+    await _run(FakeSource("source_b", BATCH_B), bulk)
+
+    rows, raw_count = await _snapshot()
+    assert raw_count == len(BATCH_A) + len(BATCH_B)
+    assert [r.symbol for r in rows] == ["BTC", "ETH"]
+
+    btc = rows[0]
+    assert btc.price_usd == 102.0
+    # market_cap of 0 does not overwrite a known value
+    assert btc.market_cap == 1001
+    assert set(btc.provider_data) == {"source_a", "source_b"}
+    assert btc.provider_data["source_a"]["price"] == 101.0
+
+@pytest.mark.parametrize("bulk", [True, False])
+async def test_run_maintains_consensus(bulk):
+    await _run(FakeSource("source_a", BATCH_A), bulk)
+    rows, _ = await _snapshot()
+    assert [(r.consensus_price, r.price_spread, r.source_count) for r in rows] == [(101.0, 0.0, 1), (10.0, 0.0, 1)]
+
+    await _run(FakeSource("source_b", BATCH_B), bulk)
+    rows, _ = await _snapshot()
+    btc, eth = rows
+    # Median of 101 (source_a) and 102 (source_b); ETH was not touched
+    assert btc.consensus_price == 101.5
+    assert btc.source_count == 2
+    assert btc.price_spread == pytest.approx(1.0 / 101.5)
+    assert (eth.consensus_price, eth.source_count) == (10.0, 1)
+
+async def test_run_advances_checkpoint():
+    await _run(FakeSource("source_a", BATCH_A), True)
+
+    async with AsyncSessionLocal() as session:
+        checkpoint = await session.get(ETLCheckpoint, "source_a")
+    assert checkpoint.last_processed_offset == 1
+    assert checkpoint.status == "SUCCESS"
+
+@pytest.mark.parametrize("bulk", [True, False])
+async def test_run_records_stage_metrics(bulk):
+    source_id = f"metrics_{bulk}"
+    sample = lambda name, **labels: REGISTRY.get_sample_value(name, {"source_id": source_id, **labels}) or 0
+
+    await _run(FakeSource(source_id, BATCH_A), bulk)
+    assert sample("etl_rows_total", action="inserted") == 2
+    assert sample("etl_rejected_records_total") == 1
+    assert sample("etl_upsert_seconds_count") == 1
+    assert sample("etl_runs_total", status="success") == 1
+
+    await _run(FakeSource(source_id, BATCH_B), bulk)
+    assert sample("etl_rows_total", action="updated") == 1
+    assert sample("etl_checkpoint_lag_seconds") >= 0
+
+    async with AsyncSessionLocal() as session:
+        checkpoint = await session.get(ETLCheckpoint, source_id)
+    assert checkpoint.last_run_timestamp is not None
+
+async def test_unchanged_records_are_skipped():
+    await _run(FakeSource("source_a", BATCH_A), True)
+    rows_before, raw_before = await _snapshot()
+
+    async with AsyncSessionLocal() as session:
+        orchestrator = IngestionOrchestrator(session, FakeSource("source_a", BATCH_A))
+        await orchestrator.run()
+    assert orchestrator.summary["unchanged"] == 2
+    assert orchestrator.summary["new"] == orchestrator.summary["changed"] == 0
+
+    rows, raw_count = await _snapshot()
+    # Only the rejected record is stored again; canonical rows are untouched
+    assert raw_count == raw_before + 1
+    assert [r.last_updated for r in rows] == [r.last_updated for r in rows_before]
+
+    moved = [dict(BATCH_A[1], price=11.0)]
+    async with AsyncSessionLocal() as session:
+        orchestrator = IngestionOrchestrator(session, FakeSource("source_a", moved))
+        await orchestrator.run()
+    assert orchestrator.summary["changed"] == 1
+    rows, _ = await _snapshot()
+    assert rows[1].price_usd == 11.0
+
+async def test_change_detection_survives_restart():
+    await _run(FakeSource("source_a", BATCH_A), True)
+    # A fresh process: hashes come back from record_hashes, not memory
+    record_hashes.forget()
+
+    async with AsyncSessionLocal() as session:
+        orchestrator = IngestionOrchestrator(session, FakeSource("source_a", BATCH_A))
+        await orchestrator.run()
+    assert orchestrator.summary["unchanged"] == 2
+
+async def test_change_detection_sees_other_processes_loads():
+    await _run(FakeSource("source_a", BATCH_A), True)
+    stale = {source: dict(hashes) for source, hashes in record_hashes._by_source.items()}
+    # Another process loads a new BTC price; this one still holds the old hashes in memory
+    await _run(FakeSource("source_a", [dict(BATCH_A[2], price=150.0)]), True)
+    record_hashes._by_source = stale
+
+    # Back to the price this process last saw: a real change for the table
+    async with AsyncSessionLocal() as session:
+        orchestrator = IngestionOrchestrator(session, FakeSource("source_a", BATCH_A))
+        await orchestrator.run()
+    assert (orchestrator.summary["changed"], orchestrator.summary["unchanged"]) == (1, 1)
+    rows, _ = await _snapshot()
+    assert rows[0].price_usd == 101.0
+
+async def test_unchanged_quotes_stay_fresh_for_consensus(monkeypatch):
+    monkeypatch.setattr(settings, "CONSENSUS_MAX_AGE", 600)
+    quote = {"id": "bitcoin", "symbol": "BTC", "name": "Bitcoin", "price": 100.0, "market_cap": 1000}
+    an_hour_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    await _run(FakeSource("source_a", [dict(quote, last_updated=an_hour_ago)]), True)
+
+    # Same price, quoted again just now: skipped, but no longer an hour old
+    async with AsyncSessionLocal() as session:
+        orchestrator = IngestionOrchestrator(session, FakeSource("source_a", [quote]))
+        await orchestrator.run()
+    assert orchestrator.summary["unchanged"] == 1
+
+    await _run(FakeSource("source_b", [dict(quote, price=102.0)]), True)
+    rows, _ = await _snapshot()
+    assert rows[0].source_count == 2
+    assert rows[0].consensus_price == 101.0
+
+class FailingSource(FakeSource):
+    def normalize(self, raw_data: list[dict]) -> NormalizedBatch:
+        raise RuntimeError("provider changed its format")
+
+async def test_runs_are_recorded():
+    source = FakeSource("source_a", BATCH_A)
+    source.count_bytes(1234)  # Before the run: not attributed to it
+    await _run(source, True)
+    with pytest.raises(RuntimeError):
+        await _run(FailingSource("source_b", BATCH_B), True)
+
+    async with AsyncSessionLocal() as session:
+        runs = (await session.execute(select(ETLRun).order_by(ETLRun.id))).scalars().all()
+    ok, failed = runs
+    assert (ok.source_id, ok.status, ok.records, ok.inserted, ok.updated, ok.rejected) == (
+        "source_a", "SUCCESS", 4, 2, 0, 1
+    )
+    assert ok.bytes == 0
+    assert ok.finished_at >= ok.started_at and ok.duration_seconds > 0
+    assert (failed.status, failed.error) == ("FAILED", "provider changed its format")
+    assert failed.finished_at is not None
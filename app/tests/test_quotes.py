@@ -0,0 +1,80 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import event, update
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine
+from app.core.events import data_generation
+from app.main import app
+from app.services.models import CanonicalData
+from app.services.quotes import quote_store
+
+pytestmark = pytest.mark.asyncio
+
+COINS = (("BTC", 100.0, 1_000_000), ("ETH", 10.0, 500_000), ("SOL", 1.0, 20_000), ("NEW", 0.5, None))
+
+async def seed():
+    async with AsyncSessionLocal() as session:
+        for symbol, price, market_cap in COINS:
+            session.add(CanonicalData(symbol=symbol, name=symbol, price_usd=price, market_cap=market_cap, provider_data={}))
+        await session.commit()
+
+async def get(path: str, **params):
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        return await ac.get(path, params=params)
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, "before_cursor_execute", self)
+
+async def test_batch_lookup_in_request_order():
+    await seed()
+    response = await get("/api/v1/quotes", symbols="sol,BTC,DOGE,btc")
+    assert response.status_code == 200
+    body = response.json()
+    assert [q["symbol"] for q in body["quotes"]] == ["SOL", "BTC"]
+    assert body["missing"] == ["DOGE"]
+    assert body["quotes"][1]["price_usd"] == 100.0
+
+    assert (await get("/api/v1/quotes/eth")).json()["quote"]["symbol"] == "ETH"
+    assert (await get("/api/v1/quotes/DOGE")).status_code == 404
+
+async def test_top_by_market_cap():
+    await seed()
+    body = (await get("/api/v1/quotes", limit=3)).json()
+    assert [q["symbol"] for q in body["quotes"]] == ["BTC", "ETH", "SOL"]
+    body = (await get("/api/v1/quotes", min_market_cap=500_000)).json()
+    assert [q["symbol"] for q in body["quotes"]] == ["BTC", "ETH"]
+
+async def test_too_many_symbols(monkeypatch):
+    monkeypatch.setattr(settings, "QUOTES_MAX_SYMBOLS", 2)
+    assert (await get("/api/v1/quotes", symbols="A,B,C")).status_code == 400
+
+async def test_lookups_never_query_and_commits_rebuild():
+    await seed()
+    first = (await get("/api/v1/quotes", symbols="BTC")).json()
+
+    with StatementCounter() as statements:
+        for _ in range(5):
+            await get("/api/v1/quotes", symbols="BTC,ETH")
+            await get("/api/v1/quotes/SOL")
+    assert statements.count == 0
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(CanonicalData).where(CanonicalData.symbol == "BTC").values(price_usd=200.0))
+        await session.commit()
+    data_generation.bump("test")
+    await quote_store.rebuild()
+
+    body = (await get("/api/v1/quotes", symbols="BTC")).json()
+    assert body["generation"] > first["generation"]
+    assert body["quotes"][0]["price_usd"] == 200.0
@@ -0,0 +1,97 @@
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, text
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal, engine
+from app.ingestion.orchestrator import IngestionOrchestrator
+from app.services import raw_store, stats
+from app.services.models import RawBatch, RawData
+from app.tests.test_orchestrator import FakeSource, BATCH_A
+
+pytestmark = pytest.mark.asyncio
+
+T0 = datetime(2024, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+async def write(source_id: str, ts: datetime, records: list[dict]):
+    async with AsyncSessionLocal() as session:
+        await raw_store.write_batch(session, source_id, records, ts)
+        await session.commit()
+
+async def read(**kwargs) -> list:
+    return [batch async for batch in raw_store.read_batches(engine, **kwargs)]
+
+@pytest.mark.parametrize("codec", ["zstd", "gzip"])
+async def test_run_stores_one_compressed_row_per_batch(monkeypatch, codec):
+    if codec == "zstd":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(settings, "RAW_COMPRESSION", codec)
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, FakeSource("source_a", BATCH_A)).run()
+
+    async with AsyncSessionLocal() as session:
+        batches = (await session.execute(select(RawBatch))).scalars().all()
+        legacy = (await session.execute(select(func.count(RawData.id)))).scalar()
+        counts = await stats.row_counts(session)
+
+    assert legacy == 0
+    assert [(b.codec, b.record_count) for b in batches] == [(codec, len(BATCH_A))]
+    assert counts["raw_batches"] == len(BATCH_A)
+    [stored] = await read(source_id="source_a")
+    assert stored.records == BATCH_A
+    assert stored.batch_id == batches[0].id
+
+async def test_record_mode_keeps_legacy_rows():
+    async with AsyncSessionLocal() as session:
+        await IngestionOrchestrator(session, FakeSource("source_a", BATCH_A), raw_mode="record").run()
+
+    [stored] = await read()
+    assert stored.batch_id is None
+    assert stored.records == BATCH_A
+    assert len(stored.record_ids) == len(BATCH_A)
+
+async def test_corrupt_payload_is_rejected():
+    row = raw_store.encode([{"id": 1}])
+    with pytest.raises(raw_store.RawBatchCorrupt):
+        raw_store.decode(row["codec"], row["payload"], row["size_bytes"], "0" * 32, row["record_count"])
+    with pytest.raises(raw_store.RawBatchCorrupt):
+        raw_store.decode(row["codec"], row["payload"], row["size_bytes"], row["checksum"], 2)
+
+async def test_old_partitions_are_archived_and_still_readable(monkeypatch, tmp_path):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(settings, "RAW_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "RAW_RETENTION_DAYS", 30)
+    await write("source_a", T0, [{"id": 1}, {"id": 2}])
+    await write("source_b", T0 + timedelta(hours=1), [{"id": 3}])
+    await write("source_a", T0 + timedelta(days=1), [{"id": 4}])
+    await write("source_a", T0 + timedelta(days=40), [{"id": 5}])
+
+    archived = await raw_store.archive_partitions(engine, now=T0 + timedelta(days=40))
+
+    # Empty days (e.g. the pre-created next day) are dropped without a file
+    assert {name: rows for name, rows in archived.items() if rows} == {
+        "raw_batches_y2024m03d01": 2, "raw_batches_y2024m03d02": 1,
+    }
+    assert "raw_batches_y2024m03d03" in archived
+    assert sorted(os.listdir(tmp_path)) == ["raw_batches_y2024m03d01.parquet", "raw_batches_y2024m03d02.parquet"]
+    async with AsyncSessionLocal() as session:
+        remaining = (await session.execute(select(func.count()).select_from(RawBatch))).scalar()
+        exists = (await session.execute(text("SELECT to_regclass('raw_batches_y2024m03d01')"))).scalar()
+        counts = await stats.row_counts(session)
+    assert remaining == 1
+    assert exists is None
+    # Archived records are still counted
+    assert counts["raw_batches"] == 5
+
+    # Reader: archives then live partitions, in order, filtered by source and window
+    batches = await read(source_id="source_a")
+    assert [record["id"] for batch in batches for record in batch.records] == [1, 2, 4, 5]
+    window = await read(start=T0 + timedelta(minutes=30), end=T0 + timedelta(days=2))
+    assert [(batch.source_id, batch.records) for batch in window] == [("source_b", [{"id": 3}]), ("source_a", [{"id": 4}])]
+
+    # Resuming after a batch skips everything up to it
+    resumed = await read(after_batch=(batches[1].ingested_at, batches[1].batch_id))
+    assert [batch.records for batch in resumed] == [[{"id": 5}]]
+
+    # Nothing left to archive
+    assert await raw_store.archive_partitions(engine, now=T0 + timedelta(days=40)) == {}
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import update
+from app.api.routes.stream import _sse_events, quotes_socket
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.events import data_generation
+from app.services.models import CanonicalData
+from app.services.stream import stream_hub
+
+pytestmark = pytest.mark.asyncio
+
+@pytest.fixture(autouse=True)
+def no_coalesce_delay(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_COALESCE_SECONDS", 0)
+
+async def seed():
+    async with AsyncSessionLocal() as session:
+        for symbol, price in (("BTC", 100.0), ("ETH", 10.0), ("SOL", 1.0)):
+            session.add(CanonicalData(symbol=symbol, name=symbol, price_usd=price, provider_data={}))
+        await session.commit()
+
+async def set_price(symbol: str, price: float):
+    """Writes a price and signals it like an orchestrator commit."""
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(CanonicalData).where(CanonicalData.symbol == symbol).values(price_usd=price))
+        await session.commit()
+    data_generation.bump("test")
+
+async def test_snapshot_then_only_changed_quotes():
+    await seed()
+    subscription = await stream_hub.subscribe(["BTC", "ETH"])
+    try:
+        kind, quotes = await subscription.next(timeout=2)
+        assert kind == "snapshot"
+        assert [(q["symbol"], q["price_usd"]) for q in quotes] == [("BTC", 100.0), ("ETH", 10.0)]
+
+        # Unwatched symbols don't wake the subscriber
+        await set_price("SOL", 2.0)
+        await set_price("ETH", 11.0)
+        kind, quotes = await subscription.next(timeout=2)
+        assert kind == "delta"
+        assert [(q["symbol"], q["price_usd"]) for q in quotes] == [("ETH", 11.0)]
+    finally:
+        stream_hub.unsubscribe(subscription)
+    assert not stream_hub.watchers
+
+async def test_slow_consumer_gets_latest_value_only():
+    await seed()
+    subscription = await stream_hub.subscribe(["BTC"])
+    try:
+        await subscription.next(timeout=2)
+        for price in (101.0, 102.0, 103.0):
+            await set_price("BTC", price)
+            await stream_hub.refresh()
+        assert len(subscription.pending) == 1
+        kind, quotes = await subscription.next(timeout=2)
+        assert [q["price_usd"] for q in quotes] == [103.0]
+    finally:
+        stream_hub.unsubscribe(subscription)
+
+async def test_sse_event_format():
+    await seed()
+    events = _sse_events(["BTC"])
+    # Not subscribed until the body is iterated: a client gone before that leaves nothing behind
+    assert not stream_hub.subscriptions
+    try:
+        event = await events.__anext__()
+        assert len(stream_hub.subscriptions) == 1
+    finally:
+        await events.aclose()
+    name, data = event.strip().split("\n")
+    assert name == "event: snapshot"
+    assert json.loads(data.removeprefix("data: "))["quotes"][0]["symbol"] == "BTC"
+    # Closing the stream unsubscribes
+    assert not stream_hub.subscriptions
+
+async def test_failed_snapshot_does_not_leak_the_subscription(monkeypatch):
+    async def broken_load(symbols):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(stream_hub, "_load", broken_load)
+    with pytest.raises(ConnectionError):
+        await stream_hub.subscribe(["BTC"])
+    assert not stream_hub.subscriptions and not stream_hub.watchers
+
+class FakeWebSocket:
+    def __init__(self):
+        self.commands: asyncio.Queue = asyncio.Queue()
+        self.sent: asyncio.Queue = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        raise AssertionError(f"closed: {code} {reason}")
+
+    async def send_json(self, message):
+        await self.sent.put(message)
+
+    async def receive_json(self):
+        command = await self.commands.get()
+        if command is None:
+            raise WebSocketDisconnect()
+        return command
+
+async def test_websocket_subscribe_and_unsubscribe():
+    await seed()
+    socket = FakeWebSocket()
+    handler = asyncio.create_task(quotes_socket(socket, symbols="btc"))
+    try:
+        message = await asyncio.wait_for(socket.sent.get(), 2)
+        assert [q["symbol"] for q in message["quotes"]] == ["BTC"]
+
+        await socket.commands.put({"action": "subscribe", "symbols": ["eth"]})
+        message = await asyncio.wait_for(socket.sent.get(), 2)
+        assert [q["symbol"] for q in message["quotes"]] == ["ETH"]
+
+        await socket.commands.put({"action": "unsubscribe", "symbols": ["BTC"]})
+        await asyncio.sleep(0.05)
+        await set_price("BTC", 200.0)
+        await set_price("ETH", 20.0)
+        message = await asyncio.wait_for(socket.sent.get(), 2)
+        assert [(q["symbol"], q["price_usd"]) for q in message["quotes"]] == [("ETH", 20.0)]
+    finally:
+        await socket.commands.put(None)
+        await asyncio.wait_for(handler, 2)
+    assert not stream_hub.subscriptions
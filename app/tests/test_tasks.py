@@ -0,0 +1,148 @@
+import asyncio
+import pytest
+from sqlalchemy import select, text, func
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.ingestion import tasks
+from app.ingestion.sources import coingecko, coinpaprika
+from app.ingestion.sources.coinpaprika import CoinPaprikaSource
+from app.services import etl_service
+from app.services.models import CanonicalData, ETLCheckpoint, ETLTask
+from app.tests.test_coingecko import mock_client
+from app.tests.test_coinpaprika import TICKERS, mock_client as paprika_client
+
+pytestmark = pytest.mark.asyncio
+
+SOURCE_ID = "coingecko_market"
+
+@pytest.fixture
+def queue_mode(monkeypatch):
+    monkeypatch.setattr(settings, "ETL_MODE", "queue")
+    monkeypatch.setattr(settings, "COINGECKO_API_TIER", "pro")
+    monkeypatch.setattr(settings, "COINGECKO_PAGES_PER_RUN", 5)
+    monkeypatch.setattr(settings, "COINGECKO_PAGES_PER_TASK", 2)
+
+def serve(monkeypatch, **options):
+    monkeypatch.setattr(coingecko, "get_http_client", lambda: mock_client(**options))
+
+async def task_rows():
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(select(ETLTask).order_by(ETLTask.start_offset))).scalars().all()
+    return [(t.start_offset, t.end_offset, t.status, t.progress_offset) for t in rows]
+
+async def checkpoint():
+    async with AsyncSessionLocal() as session:
+        return await session.get(ETLCheckpoint, SOURCE_ID)
+
+async def drain(workers: int = 2):
+    """Workers claim and run tasks concurrently until the queue is empty."""
+    async def worker(slot: int):
+        while await etl_service.run_next_task(f"test:{slot}"):
+            pass
+
+    await asyncio.gather(*(worker(slot) for slot in range(workers)))
+
+async def test_job_is_sharded_and_progress_derived_from_tasks(queue_mode, monkeypatch):
+    serve(monkeypatch, last_page=10)
+    assert await etl_service.run_source("coingecko") is True
+    assert await task_rows() == [(0, 2, "PENDING", 0), (2, 4, "PENDING", 2), (4, 5, "PENDING", 4)]
+    # The current run isn't over: nothing new is planned
+    assert await etl_service.run_source("coingecko") is False
+
+    await drain()
+
+    assert [status for _, _, status, _ in await task_rows()] == ["DONE"] * 3
+    assert (await checkpoint()).last_processed_offset == 5
+    async with AsyncSessionLocal() as session:
+        assert (await session.execute(select(func.count(CanonicalData.id)))).scalar() == 10
+
+    # The next run continues from the derived checkpoint
+    assert await etl_service.plan_source("coingecko") is True
+    assert await task_rows() == [(5, 7, "PENDING", 5), (7, 9, "PENDING", 7), (9, 10, "PENDING", 9)]
+
+async def test_end_of_list_and_short_tasks(queue_mode, monkeypatch):
+    # Page 2 stays rate limited; the list ends after page 3
+    serve(monkeypatch, last_page=3, rate_limited={2})
+    await etl_service.plan_source("coingecko")
+    await drain()
+
+    assert await task_rows() == [(0, 2, "DONE", 1), (2, 4, "DONE", 0), (4, 5, "DONE", 0)]
+    # The first task stopped short: the next run restarts at page 2, not at the top
+    assert (await checkpoint()).last_processed_offset == 1
+
+    serve(monkeypatch, last_page=3)
+    await etl_service.plan_source("coingecko")
+    await drain()
+    assert (await checkpoint()).last_processed_offset == 0
+
+async def test_expired_lease_is_reclaimed_and_fenced(queue_mode):
+    await etl_service.plan_source("coingecko")
+    async with AsyncSessionLocal() as session:
+        first = await tasks.claim(session, "a", [SOURCE_ID])
+        # a stops heartbeating
+        await session.execute(text("UPDATE etl_tasks SET lease_expires_at = now() - interval '1 second'"))
+        await session.commit()
+        second = await tasks.claim(session, "b", [SOURCE_ID])
+
+    assert (second.id, second.attempt) == (first.id, 2)
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(tasks.LeaseLost):
+            await tasks.advance(session, first, 1)
+        await tasks.advance(session, second, 1)
+        await session.commit()
+    assert (await task_rows())[0] == (0, 2, "RUNNING", 1)
+
+async def test_failed_task_is_retried_then_failed(queue_mode, monkeypatch):
+    monkeypatch.setattr(settings, "ETL_TASK_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "COINGECKO_PAGES_PER_RUN", 2)
+    serve(monkeypatch, last_page=10)
+
+    def broken(self, raw_data):
+        raise RuntimeError("bad normalize")
+
+    monkeypatch.setattr(coingecko.CoinGeckoSource, "normalize", broken)
+    await etl_service.plan_source("coingecko")
+    with pytest.raises(RuntimeError):
+        await etl_service.run_next_task("test")
+    assert (await task_rows())[0][2] == "PENDING"
+    with pytest.raises(RuntimeError):
+        await etl_service.run_next_task("test")
+    assert (await task_rows())[0][2] == "FAILED"
+    assert await etl_service.run_next_task("test") is False
+    assert (await checkpoint()).status == "FAILED"
+
+    # The run is over: the next one re-plans the failed range
+    assert await etl_service.plan_source("coingecko") is True
+    assert await task_rows() == [(0, 2, "PENDING", 0)]
+
+async def test_job_offset_and_paprika_slices():
+    done = lambda start, end, progress, eos=False: ETLTask(
+        start_offset=start, end_offset=end, progress_offset=progress, status="DONE", end_of_stream=eos,
+    )
+    assert tasks.job_offset([done(4, 6, 6), done(0, 4, 4)]) == 6
+    assert tasks.job_offset([done(0, 4, 4), ETLTask(start_offset=4, end_offset=6, progress_offset=5, status="RUNNING")]) == 4
+    assert tasks.job_offset([done(0, 4, 4), done(4, None, 0, eos=True)]) == 0
+
+    source = CoinPaprikaSource("paprika_test", chunk_size=500)
+    assert source.plan_tasks(0) == [(0, None)]
+    assert source.plan_tasks(0, stream_size=12_000) == [(0, 5000), (5000, 10000), (10000, None)]
+
+async def test_paprika_is_sliced_by_the_last_snapshot_size(queue_mode, monkeypatch):
+    monkeypatch.setattr(settings, "COINPAPRIKA_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "COINPAPRIKA_TICKERS_PER_TASK", 4)
+    monkeypatch.setattr(coinpaprika, "get_http_client", lambda: paprika_client())
+
+    # Size unknown: one task, which records it
+    await etl_service.plan_source("coinpaprika")
+    await drain()
+    async with AsyncSessionLocal() as session:
+        paprika = await session.get(ETLCheckpoint, "coinpaprika_free")
+    assert (paprika.last_processed_offset, paprika.metadata_blob["stream_size"]) == (0, len(TICKERS))
+
+    await etl_service.plan_source("coinpaprika")
+    rows = await task_rows()
+    await drain()
+    async with AsyncSessionLocal() as session:
+        records = (await session.execute(select(func.sum(ETLTask.records)))).scalar()
+    assert [(start, end) for start, end, _, _ in rows] == [(0, 4), (4, None)]
+    assert records == len(TICKERS)
@@ -1,28 +1,13 @@
-import asyncio
+"""Kept for existing cron entries: same as `python -m app.etl run coingecko`."""
 import sys
 import os
 
 # Ensure we can import from 'app'
 sys.path.append(os.getcwd())
 
-from app.core.db import AsyncSessionLocal
-from app.ingestion.orchestrator import IngestionOrchestrator
-from app.ingestion.sources.coingecko import CoinGeckoSource
-
-async def main():
-    print("--> Connecting to Database...")
-    async with AsyncSessionLocal() as db:
-        
-        # Initialize CoinGecko Source
-        # We use a unique source_id 'coingecko_market' so it has its own checkpoint in the DB
-        print("--> Initializing CoinGecko Source...")
-        source = CoinGeckoSource('coingecko_market')
-        
-        print("--> Running CoinGecko ETL...")
-        orchestrator = IngestionOrchestrator(db, source)
-        await orchestrator.run()
-        
-        print("--> SUCCESS: CoinGecko Data Ingested!")
+from app.etl import main
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # 'coingecko' is registered with source_id 'coingecko_market', so it has its own checkpoint in the DB.
+    # run_source takes the advisory lock, so this never overlaps the worker daemon.
+    sys.exit(main(["run", "coingecko"]))